@@ -0,0 +1,48 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the hand-written template parser with the generated Lark parser.
+
+Usage (from the repository root): python -m benchmarks.bench_parser [--number N]
+"""
+import argparse
+import timeit
+
+from tensorguard import lark_parser
+from tensorguard import parser
+
+TEMPLATES = [
+    "B, C, H, W",
+    "B, H*W, C+1",
+    "A, B, A+C*2+1",
+    "B, ..., (H+1)/2, W?, ?, *",
+    "N, " + ", ".join("D{}*(K{}+1)".format(i, i) for i in range(8)),
+]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--number", type=int, default=2000, help="parses per template")
+    args = arg_parser.parse_args()
+    lark_parser.get_parser()  # exclude loading the Lark tables from the timings
+    print("{:<50} {:>12} {:>12} {:>8}".format("template", "lark (us)", "parser (us)", "speedup"))
+    for template in TEMPLATES:
+        lark_time = min(timeit.repeat(lambda: lark_parser.parse(template), number=args.number, repeat=3))
+        new_time = min(timeit.repeat(lambda: parser.parse(template), number=args.number, repeat=3))
+        print(
+            "{:<50} {:>12.2f} {:>12.2f} {:>7.1f}x".format(
+                template[:50], lark_time / args.number * 1e6, new_time / args.number * 1e6, lark_time / new_time
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark suite of parse, guard, matches, reshape and evaluate.
+
+Every benchmark is timed with timeit, best of several repeats, and reported in
+microseconds per call. Results can be saved as JSON and compared with a
+previous run; the comparison fails if a benchmark got slower than the
+threshold.
+
+Usage (from the repository root):
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --compare before.json --threshold 0.15
+    python -m benchmarks.suite --filter guard --number 20000
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import timeit
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import tensorguard as tg
+from tensorguard import parser
+from tensorguard import tools
+
+COMMON = ["B, C, H, W", "B, T, D", "N, 3"]
+ARITHMETIC = [
+    "B, H*W, C+1",
+    "A, B, A+C*2+1",
+    "N, " + ", ".join("D{}*(K{}+1)".format(i, i) for i in range(8)),
+]
+ELLIPSIS = ["B, ..., C", "..., H, W", "B, ..., (H+1)/2, W?"]
+
+# a shape matching each template
+SHAPES = {
+    "B, C, H, W": [16, 3, 224, 224],
+    "B, T, D": [32, 128, 512],
+    "N, 3": [1000, 3],
+    "B, H*W, C+1": [8, 64, 4],
+    "A, B, A+C*2+1": [2, 3, 9],
+    ARITHMETIC[2]: [4] + [(i + 1) * (i + 2) for i in range(8)],
+    "B, ..., C": [8, 5, 5, 5, 3],
+    "..., H, W": [2, 3, 32, 32],
+    "B, ..., (H+1)/2, W?": [8, 7, 4, 6],
+}
+# known dims needed by the templates whose names are not all inferred from the shape
+DIMS = {
+    "B, H*W, C+1": {"H": 8},
+    ARITHMETIC[2]: {"K{}".format(i): i + 1 for i in range(8)},
+    "B, ..., (H+1)/2, W?": {"H": 7},
+}
+
+BenchmarkType = Callable[[], object]
+
+
+def benchmarks() -> "OrderedDict[str, BenchmarkType]":
+    """Return the benchmarks by name. Setup happens here, outside of the timings."""
+    cases = OrderedDict()  # type: OrderedDict[str, BenchmarkType]
+
+    for template in COMMON + ARITHMETIC + ELLIPSIS:
+        cases["parse_cold/" + template] = lambda t=template: parser.parse(t)
+
+    for group, templates in (("guard_warm", COMMON), ("guard_arithmetic", ARITHMETIC), ("guard_ellipsis", ELLIPSIS)):
+        for template in templates:
+            shape, dims = SHAPES[template], DIMS.get(template, {})
+            parser.get_spec(template).compile()
+            cases["{}/{}".format(group, template)] = lambda t=template, s=shape, d=dims: tools.guard(s, t, d)
+
+    shape = SHAPES["B, C, H, W"]
+    inputs = [("list", list(shape)), ("tuple", tuple(shape))]
+    try:
+        import numpy as np
+
+        inputs.append(("numpy", np.zeros(shape, dtype=np.uint8)))
+    except ImportError:
+        pass
+    try:
+        import torch
+
+        inputs.append(("torch", torch.zeros(shape, dtype=torch.uint8)))
+    except ImportError:
+        pass
+    for name, value in inputs:
+        cases["get_shape/" + name] = lambda v=value: tools.get_shape(v)
+        cases["guard_input/" + name] = lambda v=value: tools.guard(v, "B, C, H, W", {})
+
+    # the global API, through the current scope of tensorguard/__init__.py
+    global_shape = SHAPES["B, T, D"]
+    cases["global/guard"] = lambda: tg.guard(global_shape, "B, T, D")
+    cases["global/matches"] = lambda: tg.matches(global_shape, "B, T, D")
+    cases["global/evaluate"] = lambda: tg.evaluate("B, T*2, D", T=64)
+    cases["global/get_dims"] = lambda: tg.get_dims("B, T, D")
+    try:
+        import numpy as np
+
+        array = np.zeros([32, 128, 4])
+        cases["global/reshape"] = lambda: tg.reshape(array, "B, T*4")
+    except ImportError:
+        pass
+    return cases
+
+
+def run(
+    name_filter: Optional[str] = None, number: Optional[int] = None, repeat: int = 5
+) -> "OrderedDict[str, Dict[str, float]]":
+    """Run the benchmarks whose name contains name_filter. Return {name: {"us": time per call, "number": calls}}."""
+    tg.reset()
+    tg.set_dims(B=32, T=128, D=512)  # known by the global benchmarks
+    results = OrderedDict()  # type: OrderedDict[str, Dict[str, float]]
+    for name, fn in benchmarks().items():
+        if name_filter and name_filter not in name:
+            continue
+        timer = timeit.Timer(fn)
+        calls = number or timer.autorange()[0]
+        best = min(timer.repeat(repeat=repeat, number=calls))
+        results[name] = {"us": best / calls * 1e6, "number": calls}
+    tg.reset()
+    return results
+
+
+def metadata() -> Dict[str, str]:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL)
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "tensorguard": tg.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "commit": commit,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float
+) -> List[Tuple[str, float]]:
+    """Return the (name, ratio) of the benchmarks slower than baseline by more than threshold (0.1 = 10%)."""
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            ratio = result["us"] / baseline[name]["us"]
+            if ratio > 1 + threshold:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--filter", help="run only the benchmarks whose name contains this string")
+    arg_parser.add_argument("--number", type=int, default=None, help="calls per repeat, default: timeit autorange")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="repeats, the best one is kept")
+    arg_parser.add_argument("--output", help="save the results to this JSON file")
+    arg_parser.add_argument("--compare", help="JSON file of a previous run to compare with")
+    arg_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="relative slowdown failing the comparison, default 0.10")
+    args = arg_parser.parse_args(argv)
+
+    baseline = {}  # type: Dict[str, Dict[str, float]]
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    results = run(args.filter, args.number, args.repeat)
+
+    print("{:<60} {:>10} {:>10}".format("benchmark", "us/call", "vs base" if baseline else ""))
+    for name, result in results.items():
+        ratio = "{:.2f}x".format(result["us"] / baseline[name]["us"]) if name in baseline else ""
+        print("{:<60} {:>10.3f} {:>10}".format(name[:60], result["us"], ratio))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"metadata": metadata(), "results": results}, f, indent=2)
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print("REGRESSION {}: {:.2f}x slower (threshold {:.0%})".format(name, ratio, args.threshold))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
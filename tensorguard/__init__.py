@@ -11,12 +11,28 @@
 # limitations under the License.
 
 """This python module contains ShapeGuard."""
-from copy import copy
-from typing import Optional, List, Any, Union, Dict
-
+import os
+import sys
+from typing import Optional, List, Any, Union, Dict, Iterable, Iterator, Tuple
+
+from tensorguard import checkpoints
+from tensorguard import files
+from tensorguard import parser
+from tensorguard import profiling
+from tensorguard import sampling
+from tensorguard import scopes
+from tensorguard import streams
 from tensorguard import tools
-from tensorguard.exception import ShapeError
+from tensorguard import vectorized
+from tensorguard.cache import CacheInfo
+from tensorguard.dims import LayeredDims
+from tensorguard.decorators import guarded
+from tensorguard.levels import GuardLevel, get_level, set_level, using_level
+from tensorguard.sampling import FirstThenEvery, UntilStable, Probability
+from tensorguard.exception import ShapeError, MultipleShapeError, TemplateSyntaxError
 from tensorguard.guard import TensorGuard
+from tensorguard.scopes import scope
+from tensorguard.streams import GuardedCollate, WorkerInit
 
 __version__ = "1.0.3"
 
@@ -27,22 +43,28 @@ __url__ = "https://github.com/Michedev/tensorguard"
 
 from tensorguard.tools import ShapedTensor
 
-__tg = TensorGuard()
+
+
+def current_guard() -> TensorGuard:
+    """
+    Return the TensorGuard used by the global functions: the one of the innermost
+    active scope of the current thread or asyncio task, or the process-wide one
+    """
+    return scopes.current()
 
 
 def reset():
     """
-    Reset global tensorguard
+    Reset global tensorguard. Inside a scope, only the dims of the scope are reset
     """
-    global __tg
-    __tg = TensorGuard()
+    scopes.reset()
 
 
 def matches(tensor: Union[ShapedTensor, List[int]], template: str) -> bool:
     """
     Return True if tensor shape matches template
     """
-    return tools.matches(tensor, template, __tg.dims)
+    return scopes.current().matches(tensor, template)
 
 
 def guard(tensor: Union[ShapedTensor, List[int]], template: str) -> Union[ShapedTensor, List[int]]:
@@ -53,19 +75,145 @@ def guard(tensor: Union[ShapedTensor, List[int]], template: str) -> Union[Shaped
     :type template: str
     :return: input tensor
     """
-    inferred_dims = tools.guard(tensor, template, __tg.dims)
-    __tg.dims.update(inferred_dims)
-    return tensor
+    guardian = scopes.current()
+    sampler = guardian.sampler
+    if sampler is None:
+        return guardian._guard(tensor, template)
+    return guardian._sampled_guard(sampler, sys._getframe(1), tensor, template)
+
+
+def guard_all(pairs: Iterable[Tuple[Union[ShapedTensor, List[int]], str]]) -> List[Union[ShapedTensor, List[int]]]:
+    """
+    Check several tensors at once, inferring the shared named dims together.
+    If any tensor does not match, raise a MultipleShapeError listing every mismatch
+    and leave the known dims untouched.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> x, mask = tg.guard_all([(x, "B, T, D"), (mask, "B, T")])
+
+    :param pairs: sequence of (tensor, template) pairs
+    :return: list of the input tensors
+    """
+    return scopes.current().guard_many(pairs)
+
+
+def guard_tree(value: Any, tree: Union[str, Dict, List, Tuple]) -> Any:
+    """
+    Check a nested structure of tensors against a template tree of the same structure.
+    Dict keys select the items of mappings or the attributes of other objects (e.g. dataclasses),
+    list and tuple positions select the items of sequences. The tree is compiled once and cached
+    by structure; the named dims are updated only if every leaf matches.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> batch = tg.guard_tree(batch, {"image": "B, 3, H, W", "labels": "B", "meta": {"mask": "B, H, W"}})
+
+    :param value: the nested structure of tensors
+    :param tree: the nested structure of templates
+    :return: value
+    """
+    return scopes.current().guard_tree(value, tree)
+
+
+def guard_stream(
+    iterable: Iterable, tree: Union[str, Dict, List, Tuple], on_error: str = "raise",
+    persistent: Union[bool, Iterable[str]] = False,
+) -> streams.GuardedStream:
+    """
+    Wrap an iterable of batches (e.g. a DataLoader or a generator), checking every batch against
+    a template or a template tree when it is consumed. Every batch is checked with its own dims,
+    on top of the dims of the current scope, except the persistent ones.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> for batch in tg.guard_stream(loader, {"x": "B, T, D", "y": "B"}, on_error="skip", persistent=["D"]):
+    ...     train_step(batch)
+
+    :param on_error: "raise", "skip" the mismatching batches, or skip them and "collect" their errors
+        in the errors attribute of the returned stream as (index, MultipleShapeError)
+    :param persistent: names which must keep the value inferred from the first batch, or True for all names
+    """
+    return streams.GuardedStream(iterable, tree, on_error, persistent)
+
+
+def match_shapes(shapes, template: str, mask=None) -> vectorized.ShapeMatches:
+    """
+    Check many shapes at once with NumPy, e.g. the shapes of a whole dataset.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> result = tg.match_shapes(np.array([[100, 80], [120, 80], [90, 40]]), "T, 80")
+    >>> result.matches
+    array([ True,  True, False])
+    >>> result.dims["T"]
+    array([100, 120,  90])
+
+    :param shapes: (N, rank) integer array or sequence of shapes. Negative entries are dynamic (None) dims
+    :param template: the shape template
+    :param mask: optional (N, rank) boolean array of the valid entries of each row, for ragged ranks
+    :return: named tuple (matches, dims) of a boolean array and a dictionary {name: int array},
+             with -1 where a dim could not be inferred
+    """
+    return vectorized.match_shapes(shapes, template, scopes.current().dims, mask)
+
+
+def guard_file(path: str, template: Union[str, Dict[str, str]]) -> files.FileMatch:
+    """
+    Check the arrays of a .npy or .npz file by reading only their headers, without loading them.
+    The known dims are used but not modified. Mismatches are reported, not raised.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> tg.guard_file("features/utt1.npy", "T, 80")
+    FileMatch(path='features/utt1.npy', shapes={'': (412, 80)}, matches=True, dims={'T': 412}, errors=[])
+
+    :param path: path of the file
+    :param template: template of every array, or {member name: template} for a .npz archive
+    :return: named tuple (path, shapes, matches, dims, errors)
+    """
+    return files.guard_file(path, template, scopes.current().dims)
+
+
+def guard_dir(
+    directory: str, template: Union[str, Dict[str, str]], pattern: str = "*.np[yz]", recursive: bool = True
+) -> Iterator[files.FileMatch]:
+    """
+    Check every .npy / .npz file of directory like guard_file, yielding a FileMatch per file.
+    """
+    return files.guard_dir(directory, template, scopes.current().dims, pattern, recursive)
+
 
 
+def guard_checkpoint(path: str, templates: Dict[Any, str]) -> checkpoints.CheckpointMatch:
+    """
+    Check the tensors of a safetensors checkpoint by reading only its JSON header.
+    Tensor names are matched with glob patterns (or compiled regular expressions) and all
+    the tensors share their named dims. The known dims are used but not modified.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> tg.guard_checkpoint("model.safetensors", {"encoder.layer.*.weight": "D, D", "embed.weight": "V, D"}).dims
+    {'D': 768, 'V': 32000}
+
+    :param path: path of the .safetensors file
+    :param templates: {pattern: template}, each tensor is checked against the first pattern matching its name
+    :return: named tuple (shapes, dims) of the checked tensors and of the inferred dims
+    """
+    return checkpoints.guard_checkpoint(path, templates, scopes.current().dims)
+
 def reshape(tensor: Union[ShapedTensor, List[int]], template: str):
-    return tools.reshape(tensor, template, __tg.dims)
+    return tools.reshape(tensor, template, scopes.current().dims)
 
 
 def evaluate(template: str, **kwargs) -> List[Optional[int]]:
-    local_dims = copy(__tg.dims)
-    local_dims.update(kwargs)
-    return tools.evaluate(template, local_dims)
+    return tools.evaluate(template, LayeredDims(scopes.current().dims, kwargs))
 
 
 def get_dims(template: Optional[str] = None) -> Union[Dict[str, int], List[Optional[int]]]:
@@ -87,9 +235,9 @@ def get_dims(template: Optional[str] = None) -> Union[Dict[str, int], List[Optio
     :rtype: 
     """
     if template is None:
-        return __tg.dims
+        return scopes.current().dims
     else:
-        return tools.evaluate(template, __tg.dims)
+        return tools.evaluate(template, scopes.current().dims)
 
 
 def get_dim(item: str) -> Any:
@@ -101,7 +249,7 @@ def get_dim(item: str) -> Any:
     :rtype:
     """
     try:
-        return __tg.dims[item]
+        return scopes.current().dims[item]
     except KeyError:
         raise KeyError(item)
 
@@ -118,7 +266,7 @@ def safe_get_dim(item: str) -> Any:
 
 
 def has_dim(key: str) -> bool:
-    return key in __tg.dims
+    return key in scopes.current().dims
 
 
 def set_dim(key: str, value: Any):
@@ -130,7 +278,7 @@ def set_dim(key: str, value: Any):
     :type value:
     :return: None
     """
-    __tg.dims[key] = value
+    scopes.current().dims[key] = value
 
 def set_dims(**kwargs):
     """
@@ -152,7 +300,7 @@ def del_dim(item: str):
     :return: None
     """
     try:
-        del __tg.dims[item]
+        del scopes.current().dims[item]
     except KeyError:
         raise KeyError(item)
 
@@ -172,18 +320,175 @@ def clear_dims():
     """
     Remove all the shape tokens
     """
-    keys = list(__tg.dims.keys())
+    keys = list(scopes.current().dims.keys())
     for k in keys:
         del_dim(k)
 
+
+def cache_info() -> CacheInfo:
+    """
+    Return the statistics of the process-wide cache of parsed templates
+    as a named tuple (hits, misses, evictions, maxsize, currsize).
+    """
+    return parser.spec_cache.info()
+
+
+def set_cache_size(maxsize: Optional[int]):
+    """
+    Resize the process-wide cache of parsed templates, evicting the least
+    recently used entries if needed.
+    :param maxsize: maximum number of cached templates. None means unbounded, 0 disables the cache
+    :type maxsize: Optional[int]
+    :return: None
+    """
+    parser.spec_cache.resize(maxsize)
+
+
+def clear_cache():
+    """
+    Remove all the parsed templates from the process-wide cache and reset its statistics
+    """
+    parser.spec_cache.clear()
+
+
+def set_memo_size(maxsize: Optional[int]):
+    """
+    Memoize the results of guard in the current TensorGuard, which is shared by the scopes opened from it.
+    Guarding the same template and shape with the same values of the dims the template mentions
+    then returns right away.
+    :param maxsize: maximum number of memoized results. None means unbounded, 0 disables the memo
+    :type maxsize: Optional[int]
+    :return: None
+    """
+    scopes.current().set_memo_size(maxsize)
+
+
+def set_sampling(policy: Optional[sampling.Policy]):
+    """
+    Check only some of the calls of guard, chosen for each call site by policy.
+    The policy applies to the current TensorGuard and to the scopes opened from it.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> tg.set_sampling(tg.FirstThenEvery(first=1000, every=100))
+    >>> tg.set_sampling(tg.UntilStable(1000))  # stop after 1000 consecutive passing checks
+    >>> tg.set_sampling(tg.Probability(0.01))
+    >>> tg.set_sampling(None)  # check every call
+
+    :param policy: the sampling policy, None checks every call
+    :return: None
+    """
+    scopes.current().set_sampling(policy)
+
+
+def sampling_stats() -> Dict[str, sampling.SiteStats]:
+    """
+    Return the (checked, skipped, failed) counters of every guard call site, by "filename:line".
+    """
+    return scopes.current().sampling_stats()
+
+
+def memo_info() -> Optional[CacheInfo]:
+    """
+    Return the statistics of the memo of guard results of the current TensorGuard,
+    or None if it is disabled.
+    """
+    return scopes.current().memo_info()
+
+
+def profile(max_samples: int = 4096):
+    """
+    Context manager profiling guard, matches and reshape in a with block, per template and per call site.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> with tg.profile() as profiler:
+    ...     train_step(batch)
+    >>> profiler.stats().templates["B, T, D"]
+    TimingStats(calls=..., failures=0, cache_misses=0, parse=..., check=..., error=0.0, total=..., p50=..., p99=...)
+
+    :param max_samples: call durations kept per template and per call site for the percentiles
+    """
+    return profiling.profile(max_samples)
+
+
+def set_profiling(enabled: bool):
+    """
+    Start a new profiler, or stop the active one. Without profiler guard only pays for one attribute lookup.
+    """
+    if enabled:
+        profiling.start()
+    else:
+        profiling.stop()
+
+
+def stats() -> profiling.ProfileStats:
+    """
+    Return the snapshot of the active profiler, or of the last one: TimingStats by template and by
+    call site ("filename:line"), and the statistics of the template cache.
+    """
+    return profiling.stats()
+
+
+def precompile(templates: Iterable[str], path: Optional[str] = None) -> int:
+    """
+    Parse and compile templates ahead of time, so that the first guard of each one is as fast as
+    the next ones. If path is given, the specs are also saved to that spec file (merged with its
+    current content), which new processes load with load_precompiled or the TENSORGUARD_SPEC_CACHE
+    environment variable. Raise TemplateSyntaxError on the first malformed template.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> tg.precompile(["B, C, H, W", "B, T, D"], path="specs.bin")
+    2
+
+    :return: the number of templates precompiled
+    """
+    from tensorguard import registry  # imports pickle and hashlib
+
+    if path is None:
+        return len(registry.precompile(templates))
+    return registry.precompile_to(path, templates)[0]
+
+
+def load_precompiled(path: str) -> int:
+    """
+    Load a spec file written by precompile into the template cache, with a single read and without
+    parsing. Files written by another version of tensorguard or of Python, or with another grammar,
+    are ignored. Only load files written by trusted processes (they are pickles).
+    :return: the number of templates loaded
+    """
+    from tensorguard import registry
+
+    return registry.load(path)
+
+
 __all__ = (
     "TensorGuard",
+    "LayeredDims",
+    "current_guard",
+    "scope",
     "__version__",
     "__author__",
     "__author_email__",
     "ShapeError",
+    "MultipleShapeError",
+    "TemplateSyntaxError",
     "guard",
+    "guard_all",
+    "guard_tree",
+    "guard_stream",
+    "guard_file",
+    "guard_dir",
+    "guard_checkpoint",
+    "GuardedCollate",
+    "WorkerInit",
+    "guarded",
     "matches",
+    "match_shapes",
     "reshape",
     "evaluate",
     "get_dim",
@@ -195,4 +500,32 @@ __all__ = (
     "safe_del_dim",
     "get_dims",
     "clear_dims",
+    "cache_info",
+    "set_cache_size",
+    "clear_cache",
+    "set_memo_size",
+    "memo_info",
+    "set_sampling",
+    "sampling_stats",
+    "profile",
+    "set_profiling",
+    "stats",
+    "precompile",
+    "load_precompiled",
+    "FirstThenEvery",
+    "UntilStable",
+    "Probability",
+    "GuardLevel",
+    "get_level",
+    "set_level",
+    "using_level",
 )
+
+
+if os.environ.get("TENSORGUARD_SPEC_CACHE"):  # registry.ENV_VAR
+    try:
+        load_precompiled(os.environ["TENSORGUARD_SPEC_CACHE"])
+    except Exception as error:  # the spec cache only saves time, it must never break the import
+        import warnings
+
+        warnings.warn("Could not load the spec file {}: {!r}".format(os.environ["TENSORGUARD_SPEC_CACHE"], error))
@@ -0,0 +1,277 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Audits the shapes of the tensor files of a dataset, in parallel.
+
+Files are checked from their headers with tensorguard.files, in batches
+handed to a process pool. At most a few batches per process are in flight,
+so millions of paths are streamed without keeping all of them in memory, and
+the results come out in the order of the paths.
+
+Every result is a JSON line. With a checkpoint file the results are also
+appended there as soon as they are written, and a later run with the same
+checkpoint skips the files already audited, counting their results in the
+statistics. The first line of a checkpoint records the templates and dims of
+the audit, and a run with other ones refuses to resume from it.
+
+Usage::
+
+    python -m tensorguard audit features/ -t "T, 80" --jobs 16 --checkpoint audit.jsonl
+    python -m tensorguard audit --manifest files.txt --member "x=T, 80" --member "y=T" > results.jsonl
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import fnmatch
+import itertools
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from tensorguard import exception
+from tensorguard import files
+from tensorguard import parser
+
+# files audited by default, when walking a directory
+DEFAULT_PATTERNS = ["*.npy", "*.npz", "*.pt", "*.pth"]
+
+
+def audit_file(path: str, templates: files.TemplatesType, dims: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """Check one file and return its JSON result. Never raises."""
+    try:
+        result = files.guard_file(path, templates, dims)
+    except Exception as error:  # unreadable or unsupported files are reported, not raised
+        result = files.FileMatch(path, {}, False, {}, [(None, error)])
+    return {
+        "path": result.path,
+        "matches": result.matches,
+        "shapes": {key: list(shape) for key, shape in result.shapes.items()},
+        "dims": result.dims,
+        "errors": [{"key": key, "error": "{}: {}".format(type(error).__name__, error)} for key, error in result.errors],
+    }
+
+
+def audit_batch(paths: List[str], templates: files.TemplatesType, dims: Optional[Dict[str, int]]) -> List[Dict]:
+    return [audit_file(path, templates, dims) for path in paths]
+
+
+def audit(
+    paths: Iterable[str],
+    templates: files.TemplatesType,
+    dims: Optional[Dict[str, int]] = None,
+    jobs: Optional[int] = None,
+    batch_size: int = 64,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the JSON result of every path, in order.
+
+    :param jobs: number of worker processes, None for one per CPU, 0 to audit in the current process
+    :param batch_size: number of paths sent to a worker at once
+    """
+    paths = iter(paths)
+    batches = iter(lambda: list(itertools.islice(paths, batch_size)), [])
+    if jobs == 0:
+        for batch in batches:
+            yield from audit_batch(batch, templates, dims)
+        return
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        # bounded window of batches in flight, consumed in submission order
+        window = 2 * jobs
+        pending = collections.deque()  # type: collections.deque
+        for batch in batches:
+            pending.append(executor.submit(audit_batch, batch, templates, dims))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+class AuditStats:
+    """Counters of the audit results and histograms of the inferred dims."""
+
+    def __init__(self):
+        self.files = 0
+        self.matches = 0
+        self.mismatches = 0
+        self.unreadable = 0
+        self.dims = collections.defaultdict(collections.Counter)  # type: Dict[str, collections.Counter]
+
+    def add(self, result: Dict[str, Any]):
+        self.files += 1
+        if result["matches"]:
+            self.matches += 1
+        elif any(error["key"] is None for error in result["errors"]):
+            self.unreadable += 1
+        else:
+            self.mismatches += 1
+        for name, value in result["dims"].items():
+            self.dims[name][value] += 1
+
+    def report(self, top: int = 10) -> str:
+        lines = ["files: {}, matches: {}, mismatches: {}, unreadable: {}".format(
+            self.files, self.matches, self.mismatches, self.unreadable
+        )]
+        for name in sorted(self.dims):
+            counter = self.dims[name]
+            values = ", ".join("{} ({})".format(value, count) for value, count in counter.most_common(top))
+            if len(counter) > top:
+                values += ", ... {} more values".format(len(counter) - top)
+            lines.append("{}: {}".format(name, values))
+        return "\n".join(lines)
+
+
+def read_settings(path: str) -> Optional[Dict[str, Any]]:
+    """Return the templates and dims recorded in the first line of the checkpoint file, None if there are none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as checkpoint:
+        try:
+            header = json.loads(checkpoint.readline())
+        except ValueError:
+            return None
+    return header.get("audit") if isinstance(header, dict) else None
+
+
+def read_checkpoint(path: str, stats: AuditStats) -> Set[str]:
+    """Return the paths already audited in the checkpoint file, adding their results to stats."""
+    done = set()  # type: Set[str]
+    if not os.path.exists(path):
+        return done
+    with open(path) as checkpoint:
+        for line in checkpoint:
+            try:
+                result = json.loads(line)
+            except ValueError:  # line truncated by an interrupted run
+                continue
+            if "path" in result and result["path"] not in done:
+                done.add(result["path"])
+                stats.add(result)
+    return done
+
+
+def list_paths(args: argparse.Namespace) -> Iterator[str]:
+    if args.manifest is not None:
+        with open(args.manifest) as manifest:
+            for line in manifest:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield line
+    for directory in args.directories:
+        if os.path.isfile(directory):
+            yield directory
+            continue
+        for path in files.iter_files(directory, "*", recursive=True):
+            name = os.path.basename(path)
+            if any(fnmatch.fnmatch(name, pattern) for pattern in args.pattern or DEFAULT_PATTERNS):
+                yield path
+
+
+def parse_dim(value: str) -> Tuple[str, int]:
+    name, _, number = value.partition("=")
+    try:
+        return name.strip(), int(number)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid dim {!r}, expected NAME=VALUE".format(value))
+
+
+def parse_member(value: str) -> Tuple[str, str]:
+    name, sep, template = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("invalid member {!r}, expected NAME=TEMPLATE".format(value))
+    return name.strip(), template
+
+
+def add_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "audit", help="check the shapes of tensor files", description="Check the shapes of .npy, .npz and .pt files "
+        "against a template from their headers, in parallel, printing a JSON line per file."
+    )
+    parser.add_argument("directories", nargs="*", metavar="PATH", help="files or directories to audit")
+    templates = parser.add_mutually_exclusive_group(required=True)
+    templates.add_argument("--template", "-t", help='template of every array, e.g. "T, 80"')
+    templates.add_argument("--member", action="append", type=parse_member, metavar="NAME=TEMPLATE",
+                           help="template of a member of the .npz / .pt files, can be repeated")
+    parser.add_argument("--manifest", help="file listing the paths to audit, one per line")
+    parser.add_argument("--pattern", action="append", help="file name pattern of the files in the directories, "
+                        "default: {}".format(" ".join(DEFAULT_PATTERNS)))
+    parser.add_argument("--dim", action="append", type=parse_dim, metavar="NAME=VALUE", help="known dim")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes, default one per CPU, "
+                        "0 for none")
+    parser.add_argument("--batch-size", type=int, default=64, help="paths sent to a worker at once")
+    parser.add_argument("--checkpoint", help="JSON lines file the results are appended to, "
+                        "used to resume an interrupted audit")
+    parser.add_argument("--quiet", "-q", action="store_true", help="do not print the results, only the statistics")
+    parser.set_defaults(run=run)
+    return parser
+
+
+def open_checkpoint(path: str, settings: Dict[str, Any]) -> TextIO:
+    """
+    Open the checkpoint file for appending, terminating a line truncated by an interrupted run.
+    A new checkpoint starts with the settings (templates and dims) of the audit.
+    """
+    checkpoint = open(path, "a+")
+    if checkpoint.tell() > 0:
+        checkpoint.seek(checkpoint.tell() - 1)
+        if checkpoint.read(1) != "\n":
+            checkpoint.write("\n")
+    else:
+        checkpoint.write(json.dumps({"audit": settings}, sort_keys=True) + "\n")
+    return checkpoint
+
+
+def run(args: argparse.Namespace, stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """Run the audit command. Return 0 if every file matches, 1 otherwise."""
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+    templates = dict(args.member) if args.member else args.template  # type: files.TemplatesType
+    if args.manifest is None and not args.directories:
+        stderr.write("error: no path to audit\n")
+        return 2
+    dims = dict(args.dim or [])
+    # a malformed template would make every file fail, and be recorded in the checkpoint
+    try:
+        for template in [templates] if isinstance(templates, str) else templates.values():
+            parser.get_spec(template)
+    except exception.TemplateSyntaxError as error:
+        stderr.write("error: {}\n".format(error))
+        return 2
+    settings = {"templates": templates, "dims": dims}
+    if args.checkpoint:
+        previous = read_settings(args.checkpoint)
+        if previous is not None and previous != settings:
+            stderr.write("error: the checkpoint {} was written by an audit with other templates or dims: {}\n".format(
+                args.checkpoint, json.dumps(previous, sort_keys=True)
+            ))
+            return 2
+    stats = AuditStats()
+    done = read_checkpoint(args.checkpoint, stats) if args.checkpoint else set()
+    paths = (path for path in list_paths(args) if path not in done)
+    checkpoint = open_checkpoint(args.checkpoint, settings) if args.checkpoint else None
+    try:
+        for result in audit(paths, templates, dims, args.jobs, args.batch_size):
+            line = json.dumps(result, sort_keys=True) + "\n"
+            if not args.quiet:
+                stdout.write(line)
+            if checkpoint is not None:
+                checkpoint.write(line)
+                checkpoint.flush()
+            stats.add(result)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        stdout.flush()
+        stderr.write(stats.report() + "\n")
+    return 0 if stats.matches == stats.files else 1
@@ -0,0 +1,100 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Defines a small size-bounded LRU cache with hit/miss/eviction counters."""
+
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Any, Hashable, Optional
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+
+class LRUCache:
+    """Least-recently-used mapping with a bounded number of entries.
+
+    A maxsize of None means unbounded, a maxsize of 0 disables caching
+    (every lookup is a miss and nothing is stored).
+
+    Lookups are lock-free; insertions, resizing and clearing are serialized
+    with a lock so that evictions stay consistent across threads. Counters
+    are best-effort under concurrent access.
+    """
+
+    def __init__(self, maxsize: Optional[int] = 128):
+        self._data = OrderedDict()  # type: OrderedDict
+        self._lock = threading.Lock()
+        self._maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self) -> Optional[int]:
+        return self._maxsize
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        try:
+            self._data.move_to_end(key)
+        except KeyError:  # evicted concurrently
+            pass
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self._maxsize == 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize: Optional[int]):
+        if maxsize is not None and maxsize < 0:
+            raise ValueError("maxsize must be None or >= 0, got {}".format(maxsize))
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict()
+
+    def clear(self, reset_stats: bool = True):
+        with self._lock:
+            self._data.clear()
+            if reset_stats:
+                self.hits = self.misses = self.evictions = 0
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, self._maxsize, len(self._data))
+
+    def _evict(self):
+        if self._maxsize is None:
+            return
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return "<LRUCache {}>".format(self.info())
@@ -0,0 +1,128 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks the tensors of safetensors checkpoints from their header.
+
+A safetensors file starts with the length of its header as a little-endian
+unsigned 64-bit integer, followed by the header: a JSON object mapping every
+tensor name to its dtype, shape and data offsets, plus an optional
+"__metadata__" entry. Only these bytes of the memory-mapped file are read, so
+checking a checkpoint takes the same time whatever the size of its tensors,
+and the safetensors package is not needed.
+
+Example:
+
+>>> import tensorguard as tg
+>>> tg.guard_checkpoint("model.safetensors", {
+...     "embed.weight": "V, D",
+...     "encoder.layer.*.attn.*.weight": "D, D",
+...     re.compile(r"encoder\\.layer\\.\\d+\\.mlp\\.up\\.weight"): "4*D, D",
+... })
+CheckpointMatch(shapes={...}, dims={'V': 32000, 'D': 768})
+"""
+
+import fnmatch
+import json
+import mmap
+import re
+import struct
+from collections import namedtuple
+from typing import Any, Dict, List, Mapping, Optional, Pattern, Tuple, Union
+
+from tensorguard import exception
+from tensorguard import parser
+from tensorguard import tools
+from tensorguard.dims import LayeredDims
+
+# largest header accepted, as in the reference implementation
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
+METADATA = "__metadata__"
+
+CheckpointMatch = namedtuple("CheckpointMatch", ["shapes", "dims"])
+CheckpointMatch.__doc__ = """
+Result of checking a checkpoint.
+
+shapes: {tensor name: shape} of the checked tensors
+dims: the named dims inferred from the checkpoint
+"""
+
+PatternType = Union[str, Pattern]
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Return the header of a safetensors file, without the "__metadata__" entry."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if len(data) < 8:
+                raise ValueError("{} is not a safetensors file (too short)".format(path))
+            (size,) = struct.unpack("<Q", data[:8])
+            if size > MAX_HEADER_SIZE or 8 + size > len(data):
+                raise ValueError("{} is not a safetensors file (header size {})".format(path, size))
+            raw = data[8:8 + size]
+    try:
+        header = json.loads(raw.decode("utf8"))
+    except ValueError:
+        raise ValueError("{} is not a safetensors file (invalid header)".format(path))
+    if not isinstance(header, dict):
+        raise ValueError("{} is not a safetensors file (invalid header)".format(path))
+    header.pop(METADATA, None)
+    return header
+
+
+def read_shapes(path: str) -> Dict[str, Tuple[int, ...]]:
+    """Return the {tensor name: shape} of a safetensors file, in the order of the header."""
+    return {name: tuple(info["shape"]) for name, info in read_header(path).items()}
+
+
+def compile_pattern(pattern: PatternType) -> Pattern:
+    """Compile a glob pattern of tensor names, or return a compiled regular expression unchanged."""
+    if isinstance(pattern, str):
+        return re.compile(fnmatch.translate(pattern))
+    return pattern
+
+
+def guard_checkpoint(
+    path: str, templates: Mapping[PatternType, str], dims: Optional[Dict[str, int]] = None
+) -> CheckpointMatch:
+    """
+    Check the tensors of a safetensors file against templates, reading only the header.
+    Every tensor is checked against the template of the first pattern matching its whole
+    name; tensors matched by no pattern are not checked. All the tensors share their named
+    dims. Raise a MultipleShapeError listing every mismatching tensor and every pattern
+    matching no tensor.
+
+    :param path: path of the safetensors file
+    :param templates: {glob pattern or compiled regular expression: template}
+    :param dims: known dims, not modified
+    """
+    patterns = [(pattern, compile_pattern(pattern), template) for pattern, template in templates.items()]
+    specs = {template: parser.get_spec(template) for template in templates.values()}
+    shapes = {}  # type: Dict[str, Tuple[int, ...]]
+    checks = []  # type: List[Tuple[List[int], Any]]
+    used = set()
+    for name, shape in read_shapes(path).items():
+        for i, (_, regex, template) in enumerate(patterns):
+            if regex.fullmatch(name):
+                used.add(i)
+                shapes[name] = shape
+                checks.append((list(shape), specs[template].compile()))
+                break
+    inferred, errors = tools.solve(checks, LayeredDims(dims))
+    names = list(shapes)
+    errors = [(names[i], error) for i, error in errors]
+    for i, (pattern, regex, _) in enumerate(patterns):
+        if i not in used:
+            errors.append((getattr(pattern, "pattern", pattern), exception.ShapeError("No tensor matches the pattern")))
+    if errors:
+        raise exception.MultipleShapeError(errors, context="in {}".format(path))
+    return CheckpointMatch(shapes, inferred)
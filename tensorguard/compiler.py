@@ -0,0 +1,351 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compiles a ShapeSpec into a specialized Python checker function.
+
+The generated function has the signature ``check(shape, known_dims)``. It
+unrolls the rank check, reads every named dimension from ``known_dims`` once,
+infers the unknown ones with inlined arithmetic, in the order given by the
+inference plan of the spec (see solver.py), and finally checks every shape
+entry. It returns the dictionary of newly inferred dimensions (names
+starting with ``_`` are excluded) or raises ShapeError.
+
+Generated code only depends on the structure of the spec, so it is shared
+between all specs with the same entries (e.g. ``"A,B"`` and ``"A, B"``).
+"""
+
+import marshal
+from types import CodeType
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from tensorguard import cache
+from tensorguard import dim_specs
+from tensorguard import exception
+
+CheckerType = Callable[[List[Optional[int]], Dict[str, int]], Dict[str, int]]
+
+_OPERATORS = {
+    dim_specs.AddDims: "+",
+    dim_specs.SubDims: "-",
+    dim_specs.MulDims: "*",
+    dim_specs.DivDims: "//",
+}
+# expressions inverting an OpSpec from the target value and the other side,
+# see OpSpec.left_op / OpSpec.right_op
+_LEFT_INVERSE = {
+    dim_specs.AddDims: "({target} - {other})",
+    dim_specs.SubDims: "({target} + {other})",
+    dim_specs.MulDims: "({target} // {other})",
+    dim_specs.DivDims: "({target} * {other})",
+}
+_RIGHT_INVERSE = {
+    dim_specs.AddDims: "({target} - {other})",
+    dim_specs.SubDims: "({other} - {target})",
+    dim_specs.MulDims: "({target} // {other})",
+    dim_specs.DivDims: "({other} // {target})",
+}
+# the divisor of the inverse expressions above, which must not be zero
+_LEFT_DIVISOR = {dim_specs.MulDims: "other"}
+_RIGHT_DIVISOR = {dim_specs.MulDims: "other", dim_specs.DivDims: "target"}
+
+# checker factories keyed by the structure of the spec entries
+_factories = cache.LRUCache(maxsize=1024)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _CodeGen:
+    def __init__(self, spec):
+        self.spec = spec
+        self.lines = []  # type: List[str]
+        self.names = {}  # type: Dict[str, str]
+        self.temps = 0
+        for entry in spec.entries:
+            self._collect_names(entry)
+
+    def _collect_names(self, dim: dim_specs.DimSpec):
+        if isinstance(dim, dim_specs.NamedDim):
+            self.names.setdefault(dim.name, "n{}".format(len(self.names)))
+        elif isinstance(dim, dim_specs.OpSpec):
+            self._collect_names(dim.left)
+            self._collect_names(dim.right)
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    # ---- expressions -------------------------------------------------------
+
+    def expr(self, dim: dim_specs.DimSpec) -> str:
+        if isinstance(dim, dim_specs.Number):
+            return repr(dim.value)
+        if isinstance(dim, dim_specs.NamedDim):
+            return self.names[dim.name]
+        if type(dim) in _OPERATORS:
+            return "({} {} {})".format(self.expr(dim.left), _OPERATORS[type(dim)], self.expr(dim.right))
+        raise _Unsupported(dim)
+
+    def variables(self, dim: dim_specs.DimSpec) -> List[str]:
+        if isinstance(dim, dim_specs.NamedDim):
+            return [self.names[dim.name]]
+        if isinstance(dim, dim_specs.OpSpec):
+            return self.variables(dim.left) + [v for v in self.variables(dim.right)
+                                               if v not in self.variables(dim.left)]
+        return []
+
+    def known(self, dim: dim_specs.DimSpec) -> List[str]:
+        """Conditions under which dim can be evaluated: its names are known and it divides by no zero."""
+        conditions = ["{} is not None".format(v) for v in self.variables(dim)]
+        return conditions + [c for divisor in self.divisors(dim) for c in self.nonzero(divisor)]
+
+    def divisors(self, dim: dim_specs.DimSpec) -> List[str]:
+        """Expressions of the divisors of dim, inner ones first."""
+        if not isinstance(dim, dim_specs.OpSpec):
+            return []
+        divisors = self.divisors(dim.left) + self.divisors(dim.right)
+        if isinstance(dim, dim_specs.DivDims):
+            divisors.append(self.expr(dim.right))
+        return divisors
+
+    @staticmethod
+    def nonzero(value: str) -> List[str]:
+        try:
+            return [] if int(value) != 0 else ["False"]
+        except ValueError:
+            return ["{} != 0".format(value)]
+
+    @staticmethod
+    def zero(value: str) -> List[str]:
+        try:
+            return [] if int(value) != 0 else ["True"]
+        except ValueError:
+            return ["{} == 0".format(value)]
+
+    def inverse(self, dim: dim_specs.OpSpec, side: str, target: str) -> Tuple[str, List[str]]:
+        """Return the expression of one side of dim from the target and the conditions to compute it."""
+        other = dim.left if side == "right" else dim.right
+        inverses, divisors = (_RIGHT_INVERSE, _RIGHT_DIVISOR) if side == "right" else (_LEFT_INVERSE, _LEFT_DIVISOR)
+        values = {"target": target, "other": self.expr(other)}
+        conditions = self.known(other)
+        if type(dim) in divisors:
+            conditions += self.nonzero(values[divisors[type(dim)]])
+        return inverses[type(dim)].format(**values), conditions
+
+    def infer_side(self, dim: dim_specs.OpSpec, side: str, value: str, target: str, indent: int):
+        """Emit the code inferring one side of dim from its inverse value. Mirrors OpSpec.infer."""
+        if side == "right" and isinstance(dim, dim_specs.DivDims):
+            # see dim_specs._right_of_div: without an exact solution no divisor matches
+            var = "t{}".format(self.temps)
+            self.temps += 1
+            self.emit(indent, "{} = {}".format(var, value))
+            self.emit(indent, "if {v} == 0 or {left} // {v} != {t}:".format(v=var, left=self.expr(dim.left), t=target))
+            self.emit(indent + 1, "raise mismatch_error(shape, known_dims)")
+            value = var
+        if not self.infer(dim.right if side == "right" else dim.left, value, indent, computed=True):
+            self.emit(indent, "pass")
+
+    # ---- inference ---------------------------------------------------------
+
+    def infer(self, dim: dim_specs.DimSpec, target: str, indent: int, computed: bool = False) -> bool:
+        """Emit the code inferring names of dim from the value target.
+
+        Mirrors DimSpec.infer. computed is True when target is inverted from an
+        expression, and may be negative. Returns False if no code was emitted.
+        """
+        if isinstance(dim, dim_specs.NamedDim):
+            var = self.names[dim.name]
+            self.emit(indent, "if {} is None:".format(var))
+            self.emit(indent + 1, "{} = {}".format(var, target))
+            if computed:
+                self.emit(indent + 1, "if {} < 0:".format(var))
+                self.emit(indent + 2, "raise mismatch_error(shape, known_dims)")
+            if not dim.name.startswith("_"):
+                self.emit(indent + 1, "inferred[{!r}] = {}".format(dim.name, var))
+            return True
+        if isinstance(dim, dim_specs.OpSpec):
+            if type(dim) not in _OPERATORS:
+                raise _Unsupported(dim)
+            if not self.variables(dim):
+                return False
+            right_value, right_conditions = self.inverse(dim, "right", target)
+            left_value, left_conditions = self.inverse(dim, "left", target)
+            # inferring a fully known side is a no-op, so constant sides need no elif branch
+            if not self.variables(dim.left):
+                return self.infer_if(right_conditions, dim, "right", right_value, target, indent)
+            if not self.variables(dim.right):
+                return self.infer_if(left_conditions, dim, "left", left_value, target, indent)
+            self.emit(indent, "if {}:".format(" and ".join(right_conditions)))
+            self.infer_side(dim, "right", right_value, target, indent + 1)
+            self.emit(indent, "elif {}:".format(" and ".join(left_conditions)))
+            self.infer_side(dim, "left", left_value, target, indent + 1)
+            return True
+        if isinstance(dim, (dim_specs.Number, dim_specs.Wildcard, dim_specs.Dynamic)):
+            return False
+        raise _Unsupported(dim)
+
+    def infer_if(
+        self, conditions: List[str], dim: dim_specs.OpSpec, side: str, value: str, target: str, indent: int
+    ) -> bool:
+        if conditions:
+            self.emit(indent, "if {}:".format(" and ".join(conditions)))
+            indent += 1
+        self.infer_side(dim, side, value, target, indent)
+        return True
+
+    # ---- checks ------------------------------------------------------------
+
+    def check(self, dim: dim_specs.DimSpec, s: str, indent: int):
+        """Emit the code raising a mismatch error. Mirrors DimSpec.has_conflict."""
+        if isinstance(dim, dim_specs.Wildcard):
+            return
+        if isinstance(dim, dim_specs.Number):
+            condition = "{} != {!r}".format(s, dim.value)
+        elif isinstance(dim, dim_specs.Dynamic):
+            condition = "{} is not None".format(s)
+        elif isinstance(dim, dim_specs.DynamicNamedDim):
+            condition = "{} is not None and {} != {}".format(s, self.names[dim.name], s)
+        elif isinstance(dim, dim_specs.NamedDim):
+            condition = "{} is None or {} != {}".format(s, self.names[dim.name], s)
+        elif isinstance(dim, dim_specs.OpSpec):
+            # dividing by zero matches no shape, once the value of every name is known
+            mismatch = [c for divisor in self.divisors(dim) for c in self.zero(divisor)]
+            mismatch.append("{} != {}".format(self.expr(dim), s))
+            condition = " and ".join(
+                ["{} is not None".format(s)] + ["{} is not None".format(v) for v in self.variables(dim)]
+                + ["({})".format(" or ".join(mismatch))]
+            )
+        else:
+            raise _Unsupported(dim)
+        self.emit(indent, "if {}:".format(condition))
+        self.emit(indent + 1, "raise mismatch_error(shape, known_dims)")
+
+    # ---- whole function ----------------------------------------------------
+
+    def shape_entries(self):
+        """Yield (local variable, index expression, DimSpec) for every checked entry."""
+        spec = self.spec
+        for i, dim in enumerate(spec.left_entries):
+            yield "s{}".format(i), str(i), dim
+        n_left = len(spec.left_entries)
+        n_right = len(spec.right_entries)
+        for j, dim in enumerate(spec.right_entries):
+            yield "s{}".format(n_left + j), "rank - {}".format(n_right - j), dim
+
+    def generate(self) -> str:
+        spec = self.spec
+        entries = list(self.shape_entries())
+        self.emit(0, "def make(rank_error, mismatch_error):")
+        self.emit(1, "def check(shape, known_dims):")
+        self.emit(2, "rank = len(shape)")
+        if spec.has_ellipsis:
+            self.emit(2, "if rank < {}:".format(len(spec.entries) - 1))
+        else:
+            self.emit(2, "if rank != {}:".format(len(spec.entries)))
+        self.emit(3, "raise rank_error(shape, known_dims)")
+        for s, index, dim in entries:
+            if not isinstance(dim, dim_specs.Wildcard):
+                self.emit(2, "{} = shape[{}]".format(s, index))
+        if self.names:
+            self.emit(2, "get = known_dims.get")
+        for name, var in self.names.items():
+            self.emit(2, "{} = get({!r})".format(var, name))
+        self.emit(2, "inferred = {}")
+        # named entries first, then expressions after the entries they depend on
+        for i, dim in spec.plan.named + spec.plan.steps():
+            s = entries[i][0]
+            self.emit(2, "if {} is not None:".format(s))
+            self.infer(dim, s, 3)
+        for s, _, dim in entries:
+            self.check(dim, s, 2)
+        self.emit(2, "return inferred")
+        self.emit(1, "return check")
+        return "\n".join(self.lines) + "\n"
+
+
+def structure(dim: dim_specs.DimSpec) -> tuple:
+    """Return a hashable description of the structure of a DimSpec."""
+    if isinstance(dim, dim_specs.OpSpec):
+        return type(dim).__name__, structure(dim.left), structure(dim.right)
+    if isinstance(dim, dim_specs.NamedDim):
+        return type(dim).__name__, dim.name
+    if isinstance(dim, dim_specs.Number):
+        return type(dim).__name__, dim.value
+    return type(dim).__name__, id(type(dim))
+
+
+def generate_source(spec) -> str:
+    """Return the Python source of the checker factory for spec."""
+    return _CodeGen(spec).generate()
+
+
+def structure_key(spec) -> tuple:
+    """Return the key of the checker factory of spec, shared by the specs with the same structure."""
+    return tuple(structure(dim) for dim in spec.entries)
+
+
+def factory_code(spec) -> Optional[CodeType]:
+    """Return the code object of the checker factory for spec, or None if the code generator does not support it."""
+    try:
+        source = generate_source(spec)
+    except _Unsupported:
+        return None
+    return compile(source, "<tensorguard {!r}>".format(spec.entries), "exec")
+
+
+def _load_factory(code: CodeType) -> Callable:
+    namespace = {}  # type: Dict[str, Callable]
+    exec(code, namespace)
+    return namespace["make"]
+
+
+def install_factory(spec, code: Union[CodeType, bytes]):
+    """
+    Add the checker factory of spec from its code object, or from the code object marshalled
+    with the marshal module (e.g. loaded from disk), unless it is already known.
+    """
+    key = structure_key(spec)
+    if key not in _factories:
+        if isinstance(code, bytes):
+            code = marshal.loads(code)
+        _factories.put(key, _load_factory(code))
+
+
+def _fallback(spec) -> CheckerType:
+    """Generic checker for specs containing DimSpecs unknown to the code generator."""
+
+    def check(shape, known_dims):
+        if not spec.rank_matches(shape):
+            raise spec.rank_error(shape, known_dims)
+        try:
+            current_known = spec.infer(shape, known_dims)
+        except exception.ShapeError:  # an entry no value of its names can match
+            raise spec.mismatch_error(shape, known_dims)
+        if not spec.matches(shape, current_known):
+            raise spec.mismatch_error(shape, known_dims)
+        return {k: v for k, v in current_known.items()
+                if k not in known_dims and not k.startswith("_")}
+
+    return check
+
+
+def compile_spec(spec) -> CheckerType:
+    """Return a specialized checker function for spec."""
+    key = structure_key(spec)
+    factory = _factories.get(key)
+    if factory is None:
+        code = factory_code(spec)
+        if code is None:
+            return _fallback(spec)
+        factory = _load_factory(code)
+        _factories.put(key, factory)
+    return factory(spec.rank_error, spec.mismatch_error)
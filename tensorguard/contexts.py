@@ -0,0 +1,36 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Provides contextvars.ContextVar, with a thread-local replacement on Python 3.6."""
+
+import threading
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python 3.6: values are thread-local but not asyncio-task-local
+
+    class ContextVar:  # type: ignore
+        def __init__(self, name: str, default=None):
+            self.name = name
+            self._default = default
+            self._local = threading.local()
+
+        def get(self):
+            return getattr(self._local, "value", self._default)
+
+        def set(self, value):
+            token = self.get()
+            self._local.value = value
+            return token
+
+        def reset(self, token):
+            self._local.value = token
@@ -0,0 +1,153 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Defines the guarded decorator which checks function arguments and results."""
+
+import functools
+import inspect
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from tensorguard import exception
+from tensorguard import levels
+from tensorguard import parser
+from tensorguard import scopes
+from tensorguard import tools
+
+_MISSING = object()
+
+
+class _Check:
+    """A precompiled template check of a single value."""
+
+    def __init__(self, label: str, template: str):
+        self.label = label
+        self.spec = parser.get_spec(template)
+        self.checker = self.spec.compile()
+
+
+class _ArgumentCheck(_Check):
+    def __init__(self, label: str, template: str, parameter: inspect.Parameter, position: Optional[int]):
+        super(_ArgumentCheck, self).__init__(label, template)
+        self.name = parameter.name
+        self.position = position
+        # a missing required argument is left to the call of the function to report
+        self.default = _MISSING if parameter.default is parameter.empty else parameter.default
+
+    def get(self, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        if self.position is not None and self.position < len(args):
+            return args[self.position]
+        value = kwargs.get(self.name, _MISSING)
+        if value is _MISSING:
+            return self.default
+        return value
+
+
+class GuardPlan:
+    """Checks of a guarded function, resolved once when the decorator runs."""
+
+    def __init__(self, fn: Callable, templates: Dict[str, str], returns: Union[None, str, Sequence[str]]):
+        self.name = getattr(fn, "__qualname__", repr(fn))
+        parameters = list(inspect.signature(fn).parameters.values())
+        by_name = {p.name: (i, p) for i, p in enumerate(parameters)}
+        self.arguments = []  # type: List[_ArgumentCheck]
+        for name, template in templates.items():
+            if name not in by_name:
+                raise TypeError("{}() has no argument named {!r}".format(self.name, name))
+            i, parameter = by_name[name]
+            if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+                raise TypeError("cannot guard variadic argument {!r} of {}()".format(name, self.name))
+            position = i if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD) else None
+            self.arguments.append(_ArgumentCheck("argument " + name, template, parameter, position))
+        self.returns_tuple = returns is not None and not isinstance(returns, str)
+        if returns is None:
+            self.results = []  # type: List[_Check]
+        elif self.returns_tuple:
+            self.results = [_Check("return value {}".format(i), t) for i, t in enumerate(returns)]
+        else:
+            self.results = [_Check("return value", returns)]
+
+    def check_arguments(self, args: tuple, kwargs: Dict[str, Any], known: Dict[str, int]):
+        values = []
+        for argument in self.arguments:
+            value = argument.get(args, kwargs)
+            if value is _MISSING or (value is None and argument.default is None):
+                continue  # optional arguments left to None are not checked
+            values.append((argument, value))
+        self._check(values, known)
+
+    def check_result(self, result: Any, known: Dict[str, int]):
+        if not self.results:
+            return
+        if self.returns_tuple:
+            if len(result) != len(self.results):
+                raise exception.ShapeError(
+                    "{}() returned {} values, expected {}".format(self.name, len(result), len(self.results))
+                )
+            self._check(list(zip(self.results, result)), known)
+        else:
+            self._check([(self.results[0], result)], known)
+
+    def _check(self, values: List[Tuple[_Check, Any]], known: Dict[str, int]):
+        if levels.get_level() is levels.GuardLevel.RANK:
+            errors = []  # type: List[Tuple[Any, exception.ShapeError]]
+            for check, value in values:
+                shape = tools.get_shape(value)
+                if not check.spec.rank_matches(shape):
+                    errors.append((check.label, check.spec.rank_error(shape, known)))
+        else:
+            checks = [(tools.get_shape(value), check.checker) for check, value in values]
+            _, errors = tools.solve(checks, known)
+            errors = [(values[i][0].label, error) for i, error in errors]
+        if errors:
+            raise exception.MultipleShapeError(errors, context="in {}()".format(self.name))
+
+
+def guarded(returns: Union[None, str, Sequence[str]] = None, **templates: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator checking the shapes of the arguments and of the return value of a function.
+
+    Signature binding and template compilation happen once, when the decorator runs.
+    Each call runs in its own dims scope (see tensorguard.scope), layered over the current
+    dims, so the named dims inferred from the arguments are shared with the return value
+    and with the global functions called in the body (e.g. tg.guard), but never leak out
+    of the call.
+    Optional arguments whose value is None are not checked.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> @tg.guarded(x="B, T, D", mask="B, T", returns="B, D")
+    ... def pool(x, mask):
+    ...     return (x * mask[..., None]).sum(1)
+
+    :param returns: template of the return value, or a sequence of templates for a tuple of values
+    :param templates: template for each guarded argument, by argument name
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        plan = GuardPlan(fn, templates, returns)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if levels.get_level() is levels.GuardLevel.OFF:
+                return fn(*args, **kwargs)
+            with scopes.scope() as guardian:
+                known = guardian.dims
+                plan.check_arguments(args, kwargs, known)
+                result = fn(*args, **kwargs)
+                plan.check_result(result, known)
+            return result
+
+        wrapper.guard_plan = plan
+        return wrapper
+
+    return decorator
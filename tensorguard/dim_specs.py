@@ -10,10 +10,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Defines all DimSpecs which represent individual dimensions of a ShapeSpec"""
+"""Defines all DimSpecs which represent individual dimensions of a ShapeSpec
+
+DimSpecs are immutable and interned: building a DimSpec equal to an existing
+one returns the existing object, so identical sub-expressions (e.g. every
+NamedDim("B")) are shared by all parsed templates, equality is identity and
+hashing is O(1).
+"""
 
 import operator
-from typing import Optional, Dict, Callable, TypeVar, Generic, Any, Union
+import weakref
+from typing import Optional, Dict, Callable, TypeVar, Generic, Any, Union, Tuple
 from tensorguard import exception
 
 
@@ -34,18 +41,105 @@ class FunctionProperty(Generic[T]):
 OperatorType = Callable[[Optional[int], Optional[int]], Optional[int]]
 BinaryOperator = Union[OperatorType, FunctionProperty[OperatorType]]
 
+
+def _right_of_sub(shape_entry: int, left_val: int) -> int:
+    # left - right = shape_entry
+    return left_val - shape_entry
+
+
+def _right_of_div(shape_entry: int, left_val: int) -> int:
+    # left // right = shape_entry: left // shape_entry is the largest solution, so
+    # there is none if it is zero or does not satisfy the equation
+    right_val = left_val // shape_entry
+    if right_val == 0 or left_val // right_val != shape_entry:
+        raise exception.ShapeError("{} / x = {} has no solution".format(left_val, shape_entry))
+    return right_val
+
+
+def _is_known(dim: "DimSpec", known_dims: Dict[str, int]) -> bool:
+    """Return True if every name of dim is known."""
+    if isinstance(dim, NamedDim):
+        return dim.name in known_dims
+    if isinstance(dim, OpSpec):
+        return _is_known(dim.left, known_dims) and _is_known(dim.right, known_dims)
+    return True
+
 # ############################################################################
 
 
+class _InternedRef(weakref.ref):
+    __slots__ = ("key",)
+
+
+def _discard(ref: _InternedRef):
+    # the key may already refer to a newer instance
+    if _interned.get(ref.key) is ref:
+        _interned.pop(ref.key, None)
+
+
+# weak references to every live DimSpec by (type, fields). dict.setdefault is
+# atomic, so concurrent threads always agree on the interned instance.
+_interned = {}  # type: Dict[tuple, _InternedRef]
+
+
 class DimSpec:
     """Baseclass for single dimension specification."""
 
+    __slots__ = ("__weakref__", "_hash")
+    _fields = ()  # type: Tuple[str, ...]
+
     @classmethod
     def make(cls, children=()):
         return cls(*children)
 
-    def __init__(self, *args):
-        super(DimSpec, self).__init__()
+    @classmethod
+    def _normalize(cls, *args) -> tuple:
+        """Return the field values of a new instance built from the constructor arguments."""
+        return args
+
+    def __new__(cls, *args):
+        values = cls._normalize(*args)
+        key = (cls, values)
+        ref = _interned.get(key)
+        if ref is not None:
+            self = ref()
+            if self is not None:
+                return self
+        self = object.__new__(cls)
+        for name, value in zip(cls._fields, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_hash", hash(key))
+        new_ref = _InternedRef(self, _discard)
+        new_ref.key = key
+        while True:
+            ref = _interned.setdefault(key, new_ref)
+            if ref is new_ref:
+                return self
+            existing = ref()
+            if existing is not None:
+                return existing
+            # a dead instance not yet discarded
+            if _interned.get(key) is ref:
+                _interned[key] = new_ref
+                return self
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __delattr__(self, name: str):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, name) for name in self._fields)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __hash__(self) -> int:
+        return self._hash
 
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
@@ -101,19 +195,14 @@ class DimSpec:
         return "<DimSpec>"
 
     def __eq__(self, other) -> bool:
-        return isinstance(other, DimSpec)
+        # interned: equal DimSpecs are the same object
+        return self is other
 
 
 class EllipsisDim(DimSpec):
     """Represents zero or more wildcard dimensions."""
 
-    instance = None
-
-    @classmethod
-    def make(cls, children=()):
-        if not cls.instance:
-            cls.instance = cls()
-        return cls.instance
+    __slots__ = ()
 
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
@@ -126,9 +215,6 @@ class EllipsisDim(DimSpec):
     def evaluate(self, known_dims: Dict[str, int]) -> Optional[int]:
         raise exception.UnderspecifiedShapeError("EllipsisDim cannot be evaluated.")
 
-    def __eq__(self, other) -> bool:
-        return isinstance(other, EllipsisDim)
-
 
 ellipsis_dim = EllipsisDim.make()
 
@@ -136,6 +222,8 @@ ellipsis_dim = EllipsisDim.make()
 class Wildcard(DimSpec):
     """Represents a dimension with any size."""
 
+    __slots__ = ()
+
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
     ) -> bool:
@@ -147,16 +235,17 @@ class Wildcard(DimSpec):
     def __repr__(self) -> str:
         return "*"
 
-    def __eq__(self, other) -> bool:
-        return isinstance(other, Wildcard)
-
 
 class Number(DimSpec):
     """Represents a dimension with a fixed numerical size."""
 
-    def __init__(self, value: int):
-        super(Number, self).__init__()
-        self.value = int(value)
+    __slots__ = ("value",)
+    _fields = ("value",)
+    value: int
+
+    @classmethod
+    def _normalize(cls, value: int) -> tuple:
+        return (int(value),)
 
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
@@ -172,16 +261,12 @@ class Number(DimSpec):
     def __repr__(self) -> str:
         return "{}".format(self.value)
 
-    def __eq__(self, other) -> bool:
-        if not isinstance(other, Number):
-            return False
-        else:
-            return self.value == other.value
-
 
 class Dynamic(DimSpec):
     """Represents a dynamic dimension (i.e. None entry in shape)."""
 
+    __slots__ = ()
+
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
     ) -> bool:
@@ -193,16 +278,17 @@ class Dynamic(DimSpec):
     def __repr__(self):
         return "None"
 
-    def __eq__(self, other):
-        return isinstance(other, Dynamic)
-
 
 class NamedDim(DimSpec):
     """Represents a named dimension."""
 
-    def __init__(self, name):
-        super(NamedDim, self).__init__()
-        self.name = str(name)
+    __slots__ = ("name",)
+    _fields = ("name",)
+    name: str
+
+    @classmethod
+    def _normalize(cls, name) -> tuple:
+        return (str(name),)
 
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
@@ -226,24 +312,23 @@ class NamedDim(DimSpec):
     ) -> Dict[str, int]:
         if shape_entry is None or self.name in known_dims:
             return {}
+        elif shape_entry < 0:  # inverted from an expression, e.g. 4 - X = 5
+            raise exception.ShapeError("{} cannot be negative ({})".format(self.name, shape_entry))
         else:
             return {self.name: shape_entry}
 
     def __repr__(self):
         return self.name
 
-    def __eq__(self, other):
-        if not isinstance(other, NamedDim):
-            return False
-        else:
-            return self.name == other.name
-
 
 class DynamicNamedDim(NamedDim):
     """Represents a dynamic or named dimension."""
 
-    def __init__(self, name, _=None):
-        super(DynamicNamedDim, self).__init__(name)
+    __slots__ = ()
+
+    @classmethod
+    def _normalize(cls, name, _=None) -> tuple:
+        return (str(name),)
 
     def has_conflict(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
@@ -262,43 +347,39 @@ class DynamicNamedDim(NamedDim):
     def __repr__(self):
         return self.name + "?"
 
-    def __eq__(self, other):
-        if not isinstance(other, NamedDim):
-            return False
-        else:
-            return self.name == other.name
-
 
 class OpSpec(DimSpec):
     """Baseclass for dimension operations."""
 
+    __slots__ = ("left", "right")
+    _fields = ("left", "right")
+    left: DimSpec
+    right: DimSpec
+
     op_str: str = "#"
     op: BinaryOperator
     left_op: BinaryOperator
     right_op: BinaryOperator
 
-    def __init__(self, left, right):
-        super(OpSpec, self).__init__()
-        self.left: DimSpec = left
-        self.right: DimSpec = right
-
     def evaluate(self, known_dims: Dict[str, int]) -> Optional[int]:
         return self.op(self.left.evaluate(known_dims), self.right.evaluate(known_dims))
 
     def infer(
         self, shape_entry: Optional[int], known_dims: Dict[str, int]
     ) -> Dict[str, int]:
+        # a side dividing by zero cannot be evaluated, like an underspecified one.
+        # Raises ShapeError if the shape entry cannot be matched by any value
         try:
             left_val = self.left.evaluate(known_dims)
             right_val = self.right_op(shape_entry, left_val)
             return self.right.infer(right_val, known_dims)
-        except exception.UnderspecifiedShapeError:
+        except (exception.UnderspecifiedShapeError, ZeroDivisionError):
             pass
         try:
             right_val = self.right.evaluate(known_dims)
             left_val = self.left_op(shape_entry, right_val)
             return self.left.infer(left_val, known_dims)
-        except exception.UnderspecifiedShapeError:
+        except (exception.UnderspecifiedShapeError, ZeroDivisionError):
             pass
         return {}
 
@@ -311,12 +392,9 @@ class OpSpec(DimSpec):
             return self.evaluate(known_dims) != shape_entry
         except exception.UnderspecifiedShapeError:
             return False
-
-    def __eq__(self, other):
-        if not isinstance(other, type(self)):
-            return False
-        else:
-            return self.left == other.left and self.right == other.right
+        except ZeroDivisionError:
+            # dividing by zero matches no shape, once the value of every name is known
+            return _is_known(self, known_dims)
 
     def __repr__(self):
         return "({} {} {})".format(self.left, self.op_str, self.right)
@@ -334,6 +412,8 @@ class OpSpec(DimSpec):
 class AddDims(OpSpec):
     """Represents addition of two dimension values."""
 
+    __slots__ = ()
+
     op_str = "+"
     op = operator.add
     left_op = operator.sub
@@ -343,15 +423,19 @@ class AddDims(OpSpec):
 class SubDims(OpSpec):
     """Represents subtraction of two dimension values."""
 
+    __slots__ = ()
+
     op_str = "-"
     op = operator.sub
     left_op = operator.add
-    right_op = operator.sub
+    right_op = staticmethod(_right_of_sub)
 
 
 class MulDims(OpSpec):
     """Represents product of two dimension values."""
 
+    __slots__ = ()
+
     op_str = "*"
     op = operator.mul
     left_op = operator.floordiv
@@ -361,7 +445,9 @@ class MulDims(OpSpec):
 class DivDims(OpSpec):
     """Represents quotient of two dimension values."""
 
+    __slots__ = ()
+
     op_str = "/"
     op = operator.floordiv
     left_op = operator.mul
-    right_op = operator.floordiv
+    right_op = staticmethod(_right_of_div)
@@ -0,0 +1,149 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Defines a layered mapping of named dims.
+
+A LayeredDims reads through to a parent mapping without copying it and
+writes only to its own top layer, like a collections.ChainMap whose parent
+is never modified. Layers can be pushed and popped in O(1) to run
+speculative checks and roll them back.
+"""
+
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# marks a name deleted in a layer while it is still set in a lower layer or in the parent
+_DELETED = object()
+
+
+class LayeredDims(MutableMapping):
+    """
+    Mapping of named dims layered on top of an optional parent mapping.
+
+    Example:
+
+    >>> from tensorguard.dims import LayeredDims
+    >>> global_dims = {"B": 32}
+    >>> local_dims = LayeredDims(global_dims, {"T": 10})
+    >>> local_dims["B"], local_dims["T"]
+    (32, 10)
+    >>> checkpoint = local_dims.checkpoint()
+    >>> local_dims["D"] = 64
+    >>> local_dims.rollback(checkpoint)
+    >>> "D" in local_dims, global_dims
+    (False, {'B': 32})
+
+    :param parent: mapping read through for the names not set in this store, never modified
+    :param dims: initial dims of this store
+    """
+
+    def __init__(self, parent: Optional[Mapping] = None, dims: Optional[Mapping] = None):
+        self.parent = parent
+        self._layers = [dict(dims) if dims else {}]  # type: List[Dict[str, object]]
+
+    def get(self, key: str, default=None):
+        layers = self._layers
+        for i in range(len(layers) - 1, -1, -1):
+            layer = layers[i]
+            if key in layer:
+                value = layer[key]
+                return default if value is _DELETED else value
+        if self.parent is None:
+            return default
+        return self.parent.get(key, default)
+
+    def __getitem__(self, key: str):
+        value = self.get(key, _DELETED)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _DELETED) is not _DELETED
+
+    def __setitem__(self, key: str, value):
+        self._layers[-1][key] = value
+
+    def update(self, *args, **kwargs):
+        self._layers[-1].update(*args, **kwargs)
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        layer = self._layers[-1]
+        if len(self._layers) == 1 and (self.parent is None or key not in self.parent):
+            del layer[key]
+        else:
+            layer[key] = _DELETED
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for layer in reversed(self._layers):
+            for key, value in layer.items():
+                if key not in seen:
+                    seen.add(key)
+                    if value is not _DELETED:
+                        yield key
+        if self.parent is not None:
+            for key in self.parent:
+                if key not in seen:
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        # shown in error messages in place of a plain dict of dims
+        return repr(dict(self.items()))
+
+    def child(self) -> "LayeredDims":
+        """Return a new store reading through to this one."""
+        return LayeredDims(self)
+
+    def local(self) -> Dict[str, object]:
+        """Return the dims set in this store, not inherited from the parent."""
+        dims = {}  # type: Dict[str, object]
+        for layer in self._layers:
+            dims.update(layer)
+        return {k: v for k, v in dims.items() if v is not _DELETED}
+
+    def checkpoint(self) -> int:
+        """Start a new layer of changes and return its checkpoint."""
+        self._layers.append({})
+        return len(self._layers) - 1
+
+    def rollback(self, checkpoint: int):
+        """Discard all the changes made since checkpoint."""
+        if not 0 < checkpoint < len(self._layers):
+            raise ValueError("Unknown checkpoint {}".format(checkpoint))
+        del self._layers[checkpoint:]
+
+    def commit(self, checkpoint: int):
+        """Keep all the changes made since checkpoint and drop the checkpoint."""
+        if not 0 < checkpoint < len(self._layers):
+            raise ValueError("Unknown checkpoint {}".format(checkpoint))
+        below = self._layers[checkpoint - 1]
+        for layer in self._layers[checkpoint:]:
+            below.update(layer)
+        del self._layers[checkpoint:]
+
+    @contextmanager
+    def transaction(self):
+        """Commit the changes made inside a with block, or roll them back if it raises."""
+        checkpoint = self.checkpoint()
+        try:
+            yield self
+        except BaseException:
+            self.rollback(checkpoint)
+            raise
+        self.commit(checkpoint)
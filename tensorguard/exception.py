@@ -23,5 +23,45 @@ class ShapeError(ShapeGuardError):
     pass
 
 
+class MultipleShapeError(ShapeError):
+    """Aggregates the ShapeErrors of several tensors checked together.
+
+    errors is a list of (index, ShapeError) pairs, where index is the position
+    of the failing tensor in the checked sequence (or a label such as the name
+    of a function argument). errors may also be the message of the error, as when
+    it is unpickled or re-raised from another process, then the list is empty.
+    """
+
+    def __init__(self, errors, context: str = ""):
+        if isinstance(errors, str):
+            super(MultipleShapeError, self).__init__(errors)
+            self.errors = []
+            return
+        message = "{} tensor(s) do not match their template{}:\n".format(
+            len(errors), " " + context if context else ""
+        ) + "\n".join("[{}] {}".format(index, "\n    ".join(str(error).splitlines())) for index, error in errors)
+        super(MultipleShapeError, self).__init__(message)
+        self.errors = errors
+
+
 class UnderspecifiedShapeError(ShapeGuardError):
     pass
+
+
+class TemplateSyntaxError(ShapeGuardError, ValueError):
+    """Raised when a shape template cannot be parsed.
+
+    pos_in_stream is the 0-based offset of the unexpected character or token
+    in the template, line and column are 1-based.
+    """
+
+    def __init__(self, message: str, template: str, pos_in_stream: int, line: int, column: int):
+        super(TemplateSyntaxError, self).__init__(message)
+        self.template = template
+        self.pos_in_stream = pos_in_stream
+        self.line = line
+        self.column = column
+
+    def __reduce__(self):
+        # pickled with all the arguments, e.g. to be re-raised from a worker process
+        return type(self), (str(self), self.template, self.pos_in_stream, self.line, self.column)
@@ -0,0 +1,208 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks the shapes of .npy and .npz files from their headers.
+
+Only the NPY header of an array is read: the magic string, the format
+version, the header length and the header dict with the shape. For .npz
+archives the members are found through the zip central directory and only
+the beginning of each member is read, so the I/O per file does not depend on
+the size of the arrays. NumPy is not needed.
+
+Example:
+
+>>> import tensorguard as tg
+>>> result = tg.guard_file("features/utt1.npy", "T, 80")
+>>> result.matches, result.dims
+(True, {'T': 412})
+>>> mismatches = [r.path for r in tg.guard_dir("features", "T, 80") if not r.matches]
+"""
+
+import ast
+import fnmatch
+import os
+import struct
+import zipfile
+from collections import namedtuple
+from typing import BinaryIO, Dict, Iterator, List, Mapping, Optional, Tuple, TypeVar, Union
+
+from tensorguard import compiler
+from tensorguard import parser
+from tensorguard import tools
+from tensorguard.dims import LayeredDims
+
+NPY_MAGIC = b"\x93NUMPY"
+
+# key of the array of a .npy file in FileMatch.shapes
+ARRAY = ""
+
+# extensions of the files saved by torch.save
+TORCH_EXTENSIONS = (".pt", ".pth")
+
+FileMatch = namedtuple("FileMatch", ["path", "shapes", "matches", "dims", "errors"])
+FileMatch.__doc__ = """
+Result of checking a file.
+
+path: the path of the file
+shapes: {key: shape} of the checked arrays, the key is "" for a .npy file and the member name for a .npz archive
+matches: True if every checked array matches its template
+dims: the named dims inferred from the file
+errors: list of (key, error) of the mismatching arrays or of the unreadable file (key None)
+"""
+
+TemplatesType = Union[str, Mapping[str, str]]
+CheckersType = Union[compiler.CheckerType, Mapping[str, compiler.CheckerType]]
+T = TypeVar("T")
+
+
+def read_npy_header(stream: BinaryIO) -> Tuple[Tuple[int, ...], str, bool]:
+    """
+    Read the NPY header at the current position of stream, leaving the array data unread.
+
+    :return: (shape, dtype descr, fortran_order)
+    """
+    prefix = stream.read(len(NPY_MAGIC) + 2)
+    if len(prefix) < len(NPY_MAGIC) + 2 or not prefix.startswith(NPY_MAGIC):
+        raise ValueError("Not a NPY file (bad magic string)")
+    major = prefix[len(NPY_MAGIC)]
+    if major == 1:
+        length_format = "<H"
+    elif major in (2, 3):
+        length_format = "<I"
+    else:
+        raise ValueError("Unsupported NPY format version {}".format(major))
+    length_bytes = stream.read(struct.calcsize(length_format))
+    (length,) = struct.unpack(length_format, length_bytes)
+    encoding = "utf8" if major == 3 else "latin1"
+    header = stream.read(length).decode(encoding)
+    try:
+        fields = ast.literal_eval(header)
+        shape = tuple(int(d) for d in fields["shape"])
+        return shape, fields["descr"], bool(fields["fortran_order"])
+    except (SyntaxError, ValueError, TypeError, KeyError):
+        raise ValueError("Invalid NPY header {!r}".format(header))
+
+
+def read_torch_shapes(path: str) -> Dict[str, Tuple[int, ...]]:
+    """
+    Return the shapes of the tensors saved in a .pt file: {"": shape} for a single tensor,
+    {key: shape} for a dict, list or tuple of tensors. The file is memory-mapped when
+    its format allows it, so that the tensor data is not read.
+    """
+    import torch
+
+    try:
+        content = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except (RuntimeError, TypeError):  # legacy format, or torch < 2.1 without the mmap argument
+        content = torch.load(path, map_location="cpu", weights_only=True)
+    if isinstance(content, torch.Tensor):
+        return {ARRAY: tuple(content.shape)}
+    if isinstance(content, (list, tuple)):
+        content = {str(i): value for i, value in enumerate(content)}
+    if not isinstance(content, dict):
+        raise ValueError("Unsupported content of type {} in {}".format(type(content).__name__, path))
+    return {str(key): tuple(value.shape) for key, value in content.items() if isinstance(value, torch.Tensor)}
+
+
+def read_shapes(path: str) -> Dict[str, Tuple[int, ...]]:
+    """
+    Return the shapes of the arrays of a .npy file ({"": shape}) or of a .npz archive
+    ({member name: shape}, member names without the .npy suffix), reading headers only.
+    Files with the .pt or .pth extension are read with read_torch_shapes.
+    """
+    if path.endswith(TORCH_EXTENSIONS):
+        return read_torch_shapes(path)
+    if zipfile.is_zipfile(path):
+        shapes = {}  # type: Dict[str, Tuple[int, ...]]
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+                with archive.open(info) as member:
+                    shapes[name] = read_npy_header(member)[0]
+        return shapes
+    with open(path, "rb") as stream:
+        return {ARRAY: read_npy_header(stream)[0]}
+
+
+def _templates_of(shapes: Mapping[str, Tuple[int, ...]], templates: Union[T, Mapping[str, T]]) -> List[Tuple[str, T]]:
+    if not isinstance(templates, Mapping):
+        return [(key, templates) for key in shapes]
+    pairs = []  # type: List[Tuple[str, T]]
+    for key, template in templates.items():
+        if key not in shapes:
+            raise KeyError("No array {!r} in the file".format(key))
+        pairs.append((key, template))
+    return pairs
+
+
+def compile_templates(templates: TemplatesType) -> CheckersType:
+    """Parse and compile a template, or every template of {member name: template}."""
+    if isinstance(templates, str):
+        return parser.get_spec(templates).compile()
+    return {key: parser.get_spec(template).compile() for key, template in templates.items()}
+
+
+def check_file(path: str, checkers: CheckersType, dims: Optional[Dict[str, int]] = None) -> FileMatch:
+    """Like guard_file, with the checkers returned by compile_templates."""
+    shapes = read_shapes(path)
+    pairs = _templates_of(shapes, checkers)
+    inferred, errors = tools.solve([(list(shapes[key]), check) for key, check in pairs], LayeredDims(dims))
+    errors = [(pairs[i][0], error) for i, error in errors]
+    return FileMatch(path, {key: shapes[key] for key, _ in pairs}, not errors, inferred, errors)
+
+
+def guard_file(path: str, templates: TemplatesType, dims: Optional[Dict[str, int]] = None) -> FileMatch:
+    """
+    Check the arrays of a .npy or .npz file (or the tensors of a .pt file) against templates,
+    reading only their headers.
+    The arrays of a .npz archive are checked together, sharing their named dims.
+    Mismatches are reported in the result, not raised.
+
+    :param path: path of the file
+    :param templates: a template for every array, or {member name: template} for the members of a .npz archive
+    :param dims: known dims, not modified
+    """
+    return check_file(path, compile_templates(templates), dims)
+
+
+def guard_dir(
+    directory: str,
+    templates: TemplatesType,
+    dims: Optional[Dict[str, int]] = None,
+    pattern: str = "*.np[yz]",
+    recursive: bool = True,
+) -> Iterator[FileMatch]:
+    """
+    Check every file of directory whose name matches pattern with guard_file, in sorted order.
+    Every file is checked on its own. Unreadable files are reported as mismatches.
+    The templates are compiled once, a malformed template raises TemplateSyntaxError right away.
+    """
+    checkers = compile_templates(templates)
+
+    def check_files() -> Iterator[FileMatch]:
+        for path in iter_files(directory, pattern, recursive):
+            try:
+                yield check_file(path, checkers, dims)
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+                yield FileMatch(path, {}, False, {}, [(None, error)])
+
+    return check_files()
+
+
+def iter_files(directory: str, pattern: str = "*", recursive: bool = True) -> Iterator[str]:
+    """Yield the paths of the files of directory whose name matches pattern, in sorted order."""
+    for root, subdirs, names in os.walk(directory):
+        subdirs.sort()
+        for name in sorted(fnmatch.filter(names, pattern)):
+            yield os.path.join(root, name)
+        if not recursive:
+            break
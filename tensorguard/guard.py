@@ -12,31 +12,161 @@
 
 """Contains the main ShapeGuard class."""
 
-from copy import copy
-from typing import Optional, Dict, Any, List
+import sys
+from typing import Optional, Dict, Any, List, Iterable, Tuple
 
+from tensorguard import cache
+from tensorguard import exception
+from tensorguard import levels
+from tensorguard import sampling
+from tensorguard.dims import LayeredDims
 from tensorguard import tools
+from tensorguard import trees
 
 
 class TensorGuard:
-    def __init__(self, dims: Optional[Dict[str, int]] = None):
+    def __init__(
+        self,
+        dims: Optional[Dict[str, int]] = None,
+        guard_level: Optional[levels.LevelType] = None,
+        memo_size: Optional[int] = 0,
+        sampling: Optional["sampling.Policy"] = None,
+    ):
+        """
+        :param dims: initial named dimensions
+        :param guard_level: "off", "rank" or "full". If None, follow the global guard level
+        :param memo_size: number of guard results to memoize, see set_memo_size. 0 (default) disables the memo
+        :param sampling: policy deciding which calls of guard are checked, see set_sampling. None checks every call
+        """
         object.__setattr__(self, "dims", {} if dims is None else dims)
+        object.__setattr__(self, "guard_level", None)
+        object.__setattr__(self, "memo", None)
+        object.__setattr__(self, "sampler", None)
+        self.set_level(guard_level)
+        self.set_memo_size(memo_size)
+        self.set_sampling(sampling)
+
+    def set_level(self, guard_level: Optional[levels.LevelType]):
+        """
+        Set the guard level of this guardian. None means follow the global guard level.
+        """
+        if guard_level is not None:
+            guard_level = levels.parse_level(guard_level)
+        object.__setattr__(self, "guard_level", guard_level)
+
+    def get_level(self) -> levels.GuardLevel:
+        """
+        Return the guard level in effect for this guardian.
+        """
+        guard_level = self.guard_level
+        return levels.get_level() if guard_level is None else guard_level
+
+    def set_memo_size(self, memo_size: Optional[int]):
+        """
+        Memoize up to memo_size guard results (None means unbounded, 0 disables the memo).
+        A memoized guard with the same template, shape and values of the relevant
+        known dims returns the previous result without checking the tensor again.
+        """
+        if memo_size == 0:
+            object.__setattr__(self, "memo", None)
+            return
+        if self.memo is None:
+            object.__setattr__(self, "memo", cache.LRUCache(0))
+        self.memo.resize(memo_size)
+
+    def memo_info(self) -> Optional[cache.CacheInfo]:
+        """
+        Return the statistics of the memo of guard results, or None if it is disabled.
+        """
+        return None if self.memo is None else self.memo.info()
+
+    def set_sampling(self, policy: Optional[sampling.Policy]):
+        """
+        Check only the calls of guard selected by policy, e.g. sampling.FirstThenEvery(1000, 100).
+        Every call site of guard is sampled on its own. None checks every call.
+        Skipped calls do not infer any dim.
+        """
+        object.__setattr__(self, "sampler", None if policy is None else sampling.Sampler(policy))
+
+    def sampling_stats(self) -> Dict[str, sampling.SiteStats]:
+        """
+        Return the (checked, skipped, failed) counters of every guard call site by "filename:line".
+        """
+        return {} if self.sampler is None else self.sampler.stats()
 
     def matches(self, tensor, template: str) -> bool:
-        return tools.matches(tensor, template, self.dims)
+        guard_level = self.get_level()
+        if guard_level is levels.GuardLevel.FULL:
+            return tools.matches(tensor, template, self.dims)
+        if guard_level is levels.GuardLevel.RANK:
+            return tools.rank_matches(tensor, template)
+        return True
 
     def guard(self, tensor, template: str):
-        inferred_dims = tools.guard(tensor, template, self.dims)
-        self.dims.update(inferred_dims)
+        sampler = self.sampler
+        if sampler is None:
+            return self._guard(tensor, template)
+        return self._sampled_guard(sampler, sys._getframe(1), tensor, template)
+
+    def _sampled_guard(self, sampler: sampling.Sampler, frame, tensor, template: str):
+        site = sampler.site(frame)
+        if not sampler.should_check(site):
+            return tensor
+        try:
+            self._guard(tensor, template)
+        except exception.ShapeError:
+            sampler.failed(site)
+            raise
+        sampler.passed(site)
         return tensor
 
+    def _guard(self, tensor, template: str):
+        guard_level = self.get_level()
+        if guard_level is levels.GuardLevel.FULL:
+            inferred_dims = tools.guard(tensor, template, self.dims, self.memo)
+            if inferred_dims:
+                self.dims.update(inferred_dims)
+        elif guard_level is levels.GuardLevel.RANK:
+            tools.guard_rank(tensor, template, self.dims)
+        return tensor
+
+    def guard_many(self, pairs: Iterable[Tuple[Any, str]]) -> List[Any]:
+        """
+        Check several (tensor, template) pairs at once. The named dims of all the
+        templates are inferred together and written to dims only if every tensor
+        matches; otherwise a MultipleShapeError reports all the mismatches.
+        :return: the list of tensors
+        """
+        pairs = list(pairs)
+        guard_level = self.get_level()
+        if guard_level is levels.GuardLevel.FULL:
+            self.dims.update(tools.guard_many(pairs, self.dims))
+        elif guard_level is levels.GuardLevel.RANK:
+            tools.guard_rank_many(pairs, self.dims)
+        return [tensor for tensor, _ in pairs]
+
+    def guard_tree(self, value, tree: "trees.TreeType"):
+        """
+        Check a nested structure of tensors (dicts, lists, tuples, dataclasses) against a
+        template tree of the same shape, in one transaction: the named dims of all the leaves
+        are inferred together and written to dims only if every leaf matches; otherwise a
+        MultipleShapeError reports all the mismatching or missing leaves.
+        :return: value
+        """
+        guard_level = self.get_level()
+        if guard_level is levels.GuardLevel.FULL:
+            inferred_dims = trees.get_plan(tree).check(value, self.dims)
+            if inferred_dims:
+                self.dims.update(inferred_dims)
+        elif guard_level is levels.GuardLevel.RANK:
+            trees.get_plan(tree).check_rank(value, self.dims)
+        return value
+
     def reshape(self, tensor, template: str):
         return tools.reshape(tensor, template, self.dims)
 
     def evaluate(self, template: str, **kwargs) -> List[Optional[int]]:
-        local_dims = copy(self.dims)
-        local_dims.update(kwargs)
-        return tools.evaluate(template, local_dims)
+        return tools.evaluate(template, LayeredDims(self.dims, kwargs))
 
 
     def clear_dims(self):
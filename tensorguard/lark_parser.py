@@ -0,0 +1,50 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Reference parser built on the generated Lark LALR parser.
+
+Not used by tensorguard itself (see parser.py); kept to check and benchmark
+the hand-written parser against the grammar in shape_spec.lark. The parser
+tables are only loaded on the first call of get_parser.
+"""
+
+from tensorguard import dim_specs
+from tensorguard import shape_spec
+
+parser = None
+
+
+def get_parser():
+    global parser
+    if parser is None:
+        from tensorguard import shape_spec_parser
+
+        class TreeToSpec(shape_spec_parser.Transformer):
+            start = shape_spec.ShapeSpec
+            wildcard = dim_specs.Wildcard.make
+            ellipsis = dim_specs.EllipsisDim.make
+            dynamic = dim_specs.Dynamic.make
+            name = dim_specs.NamedDim.make
+            dynamic_name = dim_specs.DynamicNamedDim.make
+            number = dim_specs.Number.make
+            add = dim_specs.AddDims.make
+            sub = dim_specs.SubDims.make
+            mul = dim_specs.MulDims.make
+            div = dim_specs.DivDims.make
+
+        parser = shape_spec_parser.Lark_StandAlone(transformer=TreeToSpec())
+    return parser
+
+
+def parse(template: str) -> shape_spec.ShapeSpec:
+    spec = get_parser().parse(template)
+    spec.template = template
+    return spec
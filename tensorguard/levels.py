@@ -0,0 +1,80 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Defines the guard levels which control how much checking is performed.
+
+The initial global level is read from the TENSORGUARD_LEVEL environment
+variable at import time ("off", "rank" or "full", default "full"). The level
+set by using_level is kept in a context variable, so that it only applies to
+the current thread or asyncio task.
+"""
+
+import os
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Union
+
+from tensorguard.contexts import ContextVar
+
+ENV_VAR = "TENSORGUARD_LEVEL"
+
+
+class GuardLevel(IntEnum):
+    OFF = 0  # guard returns the tensor right away, matches always returns True
+    RANK = 1  # only the rank of the tensor is checked, no dims are inferred
+    FULL = 2  # full check and inference of named dimensions
+
+
+LevelType = Union[GuardLevel, int, str]
+
+
+def parse_level(level: LevelType) -> GuardLevel:
+    if isinstance(level, str):
+        try:
+            return GuardLevel[level.strip().upper()]
+        except KeyError:
+            raise ValueError(
+                "Unknown guard level {!r}, expected one of {}".format(
+                    level, ", ".join(x.name.lower() for x in GuardLevel)
+                )
+            )
+    return GuardLevel(level)
+
+
+level = parse_level(os.environ.get(ENV_VAR, "full"))
+# level of the innermost using_level block of the current context, None outside of them
+_override = ContextVar("tensorguard_level", default=None)
+
+
+def get_level() -> GuardLevel:
+    """Return the level of the innermost using_level block, or the global level."""
+    override = _override.get()
+    return level if override is None else override
+
+
+def set_level(new_level: LevelType):
+    """Set the global guard level, which does not apply inside using_level blocks."""
+    global level
+    level = parse_level(new_level)
+
+
+@contextmanager
+def using_level(new_level: LevelType):
+    """
+    Set the guard level inside a with block. Only the current thread or asyncio task
+    is affected, the global level of the others is kept.
+    """
+    token = _override.set(parse_level(new_level))
+    try:
+        yield
+    finally:
+        _override.reset(token)
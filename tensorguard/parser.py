@@ -9,30 +9,142 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""Defines the transformation from a shape template parse tree to ShapeSpec."""
+"""Parses shape templates into ShapeSpec objects.
 
-from __future__ import absolute_import
-from __future__ import division
-from __future__ import print_function
+A recursive-descent parser for the grammar in shape_spec.lark. The template
+is tokenized with a single regular expression scan and dim_specs objects are
+built directly, without an intermediate parse tree. Syntax errors are
+reported at the same positions as the Lark LALR parser generated in
+shape_spec_parser.py, which is kept as a reference for tests and benchmarks.
+"""
 
+import re
+
+from tensorguard import cache
 from tensorguard import dim_specs
+from tensorguard import exception
 from tensorguard import shape_spec
-from tensorguard import shape_spec_parser
 
+# whitespace as in lark's common.WS, followed by one token or by any other
+# (invalid) character, reported as a CHAR token. Operator values are unique
+# to OP tokens, so the parser can dispatch on the token value alone.
+_TOKEN_RE = re.compile(
+    r"[ \t\f\r\n]*(?:(?P<INT>[0-9]+)|(?P<CNAME>[_A-Za-z][_A-Za-z0-9]*)|(?P<OP>\.\.\.|[-+*/(),?])|(?P<CHAR>[^ \t\f\r\n]))",
+)
+
+_END = "$END"
+_ADD_OPS = {"+": dim_specs.AddDims, "-": dim_specs.SubDims}
+_MUL_OPS = {"*": dim_specs.MulDims, "/": dim_specs.DivDims}
+
+
+class _Parser:
+    def __init__(self, template: str):
+        self.template = template
+        # every character is either whitespace or part of a token, so the
+        # matches are contiguous and cover the whole template
+        self.tokens = [(m.lastgroup, m.group(m.lastgroup), m.start(m.lastgroup))
+                       for m in _TOKEN_RE.finditer(template)]
+        # like lark, the end token takes the position of the last token
+        self.tokens.append((_END, "", self.tokens[-1][2] if self.tokens else 0))
+        self.index = 0
+        self.kind, self.value, self.start = self.tokens[0]
+
+    def advance(self):
+        self.index += 1
+        self.kind, self.value, self.start = self.tokens[self.index]
+
+    def error(self, expected: str):
+        template, pos = self.template, self.start
+        line = template.count("\n", 0, pos) + 1
+        column = pos - template.rfind("\n", 0, pos)
+        if self.kind == _END:
+            what = "end of template"
+        elif self.kind == "CHAR":
+            what = "character {!r}".format(self.value)
+        else:
+            what = "token {!r}".format(self.value)
+        return exception.TemplateSyntaxError(
+            "Unexpected {} at line {}, column {} of template {!r}.\n"
+            "Expected {}.".format(what, line, column, template, expected),
+            template,
+            pos,
+            line,
+            column,
+        )
+
+    def parse(self) -> shape_spec.ShapeSpec:
+        entries = [self.dim()]
+        while self.value == ",":
+            self.advance()
+            entries.append(self.dim())
+        if self.kind != _END:
+            raise self.error('"," or end of template')
+        return shape_spec.ShapeSpec(entries, self.template)
+
+    def dim(self) -> dim_specs.DimSpec:
+        value = self.value
+        if value == "*":
+            self.advance()
+            return dim_specs.Wildcard.make()
+        if value == "...":
+            self.advance()
+            return dim_specs.EllipsisDim.make()
+        if value == "?":
+            self.advance()
+            return dim_specs.Dynamic.make()
+        return self.sum('a dimension, "*", "..." or "?"')
+
+    def sum(self, expected: str) -> dim_specs.DimSpec:
+        left = self.product(expected)
+        while self.value in _ADD_OPS:
+            op = _ADD_OPS[self.value]
+            self.advance()
+            left = op(left, self.product("a name, a number or \"(\""))
+        return left
+
+    def product(self, expected: str) -> dim_specs.DimSpec:
+        left = self.item(expected)
+        while self.value in _MUL_OPS:
+            op = _MUL_OPS[self.value]
+            self.advance()
+            left = op(left, self.item("a name, a number or \"(\""))
+        return left
+
+    def item(self, expected: str) -> dim_specs.DimSpec:
+        kind, value = self.kind, self.value
+        if kind == "CNAME":
+            self.advance()
+            if self.value == "?":
+                self.advance()
+                return dim_specs.DynamicNamedDim(value)
+            return dim_specs.NamedDim(value)
+        if kind == "INT":
+            self.advance()
+            return dim_specs.Number(value)
+        if value == "(":
+            self.advance()
+            inner = self.sum("a name, a number or \"(\"")
+            if self.value != ")":
+                raise self.error('an operator or ")"')
+            self.advance()
+            return inner
+        raise self.error(expected)
+
+
+def parse(template: str) -> shape_spec.ShapeSpec:
+    """Parse template into a ShapeSpec. Raise TemplateSyntaxError if it is malformed."""
+    return _Parser(template).parse()
+
+
+DEFAULT_CACHE_SIZE = 1024
 
-class TreeToSpec(shape_spec_parser.Transformer):
-    start = shape_spec.ShapeSpec
-    wildcard = dim_specs.Wildcard.make
-    ellipsis = dim_specs.EllipsisDim.make
-    dynamic = dim_specs.Dynamic.make
-    name = dim_specs.NamedDim.make
-    dynamic_name = dim_specs.DynamicNamedDim.make
-    number = dim_specs.Number.make
-    add = dim_specs.AddDims.make
-    sub = dim_specs.SubDims.make
-    mul = dim_specs.MulDims.make
-    div = dim_specs.DivDims.make
+spec_cache = cache.LRUCache(maxsize=DEFAULT_CACHE_SIZE)
 
 
-parser = shape_spec_parser.Lark_StandAlone(transformer=TreeToSpec())
-parse = parser.parse
+def get_spec(template: str) -> shape_spec.ShapeSpec:
+    """Return the parsed ShapeSpec of template, reusing the process-wide cache."""
+    spec = spec_cache.get(template)
+    if spec is None:
+        spec = parse(template)
+        spec_cache.put(template, spec)
+    return spec
@@ -0,0 +1,170 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in profiler of guard, matches and reshape.
+
+When no profiler is active, tools.guard, tools.matches and tools.reshape only
+pay for reading the module attribute ``profiler``. When one is active, every
+call is timed and recorded per template and per call site (the first frame
+outside of tensorguard) in three phases:
+
+  * parse: lookup of the template in the spec cache, parsing and compiling it on a miss
+  * check: the compiled checker of the spec, where inference and matching are fused
+    in a single pass, or the evaluation of the template for reshape
+  * error: the time of the failing checks, which is mostly spent building the error message
+
+Counters are best-effort under concurrent access, like the cache statistics.
+"""
+
+import os
+import random
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tensorguard import parser
+
+TimingStats = namedtuple(
+    "TimingStats", ["calls", "failures", "cache_misses", "parse", "check", "error", "total", "p50", "p99"]
+)
+TimingStats.__doc__ = """
+Timings of the calls of a template or of a call site. parse, check, error and total are the
+total times in seconds, p50 and p99 the percentiles of the time of a call in seconds.
+"""
+
+ProfileStats = namedtuple("ProfileStats", ["templates", "sites", "cache"])
+ProfileStats.__doc__ = """
+Snapshot of a profiler: TimingStats by template and by call site ("filename:line"),
+and the CacheInfo of the spec cache.
+"""
+
+# the active profiler, read by tools
+profiler = None  # type: Optional[Profiler]
+# the last active profiler, reported by stats() after it is stopped
+last = None  # type: Optional[Profiler]
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class Entry:
+    """The counters of a template or of a call site."""
+
+    __slots__ = ("calls", "failures", "cache_misses", "parse", "check", "error", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.cache_misses = 0
+        self.parse = 0.0
+        self.check = 0.0
+        self.error = 0.0
+        self.samples = []  # type: List[float]
+
+    def stats(self) -> TimingStats:
+        samples = sorted(self.samples)
+
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+        total = self.parse + self.check + self.error
+        return TimingStats(
+            self.calls, self.failures, self.cache_misses, self.parse, self.check, self.error, total,
+            percentile(0.5), percentile(0.99),
+        )
+
+
+class Profiler:
+    """
+    Records the timings of guard, matches and reshape.
+
+    :param max_samples: number of call durations kept per template and per call site for the
+        percentiles, by reservoir sampling
+    """
+
+    def __init__(self, max_samples: int = 4096):
+        self.max_samples = max_samples
+        self.templates = {}  # type: Dict[str, Entry]
+        self.sites = {}  # type: Dict[Tuple[str, int], Entry]
+        self._random = random.Random(0).random
+
+    def record(self, template: str, cache_miss: bool, parse: float, check: float, failed: bool):
+        """Record a call, made from the first frame outside of tensorguard."""
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_filename.startswith(_PACKAGE_DIR):
+            frame = frame.f_back
+        site_key = ("<unknown>", 0) if frame is None else (frame.f_code.co_filename, frame.f_lineno)
+        for entries, key in ((self.templates, template), (self.sites, site_key)):
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries.setdefault(key, Entry())
+            self._add(entry, cache_miss, parse, check, failed)
+
+    def _add(self, entry: Entry, cache_miss: bool, parse: float, check: float, failed: bool):
+        entry.calls += 1
+        entry.parse += parse
+        if cache_miss:
+            entry.cache_misses += 1
+        if failed:
+            entry.failures += 1
+            entry.error += check
+        else:
+            entry.check += check
+        duration = parse + check
+        if len(entry.samples) < self.max_samples:
+            entry.samples.append(duration)
+        else:
+            i = int(self._random() * entry.calls)
+            if i < self.max_samples:
+                entry.samples[i] = duration
+
+    def stats(self) -> ProfileStats:
+        templates = {template: entry.stats() for template, entry in list(self.templates.items())}
+        sites = {"{}:{}".format(*key): entry.stats() for key, entry in list(self.sites.items())}
+        return ProfileStats(templates, sites, parser.spec_cache.info())
+
+    def reset(self):
+        self.templates.clear()
+        self.sites.clear()
+
+
+def start(max_samples: int = 4096) -> Profiler:
+    """Start a new profiler, replacing the active one, and return it."""
+    global profiler, last
+    profiler = last = Profiler(max_samples)
+    return profiler
+
+
+def stop() -> Optional[Profiler]:
+    """Stop the active profiler and return it."""
+    global profiler
+    stopped, profiler = profiler, None
+    return stopped
+
+
+@contextmanager
+def profile(max_samples: int = 4096) -> Iterator[Profiler]:
+    """Profile a with block with a new profiler; the previously active one is restored afterwards."""
+    global profiler, last
+    previous = profiler
+    profiler = last = Profiler(max_samples)
+    try:
+        yield profiler
+    finally:
+        profiler = previous
+
+
+def stats() -> ProfileStats:
+    """Return the snapshot of the active profiler, or of the last one if none is active."""
+    if last is None:
+        return ProfileStats({}, {}, parser.spec_cache.info())
+    return last.stats()
@@ -0,0 +1,149 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persists parsed and compiled templates to disk.
+
+A spec file holds the parsed ShapeSpecs of a set of templates and the code
+objects of their checker factories (see compiler.py), so that a new process
+loads them with a single read, without parsing the templates nor generating
+and compiling the checkers.
+
+The file starts with a magic string and a fingerprint of the format: the
+version of tensorguard, the version of Python (code objects are marshalled)
+and a hash of the sources of the modules defining the parser (which
+implements the grammar), the DimSpecs and the compiler. A file with another
+fingerprint is ignored, so that it is invalidated automatically when any of
+them changes.
+
+The TENSORGUARD_SPEC_CACHE environment variable names a spec file loaded when
+tensorguard is imported.
+"""
+
+import hashlib
+import marshal
+import os
+import pickle
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tensorguard import compiler
+from tensorguard import dim_specs
+from tensorguard import parser
+from tensorguard import shape_spec
+from tensorguard import solver
+
+ENV_VAR = "TENSORGUARD_SPEC_CACHE"
+
+MAGIC = b"TGSPEC\n"
+FORMAT_VERSION = 1
+
+# modules whose changes invalidate the spec files
+_MODULES = [parser, dim_specs, shape_spec, solver, compiler]
+
+_fingerprint = None  # type: Optional[bytes]
+
+
+def fingerprint() -> bytes:
+    """Return the fingerprint of the spec files written by this version of tensorguard."""
+    global _fingerprint
+    if _fingerprint is None:
+        from tensorguard import __version__
+
+        digest = hashlib.sha256()
+        digest.update("{} {} {}".format(FORMAT_VERSION, __version__, sys.version).encode())
+        for module in _MODULES:
+            try:
+                with open(module.__file__, "rb") as source:
+                    digest.update(source.read())
+            except (OSError, TypeError):  # installed without sources: only the versions are fingerprinted
+                digest.update(module.__name__.encode())
+        _fingerprint = digest.hexdigest().encode()
+    return _fingerprint
+
+
+def precompile(templates: Iterable[str]) -> Dict[str, shape_spec.ShapeSpec]:
+    """
+    Parse and compile templates into the process-wide caches. Raise TemplateSyntaxError on the first
+    malformed template.
+    :return: the specs by template
+    """
+    specs = {}  # type: Dict[str, shape_spec.ShapeSpec]
+    for template in templates:
+        spec = parser.get_spec(template)
+        spec.compile()
+        specs[template] = spec
+    if len(specs) > (parser.spec_cache.maxsize or len(specs)):
+        parser.spec_cache.resize(len(specs))
+    return specs
+
+
+def save(path: str, specs: Dict[str, shape_spec.ShapeSpec]):
+    """Write specs to a spec file, atomically."""
+    codes = {}  # type: Dict[tuple, Optional[bytes]]
+    entries = []  # type: List[Tuple[str, shape_spec.ShapeSpec, Optional[bytes]]]
+    for template, spec in specs.items():
+        key = compiler.structure_key(spec)
+        if key not in codes:
+            code = compiler.factory_code(spec)
+            codes[key] = None if code is None else marshal.dumps(code)
+        entries.append((template, spec, codes[key]))  # equal codes are pickled once
+    data = MAGIC + fingerprint() + b"\n" + pickle.dumps(entries, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read(path: str) -> Optional[List[Tuple[str, shape_spec.ShapeSpec, Optional[bytes]]]]:
+    """Return the (template, spec, marshalled factory code) of a spec file, or None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    header = MAGIC + fingerprint() + b"\n"
+    if not data.startswith(header):
+        return None
+    try:
+        return pickle.loads(data[len(header):])
+    except Exception:  # truncated or corrupted file, e.g. by a concurrent writer without os.replace
+        return None
+
+
+def load(path: str) -> int:
+    """
+    Load a spec file into the process-wide caches. Missing, stale or corrupted files are ignored.
+    Spec files are pickles: only load files written by trusted processes.
+    :return: the number of templates loaded
+    """
+    entries = read(path)
+    if not entries:
+        return 0
+    if len(entries) > (parser.spec_cache.maxsize or len(entries)):
+        parser.spec_cache.resize(len(entries))
+    for template, spec, code in entries:
+        if code is not None:
+            compiler.install_factory(spec, code)
+        parser.spec_cache.put(template, spec)
+    return len(entries)
+
+
+def precompile_to(path: str, templates: Iterable[str]) -> Tuple[int, int]:
+    """
+    Precompile templates, merge them with the valid templates of the spec file at path and write it back.
+    :return: (number of templates precompiled, number of templates in the file)
+    """
+    specs = precompile(templates)
+    merged = {template: spec for template, spec, _ in read(path) or []}
+    merged.update(specs)
+    save(path, merged)
+    return len(specs), len(merged)
@@ -0,0 +1,168 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Defines the sampling policies deciding which guard calls are checked.
+
+Every call site of guard (a code object and bytecode offset of the caller)
+keeps its own counters, so a guard in a hot loop is sampled independently of
+the guards elsewhere. The call site is read from the caller's frame with a
+single sys._getframe call, without walking the stack.
+
+Counters are best-effort under concurrent access, like the cache statistics.
+"""
+
+import random
+from collections import namedtuple
+from typing import Dict, Hashable, Optional
+
+SiteStats = namedtuple("SiteStats", ["checked", "skipped", "failed"])
+
+
+class Site:
+    """The counters of one guard call site."""
+
+    __slots__ = ("location", "calls", "checked", "failed", "streak")
+
+    def __init__(self, location: str):
+        self.location = location
+        self.calls = 0
+        self.checked = 0
+        self.failed = 0
+        self.streak = 0  # consecutive successful checks
+
+    def stats(self) -> SiteStats:
+        return SiteStats(self.checked, self.calls - self.checked, self.failed)
+
+
+class Policy:
+    """Baseclass of the sampling policies."""
+
+    def should_check(self, site: Site) -> bool:
+        """Return True if the current call of site must be checked. site.calls includes the current call."""
+        raise NotImplementedError
+
+
+class Always(Policy):
+    """Check every call."""
+
+    def should_check(self, site: Site) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return "Always()"
+
+
+class FirstThenEvery(Policy):
+    """Check the first calls of every site, then one call every `every` calls (0 means never)."""
+
+    def __init__(self, first: int = 1000, every: int = 100):
+        if first < 0 or every < 0:
+            raise ValueError("first and every must be >= 0")
+        self.first = first
+        self.every = every
+
+    def should_check(self, site: Site) -> bool:
+        calls = site.calls
+        if calls <= self.first:
+            return True
+        return self.every > 0 and (calls - self.first) % self.every == 0
+
+    def __repr__(self) -> str:
+        return "FirstThenEvery(first={}, every={})".format(self.first, self.every)
+
+
+class UntilStable(Policy):
+    """
+    Check every call of a site until `stable` consecutive checks passed, then
+    one call every `every` calls (0 means never). A failed check starts over.
+    """
+
+    def __init__(self, stable: int = 1000, every: int = 0):
+        if stable < 0 or every < 0:
+            raise ValueError("stable and every must be >= 0")
+        self.stable = stable
+        self.every = every
+
+    def should_check(self, site: Site) -> bool:
+        if site.streak < self.stable:
+            return True
+        return self.every > 0 and site.calls % self.every == 0
+
+    def __repr__(self) -> str:
+        return "UntilStable(stable={}, every={})".format(self.stable, self.every)
+
+
+class Probability(Policy):
+    """Check each call with probability p."""
+
+    def __init__(self, p: float, seed: Optional[int] = None):
+        if not 0.0 <= p <= 1.0:
+            raise ValueError("p must be between 0 and 1, got {}".format(p))
+        self.p = p
+        self._random = random.Random(seed).random
+
+    def should_check(self, site: Site) -> bool:
+        return self._random() < self.p
+
+    def __repr__(self) -> str:
+        return "Probability(p={})".format(self.p)
+
+
+class Sampler:
+    """Applies a policy to the call sites of guard and keeps their counters."""
+
+    def __init__(self, policy: Policy):
+        self.policy = policy
+        self.sites = {}  # type: Dict[Hashable, Site]
+
+    def site(self, frame) -> Site:
+        """Return the Site of the call made from frame."""
+        key = (frame.f_code, frame.f_lasti)
+        site = self.sites.get(key)
+        if site is None:
+            code = frame.f_code
+            site = self.sites.setdefault(key, Site("{}:{}".format(code.co_filename, frame.f_lineno)))
+        return site
+
+    def should_check(self, site: Site) -> bool:
+        site.calls += 1
+        if self.policy.should_check(site):
+            site.checked += 1
+            return True
+        return False
+
+    @staticmethod
+    def passed(site: Site):
+        site.streak += 1
+
+    @staticmethod
+    def failed(site: Site):
+        site.failed += 1
+        site.streak = 0
+
+    def stats(self) -> Dict[str, SiteStats]:
+        """Return the counters of every call site by "filename:line"."""
+        stats = {}  # type: Dict[str, SiteStats]
+        for site in list(self.sites.values()):
+            previous = stats.get(site.location)
+            current = site.stats()
+            if previous is not None:  # several calls on the same line
+                current = SiteStats(*(a + b for a, b in zip(previous, current)))
+            stats[site.location] = current
+        return stats
+
+    def total(self) -> SiteStats:
+        """Return the counters summed over all the call sites."""
+        return SiteStats(*(sum(x) for x in zip(SiteStats(0, 0, 0), *self.stats().values())))
+
+    def __repr__(self) -> str:
+        return "<Sampler {!r} {}>".format(self.policy, self.total())
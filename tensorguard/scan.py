@@ -0,0 +1,244 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Finds and validates the literal templates of a source tree, without running it.
+
+Python files are parsed with ast in a process pool. The templates found are
+the string literals passed to the tensorguard functions and TensorGuard
+methods (guard, matches, reshape, evaluate, get_dims, ...), called as
+functions or as methods of any object, and the keyword arguments of the
+guarded and guarded_module decorators. Every template is parsed in the worker
+reading its file, so syntax errors are reported with the file and line of
+the call. The valid templates can be written to a spec file (see
+tensorguard.registry) loaded by production processes.
+
+Usage::
+
+    python -m tensorguard scan src/
+    python -m tensorguard scan src/ train.py --output specs.bin
+"""
+
+import argparse
+import ast
+import collections
+import concurrent.futures
+import fnmatch
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional, Set, TextIO, Tuple, Union
+
+from tensorguard import exception
+from tensorguard import parser
+
+# position of the template argument, by function or method name
+TEMPLATE_ARGUMENTS = {
+    "guard": 1,
+    "matches": 1,
+    "reshape": 1,
+    "match_shapes": 1,
+    "evaluate": 0,
+    "get_dims": 0,
+}
+# functions taking a template tree, whose string leaves are templates: (position, keyword)
+TREE_ARGUMENTS = {
+    "guard_tree": (1, "tree"),
+    "guard_stream": (1, "tree"),
+    "guard_file": (1, "template"),
+    "guard_checkpoint": (1, "templates"),
+}
+# functions taking (tensor, template) pairs
+PAIR_ARGUMENTS = {
+    "guard_all": 0,
+    "guard_many": 0,
+}
+# decorators taking templates as keyword arguments
+DECORATORS = {"guarded", "guarded_module"}
+
+Template = collections.namedtuple("Template", ["path", "line", "column", "function", "template"])
+Template.__doc__ = """A literal template found in a source file, at a 1-based line and 0-based column."""
+
+FileScan = collections.namedtuple("FileScan", ["path", "templates", "errors", "skipped"])
+FileScan.__doc__ = """
+The templates of a source file and the (Template, TemplateSyntaxError) of the malformed ones.
+skipped is the reason why the file could not be scanned, None if it was.
+"""
+
+
+def _string(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Constant):
+        return node.value if isinstance(node.value, str) else None
+    if sys.version_info < (3, 8) and isinstance(node, ast.Str):
+        return node.s
+    return None
+
+
+def _function_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _argument(call: ast.Call, position: int, keyword: str) -> Optional[ast.AST]:
+    for argument in call.keywords:
+        if argument.arg == keyword:
+            return argument.value
+    if position < len(call.args) and not any(isinstance(arg, ast.Starred) for arg in call.args[:position + 1]):
+        return call.args[position]
+    return None
+
+
+def _tree_strings(node: ast.AST) -> Iterator[ast.AST]:
+    """Yield the string literals of a literal template tree."""
+    if _string(node) is not None:
+        yield node
+    elif isinstance(node, ast.Dict):
+        for value in node.values:
+            yield from _tree_strings(value)
+    elif isinstance(node, (ast.List, ast.Tuple)):
+        for value in node.elts:
+            yield from _tree_strings(value)
+
+
+def find_templates(source: Union[str, bytes], path: str = "<string>") -> List[Template]:
+    """Return the literal templates of a Python source. Raise SyntaxError if it cannot be parsed."""
+    found = []  # type: List[Template]
+
+    def add(function: str, nodes: Iterable[ast.AST]):
+        for node in nodes:
+            found.append(Template(path, node.lineno, node.col_offset, function, _string(node)))
+
+    for node in ast.walk(ast.parse(source, path)):
+        if not isinstance(node, ast.Call):
+            continue
+        name = _function_name(node.func)
+        if name in TEMPLATE_ARGUMENTS:
+            argument = _argument(node, TEMPLATE_ARGUMENTS[name], "template")
+            if argument is not None and _string(argument) is not None:
+                add(name, [argument])
+        elif name in TREE_ARGUMENTS:
+            argument = _argument(node, *TREE_ARGUMENTS[name])
+            if argument is not None:
+                add(name, _tree_strings(argument))
+        elif name in PAIR_ARGUMENTS:
+            argument = _argument(node, PAIR_ARGUMENTS[name], "pairs")
+            if isinstance(argument, (ast.List, ast.Tuple)):
+                pairs = [pair for pair in argument.elts if isinstance(pair, ast.Tuple) and len(pair.elts) == 2]
+                add(name, [pair.elts[1] for pair in pairs if _string(pair.elts[1]) is not None])
+        elif name in DECORATORS:
+            for argument in node.keywords:
+                if argument.arg is not None:
+                    add(name, _tree_strings(argument.value))
+    found.sort(key=lambda template: (template.line, template.column))
+    return found
+
+
+def scan_file(path: str) -> FileScan:
+    """Find the templates of a source file and parse them. Never raises."""
+    try:
+        with open(path, "rb") as f:
+            templates = find_templates(f.read(), path)
+    except (OSError, SyntaxError, ValueError) as error:
+        return FileScan(path, [], [], "{}: {}".format(type(error).__name__, error))
+    errors = []  # type: List[Tuple[Template, exception.TemplateSyntaxError]]
+    for template in templates:
+        try:
+            parser.get_spec(template.template)
+        except exception.TemplateSyntaxError as error:
+            errors.append((template, error))
+    return FileScan(path, templates, errors, None)
+
+
+def scan(paths: Iterable[str], jobs: Optional[int] = None) -> Iterator[FileScan]:
+    """
+    Yield the FileScan of every path, in order.
+
+    :param jobs: number of worker processes, None for one per CPU, 0 to scan in the current process
+    """
+    if jobs == 0:
+        yield from map(scan_file, paths)
+        return
+    with concurrent.futures.ProcessPoolExecutor(jobs or os.cpu_count() or 1) as executor:
+        yield from executor.map(scan_file, paths, chunksize=16)
+
+
+def list_paths(paths: Iterable[str], pattern: str = "*.py") -> Iterator[str]:
+    """Yield the files and the files of the directories matching pattern, skipping hidden directories."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, directories, names in os.walk(path):
+            directories[:] = sorted(d for d in directories if not d.startswith(".") and d != "__pycache__")
+            for name in sorted(names):
+                if fnmatch.fnmatch(name, pattern):
+                    yield os.path.join(root, name)
+
+
+def format_error(template: Template, error: exception.TemplateSyntaxError) -> str:
+    message = " ".join(str(error).split("\n"))
+    return "{}:{}:{}: {}".format(template.path, template.line, template.column + 1, message)
+
+
+def add_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "scan", help="validate the templates of a source tree", description="Find the literal templates passed to "
+        "tensorguard in Python sources, report the malformed ones and optionally precompile the others."
+    )
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="Python files or directories to scan")
+    parser.add_argument("--pattern", default="*.py", help="file name pattern of the files in the directories, "
+                        "default: *.py")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes, default one per CPU, "
+                        "0 for none")
+    parser.add_argument("--output", "-o", help="spec file the valid templates are precompiled to, merged with "
+                        "the templates already in it")
+    parser.add_argument("--list", action="store_true", help="print every template found")
+    parser.set_defaults(run=run)
+    return parser
+
+
+def run(args: argparse.Namespace, stdout: Optional[TextIO] = None, stderr: Optional[TextIO] = None) -> int:
+    """Run the scan command. Return 0 if every template is valid, 1 otherwise."""
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+    scanned = found = errors = 0
+    unique = set()  # type: Set[str]
+    valid = collections.OrderedDict()  # type: collections.OrderedDict
+    for result in scan(list_paths(args.paths, args.pattern), args.jobs):
+        if result.skipped is not None:
+            stderr.write("{}: skipped, {}\n".format(result.path, result.skipped))
+            continue
+        scanned += 1
+        found += len(result.templates)
+        errors += len(result.errors)
+        malformed = {template for template, _ in result.errors}
+        for template in result.templates:
+            unique.add(template.template)
+            if args.list:
+                stdout.write("{}:{}:{}: {} {!r}\n".format(
+                    template.path, template.line, template.column + 1, template.function, template.template
+                ))
+            if template not in malformed:
+                valid[template.template] = None
+        for template, error in result.errors:
+            stdout.write(format_error(template, error) + "\n")
+    stdout.flush()
+    stderr.write("files: {}, templates: {} ({} unique), malformed: {}\n".format(
+        scanned, found, len(unique), errors
+    ))
+    if args.output:
+        from tensorguard import registry
+
+        _, total = registry.precompile_to(args.output, valid)
+        stderr.write("precompiled {} templates to {} ({} in the file)\n".format(len(valid), args.output, total))
+    return 1 if errors else 0
@@ -0,0 +1,122 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Defines dims scopes resolved through a context variable.
+
+The global tensorguard functions use the TensorGuard of the innermost active
+scope, or the process-wide root guard outside of any scope. Scopes are
+stored in a contextvars.ContextVar, so they are local to each thread and to
+each asyncio task, and no lock is involved in resolving them.
+"""
+
+import functools
+import inspect
+from typing import Callable, Dict, Optional
+
+from tensorguard.contexts import ContextVar
+from tensorguard.dims import LayeredDims
+from tensorguard.guard import TensorGuard
+
+root = TensorGuard()
+
+
+def _share_caches(guardian: TensorGuard, parent: TensorGuard):
+    # memo keys include the values of the dims and the sampling counters are
+    # per call site, so both stay valid for any dims
+    object.__setattr__(guardian, "memo", parent.memo)
+    object.__setattr__(guardian, "sampler", parent.sampler)
+
+_current = ContextVar("tensorguard_scope", default=None)
+# (token, rest) stack of the scopes entered in the current context, so that a scope
+# instance can be entered by several threads or tasks at once
+_tokens = ContextVar("tensorguard_scope_tokens", default=None)
+
+
+def current() -> TensorGuard:
+    """Return the TensorGuard of the innermost active scope, or the root guard."""
+    guardian = _current.get()
+    return root if guardian is None else guardian
+
+
+def reset():
+    """
+    Replace the current TensorGuard (of the innermost scope, or the root) with a fresh one.
+    The memo of guard results and the sampling policy are kept.
+    """
+    global root
+    guardian = TensorGuard()
+    _share_caches(guardian, current())
+    if _current.get() is None:
+        root = guardian
+    else:
+        _current.set(guardian)
+
+
+class scope:
+    """
+    Open a dims scope, as a context manager or as a decorator.
+
+    Inside the scope the global tensorguard functions (guard, get_dim, set_dim,
+    reset, ...) work on a TensorGuard of their own. Dims inferred or set inside
+    the scope are discarded when it exits. The scope is local to the current
+    thread or asyncio task; decorated coroutine functions run their whole body
+    in the scope.
+
+    Example:
+
+    >>> import tensorguard as tg
+    >>> with tg.scope():
+    ...     tg.guard(x, "B, D")   # B and D are only known inside the with block
+    >>> @tg.scope(inherit=False)
+    ... def handle_request(x): ...
+
+    :param inherit: if True, the scope reads through to the dims of the enclosing scope without
+        copying them. The dims set inside the scope never change the enclosing ones
+    :param dims: additional initial dims of the scope
+    """
+
+    def __init__(self, inherit: bool = True, dims: Optional[Dict[str, int]] = None):
+        self.inherit = inherit
+        self.dims = dims
+
+    def __enter__(self) -> TensorGuard:
+        parent = current()
+        if self.inherit:
+            dims = LayeredDims(parent.dims, self.dims)
+        else:
+            dims = dict(self.dims or {})
+        guardian = TensorGuard(dims=dims, guard_level=parent.guard_level)
+        _share_caches(guardian, parent)
+        _tokens.set((_current.set(guardian), _tokens.get()))
+        return guardian
+
+    def __exit__(self, *exc_info):
+        token, rest = _tokens.get()
+        _tokens.set(rest)
+        _current.reset(token)
+
+    def __call__(self, fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            # the scope must be active while the coroutine runs, not while it is created
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with scope(self.inherit, self.dims):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with scope(self.inherit, self.dims):
+                return fn(*args, **kwargs)
+
+        return wrapper
@@ -12,22 +12,25 @@
 
 """Defines the ShapeSpec object which represents a parsed shape template."""
 
-from typing import List, Union, Dict, Optional, Tuple
+from typing import Any, FrozenSet, List, Union, Dict, Optional, Tuple
 
+from tensorguard import compiler
 from tensorguard import dim_specs
 from tensorguard import exception
-from tensorguard import shape_spec_parser
+from tensorguard import solver
+from tensorguard.dims import LayeredDims
 
-EntriesType = List[Union[shape_spec_parser.Token, dim_specs.DimSpec]]
+# parse tree tokens (e.g. commas) may be mixed with DimSpecs and are dropped
+EntriesType = List[Union[str, dim_specs.DimSpec]]
 ShapeType = Union[Tuple[int], List[int]]
 
 
 class ShapeSpec:
-    def __init__(self, entries: EntriesType):
+    def __init__(self, entries: EntriesType, template: Optional[str] = None):
         super().__init__()
-        self.entries = [
-            x for x in entries if not isinstance(x, shape_spec_parser.Token)
-        ]
+        self.template = template
+        self._checker = None  # type: Optional[compiler.CheckerType]
+        self.entries = [x for x in entries if isinstance(x, dim_specs.DimSpec)]
         if dim_specs.ellipsis_dim in self.entries:
             idx = self.entries.index(dim_specs.ellipsis_dim)
             self.left_entries = self.entries[:idx]
@@ -37,6 +40,20 @@ class ShapeSpec:
             self.left_entries = self.entries
             self.right_entries = []
             self.has_ellipsis = False
+        self.plan = solver.InferencePlan(list(enumerate(self.left_entries + self.right_entries)))
+        # every name mentioned by the template, in order of appearance
+        self.names = tuple(dict.fromkeys(name for x in self.entries for name in solver.names(x)))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the compiled checker is a closure, rebuilt on the first call of compile
+        state = dict(self.__dict__)
+        state["_checker"] = None
+        return state
+
+    @property
+    def free_names(self) -> FrozenSet[str]:
+        """Names which cannot be inferred from the shape alone and must be given in the known dims."""
+        return self.plan.free_names
 
     def evaluate(self, known_dims: Dict[str, int] = None) -> List[Optional[int]]:
         known_dims = known_dims or {}
@@ -56,7 +73,8 @@ class ShapeSpec:
         for x in self.entries:
             try:
                 eval_shape.append(x.evaluate(known_dims))
-            except exception.UnderspecifiedShapeError:
+            except (exception.UnderspecifiedShapeError, ZeroDivisionError, TypeError):
+                # TypeError: a dynamic dim (X?) evaluates to None inside arithmetic
                 eval_shape.append(repr(x))
         return eval_shape
 
@@ -88,17 +106,49 @@ class ShapeSpec:
     def infer(
         self, shape: ShapeType, known_dims: Dict[str, int] = None
     ) -> Dict[str, int]:
-        current_known = {}
-        if known_dims:
-            current_known.update(known_dims)
-        inferred = {"Start": True}
-        while inferred:
-            inferred = {}
-            for s, x in self.zip_iter(shape):
-                inferred.update(x.infer(s, current_known))
-            current_known.update(inferred)
+        current_known = LayeredDims(known_dims)
+        values = [s for s, _ in self.zip_iter(shape)]
+        for i, x in self.plan.named:
+            if i < len(values):
+                current_known.update(x.infer(values[i], current_known))
+        for i, x in self.plan.steps():
+            if i < len(values) and values[i] is not None:
+                current_known.update(x.infer(values[i], current_known))
         return current_known
 
+    def compile(self) -> "compiler.CheckerType":
+        """Return the specialized checker function of this spec.
+
+        The checker is generated on the first call and cached on the spec.
+        Calling ``checker(shape, known_dims)`` returns the newly inferred
+        named dimensions or raises ShapeError, like ``tools.guard``.
+        """
+        checker = self._checker
+        if checker is None:
+            checker = self._checker = compiler.compile_spec(self)
+        return checker
+
+    def rank_error(self, shape: ShapeType, known_dims: Dict[str, int]) -> exception.ShapeError:
+        return exception.ShapeError(
+            "Tensor has the wrong rank ({} != {}).\n"
+            "Expected shape: {} (from template {})\n"
+            "  Actual shape: {}".format(
+                len(shape), len(self), self.partial_evaluate(known_dims), self._template_repr(), shape
+            )
+        )
+
+    def mismatch_error(self, shape: ShapeType, known_dims: Dict[str, int]) -> exception.ShapeError:
+        return exception.ShapeError(
+            "Shape Mismatch\n"
+            "Expected shape: {} (from template {})\n"
+            "  Actual shape: {}".format(self.partial_evaluate(known_dims), self._template_repr(), shape)
+        )
+
+    def _template_repr(self) -> str:
+        if self.template is None:
+            return ", ".join(repr(x) for x in self.entries)
+        return self.template
+
     def __repr__(self) -> str:
         return "<{}>".format(self.entries)
 
@@ -0,0 +1,91 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Plans the inference of the named dims of a template.
+
+The plan is computed once per ShapeSpec from the name dependencies of its
+entries. Names of plain named entries (e.g. ``B`` in ``"B, H*W"``) are read
+from the shape directly. An expression entry can infer one of its names when
+all its other names are known, so the expression entries are sorted such that
+every entry comes after the entries inferring the names it depends on.
+Expressions which cannot be solved from the shape alone (e.g. ``"H*W"`` when
+neither H nor W appears elsewhere) are kept apart: they need names given by
+the known dims, and their names are reported as free names.
+"""
+
+from typing import FrozenSet, List, Sequence, Set, Tuple
+
+from tensorguard import dim_specs
+
+# (index of the entry among the checked shape entries, DimSpec of the entry)
+EntryType = Tuple[int, dim_specs.DimSpec]
+
+
+def names(dim: dim_specs.DimSpec) -> List[str]:
+    """Return every occurrence of a name in dim, from left to right."""
+    if isinstance(dim, dim_specs.NamedDim):
+        return [dim.name]
+    if isinstance(dim, dim_specs.OpSpec):
+        return names(dim.left) + names(dim.right)
+    return []
+
+
+class InferencePlan:
+    """
+    Order in which the entries of a template infer the named dims.
+
+    :param entries: the checked entries of the template, ellipsis excluded, as (index, DimSpec)
+    """
+
+    def __init__(self, entries: Sequence[EntryType]):
+        # plain named entries give their name whenever the shape entry is not None
+        self.named = [(i, dim) for i, dim in entries if isinstance(dim, dim_specs.NamedDim)]
+        self.anchors = frozenset(
+            dim.name for _, dim in self.named if not isinstance(dim, dim_specs.DynamicNamedDim)
+        )  # type: FrozenSet[str]
+        entry_names = {i: names(dim) for i, dim in entries}
+        operations = [(i, dim) for i, dim in entries if isinstance(dim, dim_specs.OpSpec) and entry_names[i]]
+
+        resolved = set(self.anchors)  # type: Set[str]
+        self.order = []  # type: List[EntryType]
+        progress = True
+        while progress:
+            progress = False
+            for entry in operations:
+                unknown = [name for name in entry_names[entry[0]] if name not in resolved]
+                if len(unknown) == 1:
+                    self.order.append(entry)
+                    resolved.add(unknown[0])
+                    progress = True
+            # entries without unknown names are only checked
+            operations = [(i, dim) for i, dim in operations
+                          if (i, dim) not in self.order and not resolved.issuperset(entry_names[i])]
+        # solvable only with the help of the known dims, in any order
+        self.underdetermined = operations  # type: List[EntryType]
+        # names which may be missing after inferring from a shape without None entries
+        self.free_names = frozenset(
+            name for i, _ in entries for name in entry_names[i] if name not in resolved
+        )  # type: FrozenSet[str]
+
+    def steps(self) -> List[EntryType]:
+        """
+        Return the expression entries to infer from, in order. Every entry of the
+        order is visited once; the underdetermined entries are repeated as many
+        times as they are, enough for any of them to use the names inferred by
+        the others.
+        """
+        return self.order + self.underdetermined * len(self.underdetermined)
+
+    def __repr__(self) -> str:
+        return "<InferencePlan order={} underdetermined={} free_names={}>".format(
+            [dim for _, dim in self.order], [dim for _, dim in self.underdetermined], sorted(self.free_names)
+        )
@@ -0,0 +1,164 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks the batches of data pipelines.
+
+GuardedStream wraps an iterable of batches and checks every batch against a
+template (or a template tree, see tensorguard.trees) when it is consumed.
+Each batch is checked with its own dims, except the persistent names, which
+are fixed by the first batch inferring them and must keep their value.
+
+GuardedCollate and WorkerInit are picklable helpers for torch DataLoaders, so
+that batches are checked inside the worker processes, off the main training
+loop. They import torch only when called.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from tensorguard import exception
+from tensorguard import levels
+from tensorguard import scopes
+from tensorguard import trees
+from tensorguard.dims import LayeredDims
+
+ON_ERROR = ("raise", "skip", "collect")
+
+PersistentType = Union[bool, Iterable[str]]
+
+
+class BatchChecker:
+    """
+    Checks batches against a template tree, keeping the persistent dims between batches.
+
+    :param tree: template, or template tree of the batches
+    :param persistent: names whose value must be the same in all the batches, or True for all names
+    """
+
+    def __init__(self, tree: trees.TreeType, persistent: PersistentType = False):
+        self.plan = trees.get_plan(tree)
+        self.persistent = persistent if isinstance(persistent, bool) else frozenset(persistent)
+        self.dims = {}  # type: Dict[str, int]
+
+    def check(self, batch: Any):
+        """Check batch with the dims of the current scope and the persistent dims. Raise MultipleShapeError."""
+        guardian = scopes.current()
+        guard_level = guardian.get_level()
+        known = LayeredDims(guardian.dims, self.dims) if self.dims else guardian.dims
+        if guard_level is levels.GuardLevel.FULL:
+            inferred = self.plan.check(batch, known)
+            if inferred and self.persistent:
+                self.dims.update(
+                    inferred if self.persistent is True else
+                    {name: value for name, value in inferred.items() if name in self.persistent}
+                )
+        elif guard_level is levels.GuardLevel.RANK:
+            self.plan.check_rank(batch, known)
+
+
+class GuardedStream:
+    """
+    Iterable checking every batch of an iterable when it is consumed.
+
+    :param iterable: the batches
+    :param tree: template, or template tree of the batches
+    :param on_error: "raise" the MultipleShapeError of a mismatching batch, "skip" it, or skip it
+        and "collect" its (index, error) in errors
+    :param persistent: names whose value must be the same in all the batches, or True for all names
+    """
+
+    def __init__(
+        self, iterable: Iterable, tree: trees.TreeType, on_error: str = "raise", persistent: PersistentType = False
+    ):
+        if on_error not in ON_ERROR:
+            raise ValueError("on_error must be one of {}, got {!r}".format(", ".join(ON_ERROR), on_error))
+        self.iterable = iterable
+        self.checker = BatchChecker(tree, persistent)
+        self.on_error = on_error
+        self.errors = []  # type: List[Tuple[int, exception.MultipleShapeError]]
+
+    @property
+    def dims(self) -> Dict[str, int]:
+        """The persistent dims inferred so far."""
+        return self.checker.dims
+
+    def __iter__(self) -> Iterator:
+        check = self.checker.check
+        for i, batch in enumerate(self.iterable):
+            try:
+                check(batch)
+            except exception.MultipleShapeError as error:
+                if self.on_error == "raise":
+                    raise
+                if self.on_error == "collect":
+                    self.errors.append((i, error))
+                continue
+            yield batch
+
+    def __len__(self) -> int:
+        return len(self.iterable)
+
+
+class GuardedCollate:
+    """
+    collate_fn of a torch DataLoader checking every collated batch, in the worker process
+    when the DataLoader has workers. Errors are raised, and re-raised by the DataLoader
+    in the main process. Persistent dims are kept per worker.
+
+    :param tree: template, or template tree of the collated batches
+    :param collate_fn: collate function, default torch.utils.data.default_collate
+    :param persistent: names whose value must be the same in all the batches, or True for all names
+    """
+
+    def __init__(
+        self, tree: trees.TreeType, collate_fn: Optional[Callable] = None, persistent: PersistentType = False
+    ):
+        self.tree = tree
+        self.collate_fn = collate_fn
+        self.persistent = persistent
+        self._checker = None  # type: Optional[BatchChecker]
+
+    def __call__(self, samples: List[Any]) -> Any:
+        collate_fn = self.collate_fn
+        if collate_fn is None:
+            from torch.utils.data import default_collate as collate_fn
+        batch = collate_fn(samples)
+        if self._checker is None:
+            self._checker = BatchChecker(self.tree, self.persistent)
+        self._checker.check(batch)
+        return batch
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the compiled plan is rebuilt in every worker
+        state = dict(self.__dict__)
+        state["_checker"] = None
+        return state
+
+
+class WorkerInit:
+    """
+    worker_init_fn of a torch DataLoader applying the guard level (and sampling policy)
+    of the main process in every worker, which does not inherit them when started with
+    "spawn" or "forkserver".
+
+    :param worker_init_fn: optional worker_init_fn to call afterwards
+    """
+
+    def __init__(self, worker_init_fn: Optional[Callable[[int], None]] = None):
+        self.level = levels.get_level()
+        self.sampling = scopes.root.sampler.policy if scopes.root.sampler is not None else None
+        self.worker_init_fn = worker_init_fn
+
+    def __call__(self, worker_id: int):
+        levels.set_level(self.level)
+        scopes.root.set_sampling(self.sampling)
+        if self.worker_init_fn is not None:
+            self.worker_init_fn(worker_id)
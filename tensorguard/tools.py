@@ -12,18 +12,20 @@
 
 """Contains the main ShapeGuard class."""
 
-from copy import copy
-
-from typing import List, Dict, Union, Optional, Sequence
+from time import perf_counter
+from typing import List, Dict, Union, Optional, Sequence, Tuple, TYPE_CHECKING
 from typing_extensions import Protocol
 
 from tensorguard import exception
+from tensorguard.dims import LayeredDims
 from tensorguard import parser
+from tensorguard import profiling
 
-try:
+if TYPE_CHECKING:  # only needed for annotations, importing torch is slow
     import torch
-except ImportError:
-    pass
+    from tensorguard import cache
+    from tensorguard import compiler
+    from tensorguard import shape_spec
 
 
 class ShapedTensor(Protocol):
@@ -35,47 +37,158 @@ class ShapedTensor(Protocol):
 
 def matches(tensor: ShapedTensor, template: str, dims: Dict[str, int]) -> bool:
     shape = get_shape(tensor)
-    spec = parser.parse(template)
+    if profiling.profiler is not None:
+        spec, start, parsed, miss = _profiled_parse(template)
+        result = spec.matches(shape, dims)
+        profiling.profiler.record(template, miss, parsed - start, perf_counter() - parsed, not result)
+        return result
+    spec = parser.get_spec(template)
     return spec.matches(shape, dims)
 
 
 def reshape(tensor: ShapedTensor, template: str, dims: Dict[str, int]) -> ShapedTensor:
-    spec = parser.parse(template)
+    if profiling.profiler is not None:
+        spec, start, parsed, miss = _profiled_parse(template)
+        new_shape = spec.evaluate(dims)
+        profiling.profiler.record(template, miss, parsed - start, perf_counter() - parsed, False)
+        return tensor.reshape(new_shape)
+    spec = parser.get_spec(template)
     new_shape = spec.evaluate(dims)
     return tensor.reshape(new_shape)
 
 
 def evaluate(template: str, dims: Dict[str, int]) -> List[Optional[int]]:
-    dim_spec = parser.parse(template)
+    dim_spec = parser.get_spec(template)
     return dim_spec.evaluate(dims)
 
 
-def guard(tensor: ShapedTensor, template: str, dims: Dict[str, int]):
+def guard(
+    tensor: ShapedTensor, template: str, dims: Dict[str, int], memo: Optional["cache.LRUCache"] = None
+) -> Dict[str, int]:
+    """
+    Check tensor against template and return the newly inferred dims,
+    except the ones starting with '_'. Raise ShapeError on mismatch.
+
+    If memo is given, successful checks are memoized by template, shape and
+    the values of the known dims mentioned by the template, so the result of
+    a hit must not be modified.
+    """
+    shape = get_shape(tensor)
+    if profiling.profiler is not None:
+        return _profiled_guard(shape, template, dims, memo)
+    if memo is None:
+        return parser.get_spec(template).compile()(shape, dims)
+    return check_spec(shape, parser.get_spec(template), dims, memo)
+
+
+def check_spec(
+    shape: List[Optional[int]], spec: "shape_spec.ShapeSpec", dims: Dict[str, int],
+    memo: Optional["cache.LRUCache"] = None,
+) -> Dict[str, int]:
+    """Check shape against a parsed spec like guard."""
+    if memo is None:
+        return spec.compile()(shape, dims)
+    key = (spec, tuple(shape), tuple(map(dims.get, spec.names)))
+    inferred = memo.get(key)
+    if inferred is None:
+        inferred = spec.compile()(shape, dims)
+        memo.put(key, inferred)
+    return inferred
+
+
+def _profiled_parse(template: str):
+    start = perf_counter()
+    miss = template not in parser.spec_cache
+    spec = parser.get_spec(template)
+    return spec, start, perf_counter(), miss
+
+
+def _profiled_guard(
+    shape: List[Optional[int]], template: str, dims: Dict[str, int], memo: Optional["cache.LRUCache"]
+) -> Dict[str, int]:
+    spec, start, parsed, miss = _profiled_parse(template)
+    try:
+        inferred = check_spec(shape, spec, dims, memo)
+    except exception.ShapeError:
+        profiling.profiler.record(template, miss, parsed - start, perf_counter() - parsed, True)
+        raise
+    profiling.profiler.record(template, miss, parsed - start, perf_counter() - parsed, False)
+    return inferred
+
+
+def guard_many(pairs: Sequence[Tuple[ShapedTensor, str]], dims: Dict[str, int]) -> Dict[str, int]:
+    """
+    Check several tensors against their templates, solving the named dims of all
+    templates together. Return the newly inferred dims (except the ones starting
+    with '_') or raise a MultipleShapeError reporting every mismatching tensor.
+    """
+    checks = [(get_shape(tensor), parser.get_spec(template).compile()) for tensor, template in pairs]
+    inferred_dims, errors = solve(checks, LayeredDims(dims))
+    if errors:
+        raise exception.MultipleShapeError(errors)
+    return inferred_dims
+
+
+def solve(
+    checks: Sequence[Tuple[List[Optional[int]], "compiler.CheckerType"]], known: Dict[str, int]
+) -> Tuple[Dict[str, int], List[Tuple[int, exception.ShapeError]]]:
+    """
+    Run several compiled checkers on their shapes, sharing the known dims, which
+    are updated in place. Return the newly inferred dims and the list of
+    (index, ShapeError) of the failing checks.
+    """
+    inferred = {}  # type: Dict[str, int]
+    # version of the known dims each check last succeeded with; a check has to
+    # be repeated when names were inferred after it ran (e.g. "H*W" before "H")
+    version = 0
+    checked = [-1] * len(checks)
+    errors = {}  # type: Dict[int, exception.ShapeError]
+    stale = True
+    while stale:
+        stale = False
+        for i, (shape, check) in enumerate(checks):
+            if checked[i] == version or i in errors:
+                continue
+            try:
+                new_dims = check(shape, known)
+            except exception.ShapeError as error:
+                errors[i] = error
+                continue
+            if new_dims:
+                known.update(new_dims)
+                inferred.update(new_dims)
+                version += 1
+                stale = True
+            checked[i] = version
+    return inferred, sorted(errors.items())
+
+
+def guard_rank(tensor: ShapedTensor, template: str, dims: Dict[str, int]):
+    """
+    Check only the rank of tensor against template. Raise ShapeError on mismatch.
+    """
     shape = get_shape(tensor)
-    spec = parser.parse(template)
-    # compare rank
+    spec = parser.get_spec(template)
     if not spec.rank_matches(shape):
-        raise exception.ShapeError(
-            "Tensor has the wrong rank ({} != {}).\n"
-            "Expected shape: {} (from template {})\n"
-            "  Actual shape: {}".format(
-                len(shape), len(spec), spec.partial_evaluate(dims), template, shape
-            )
-        )
-    # infer dimensions
-    inferred_dims = spec.infer(shape, dims)
-    known_dims = copy(dims)
-    known_dims.update(inferred_dims)
-    # check if dimensions match
-    if not spec.matches(shape, known_dims):
-        raise exception.ShapeError(
-            "Shape Mismatch\n"
-            "Expected shape: {} (from template {})\n"
-            "  Actual shape: {}".format(spec.partial_evaluate(dims), template, shape)
-        )
+        raise spec.rank_error(shape, dims)
+
+
+def guard_rank_many(pairs: Sequence[Tuple[ShapedTensor, str]], dims: Dict[str, int]):
+    """
+    Check only the ranks of several tensors. Raise a MultipleShapeError reporting every mismatching tensor.
+    """
+    errors = []
+    for i, (tensor, template) in enumerate(pairs):
+        try:
+            guard_rank(tensor, template, dims)
+        except exception.ShapeError as error:
+            errors.append((i, error))
+    if errors:
+        raise exception.MultipleShapeError(errors)
+
 
-    # return the inferred dims unless they start with '_'
-    return {k: v for k, v in inferred_dims.items() if not k.startswith("_")}
+def rank_matches(tensor: ShapedTensor, template: str) -> bool:
+    return parser.get_spec(template).rank_matches(get_shape(tensor))
 
 
 def get_shape(tensor_or_shape: Union[Sequence[int], 'torch.Size', ShapedTensor]) -> List[int]:
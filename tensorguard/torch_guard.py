@@ -0,0 +1,214 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shape guards which can be traced by torch.compile without graph breaks.
+
+tensorguard.guard looks templates up in a locked cache and keeps its dims in
+a shared TensorGuard, which Dynamo cannot trace. A TorchGuard parses and
+compiles its template when it is built, outside of the graph; a call only
+reads tensor.shape and compares torch.Size / SymInt values with plain integer
+arithmetic, keeping the dims in a local dict given by the caller.
+
+With lower=True the constraints are not checked with Python comparisons but
+emitted as torch._check calls, so that with dynamic shapes the compiler
+records them as assertions on the symbolic sizes instead of specializing
+or recompiling on them.
+
+Example:
+
+>>> from tensorguard.torch_guard import TorchGuard
+>>> image_guard = TorchGuard("B, 3, H, W")
+>>> features_guard = TorchGuard("B, C, H/4, W/4", lower=True)
+>>> def forward(self, x):
+...     dims = {}
+...     features = self.backbone(image_guard(x, dims))
+...     return features_guard(features, dims)
+"""
+
+from typing import Dict, List, Optional
+
+import torch
+
+from tensorguard import dim_specs
+from tensorguard import exception
+from tensorguard import levels
+from tensorguard import parser
+from tensorguard import tools
+
+try:
+    _is_compiling = torch.compiler.is_compiling
+except AttributeError:  # torch < 2.1, without torch.compile support for the guards
+
+    def _is_compiling() -> bool:
+        return False
+
+
+def _is_zero(value) -> bool:
+    # symbolic sizes are not compared, which would specialize the graph on them
+    return isinstance(value, int) and value == 0
+
+
+def _evaluate(dim: dim_specs.DimSpec, known: Dict[str, int]):
+    """
+    Value of dim, or None if it cannot be evaluated. Unlike DimSpec.evaluate, only
+    raises ZeroDivisionError, when dividing by a zero integer.
+    """
+    if isinstance(dim, dim_specs.Number):
+        return dim.value
+    if isinstance(dim, dim_specs.NamedDim):
+        return known.get(dim.name)
+    if isinstance(dim, dim_specs.OpSpec):
+        left = _evaluate(dim.left, known)
+        right = _evaluate(dim.right, known)
+        if left is None or right is None:
+            return None
+        if isinstance(dim, dim_specs.DivDims) and _is_zero(right):
+            raise ZeroDivisionError(repr(dim))
+        return dim.op(left, right)
+    return None
+
+
+def _infer(dim: dim_specs.DimSpec, value, known: Dict[str, int]):
+    """
+    Infer the unknown names of dim from its value into known. Mirrors DimSpec.infer:
+    sides dividing by zero are not inferred from, and ShapeError is raised if no value
+    of the names can match.
+    """
+    if isinstance(dim, dim_specs.NamedDim):
+        if dim.name not in known:
+            if isinstance(value, int) and value < 0:
+                raise exception.ShapeError("{} cannot be negative ({})".format(dim.name, value))
+            known[dim.name] = value
+    elif isinstance(dim, dim_specs.OpSpec):
+        try:
+            left = _evaluate(dim.left, known)
+        except ZeroDivisionError:
+            left = None
+        is_mul, is_div = isinstance(dim, dim_specs.MulDims), isinstance(dim, dim_specs.DivDims)
+        # the divisors of the inverses, see compiler._RIGHT_DIVISOR and _LEFT_DIVISOR
+        if left is not None and not ((is_mul and _is_zero(left)) or (is_div and _is_zero(value))):
+            if is_div and not (isinstance(left, int) and isinstance(value, int)):
+                right = left // value  # symbolic sizes: the entry is checked by torch._check
+            else:
+                right = dim.right_op(value, left)  # raises ShapeError for a division without exact solution
+            _infer(dim.right, right, known)
+            return
+        try:
+            right = _evaluate(dim.right, known)
+        except ZeroDivisionError:
+            right = None
+        if right is not None and not (is_mul and _is_zero(right)):
+            _infer(dim.left, dim.left_op(value, right), known)
+
+
+class TorchGuard:
+    """
+    Precompiled guard of a single template.
+
+    :param template: the shape template
+    :param lower: if True, emit the constraints as torch._check calls
+    """
+
+    def __init__(self, template: str, lower: bool = False):
+        self.template = template
+        self.lower = lower
+        self.spec = parser.get_spec(template)
+        self.checker = self.spec.compile()
+        spec = self.spec
+        n_left, n_right = len(spec.left_entries), len(spec.right_entries)
+        # offset of every checked entry from the start (>= 0) or the end (< 0) of the shape
+        self.offsets = list(range(n_left)) + list(range(-n_right, 0))
+        # torch._check messages can only refer to constants
+        self.messages = [
+            "Shape Mismatch\nExpected {!r} at dimension {} (from template {})".format(dim, offset, template)
+            for dim, offset in zip(spec.left_entries + spec.right_entries, self.offsets)
+        ]
+
+    def __call__(self, tensor, dims: Optional[Dict[str, int]] = None):
+        """
+        Check tensor and return it. The inferred dims are written to dims, if given.
+        Raise ShapeError on mismatch.
+        """
+        guard_level = levels.get_level()
+        if guard_level is levels.GuardLevel.OFF:
+            return tensor
+        shape = tuple(tensor.shape) if isinstance(tensor, torch.Tensor) else tuple(tools.get_shape(tensor))
+        known = {} if dims is None else dims
+        if guard_level is levels.GuardLevel.RANK:
+            if not self.spec.rank_matches(shape):
+                raise self.spec.rank_error(list(shape), known)
+        elif self.lower:
+            self._check_lowered(shape, known)
+        else:
+            inferred = self.checker(shape, known)
+            if inferred:
+                known.update(inferred)
+        return tensor
+
+    def _check_lowered(self, shape: tuple, known: Dict[str, int]):
+        spec = self.spec
+        if not spec.rank_matches(shape):  # the rank is static, also in compiled graphs
+            raise spec.rank_error(list(shape), known)
+        given = dict(known)
+        values = [shape[offset] for offset in self.offsets]  # type: List
+        try:
+            for i, dim in spec.plan.named + spec.plan.steps():
+                if values[i] is not None:
+                    _infer(dim, values[i], known)
+        except exception.ShapeError:
+            raise spec.mismatch_error(list(shape), given)
+        compiling = _is_compiling()
+        for value, dim, message in zip(values, spec.left_entries + spec.right_entries, self.messages):
+            if value is None:
+                if isinstance(dim, (dim_specs.Wildcard, dim_specs.Dynamic, dim_specs.DynamicNamedDim)):
+                    continue
+                if isinstance(dim, dim_specs.OpSpec):
+                    continue
+                raise spec.mismatch_error(list(shape), given)
+            if isinstance(dim, dim_specs.Dynamic):
+                raise spec.mismatch_error(list(shape), given)
+            try:
+                expected = _evaluate(dim, known)
+            except ZeroDivisionError:  # matches no shape, once the value of every name is known
+                if dim_specs._is_known(dim, known):
+                    raise spec.mismatch_error(list(shape), given)
+                continue
+            if expected is None:
+                continue
+            if compiling:
+                torch._check_with(exception.ShapeError, value == expected, lambda: message)
+            elif value != expected:
+                raise spec.mismatch_error(list(shape), given)
+        for name in list(known):
+            if name.startswith("_") and name not in given:
+                del known[name]
+
+    def __repr__(self) -> str:
+        return "TorchGuard({!r}, lower={})".format(self.template, self.lower)
+
+
+# guards built by guard(), by (template, lower)
+_guards = {}  # type: Dict[tuple, TorchGuard]
+
+
+def guard(tensor, template: str, dims: Optional[Dict[str, int]] = None, lower: bool = False):
+    """
+    Check tensor against template like tensorguard.guard, with a TorchGuard built
+    on the first call. Inside a compiled function the first call of every
+    template should happen before compiling (e.g. with a warm-up call in eager
+    mode), or the template should be given to a module-level TorchGuard.
+    """
+    key = (template, lower)
+    torch_guard = _guards.get(key)
+    if torch_guard is None:
+        torch_guard = _guards[key] = TorchGuard(template, lower)
+    return torch_guard(tensor, dims)
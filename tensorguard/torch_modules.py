@@ -0,0 +1,166 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks the forward of torch.nn.Module subclasses with hooks.
+
+A module class declares the templates of its forward arguments and return
+value with the guarded_module decorator or with a ``shape_templates`` class
+attribute. The templates are compiled once per class, like the ones of
+tensorguard.guarded; install_hooks registers a forward pre-hook checking
+the arguments and a forward hook checking the result on every module of a
+model declaring templates. Each forward runs in a fresh dims scope, shared
+by its arguments, its result and the global functions called inside it.
+
+remove_hooks removes every installed hook at once, so a deployed model runs
+without any overhead.
+
+Example:
+
+>>> import tensorguard as tg
+>>> from tensorguard.torch_modules import guarded_module, install_hooks, remove_hooks
+>>> @guarded_module(x="B, T, D", returns="B, D")
+... class Pool(torch.nn.Module):
+...     def forward(self, x):
+...         return x.mean(1)
+>>> class Attention(torch.nn.Module):
+...     shape_templates = {"q": "B, T, D", "k": "B, S, D", "returns": "B, T, D"}
+>>> model = Model()
+>>> install_hooks(model)   # the modules of model declaring templates are checked
+>>> remove_hooks()         # all the hooks installed so far are removed
+"""
+
+import inspect
+import sys
+import weakref
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import torch
+
+from tensorguard import levels
+from tensorguard import scopes
+from tensorguard.decorators import GuardPlan
+from tensorguard.guard import TensorGuard
+
+# key of the return value template in shape_templates
+RETURNS = "returns"
+
+# the hooks need the with_kwargs (torch 2.0) and always_call (torch 2.1) options
+HOOKS_SUPPORTED = "always_call" in inspect.signature(torch.nn.Module.register_forward_hook).parameters
+
+# compiled plan of every module class, None for the classes without templates
+_plans = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+# handles of the installed hooks, by module
+_handles = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+# forwards in progress in the current thread or asyncio task, innermost first,
+# as (module, scope token, rest of the stack)
+_forwards = scopes.ContextVar("tensorguard_forwards", default=None)
+
+
+def guarded_module(returns: Union[None, str, Sequence[str]] = None, **templates: str) -> Callable[[type], type]:
+    """
+    Class decorator declaring the templates of the forward of a torch.nn.Module subclass.
+    The templates are compiled when the decorator runs.
+
+    :param returns: template of the return value, or a sequence of templates for a tuple of values
+    :param templates: template for each guarded argument of forward, by argument name
+    """
+
+    def decorator(cls: type) -> type:
+        shape_templates = dict(templates)
+        if returns is not None:
+            shape_templates[RETURNS] = returns
+        cls.shape_templates = shape_templates
+        _plans[cls] = GuardPlan(cls.forward, templates, returns)
+        return cls
+
+    return decorator
+
+
+def get_plan(cls: type) -> Optional[GuardPlan]:
+    """Return the compiled plan of the templates of a module class, or None if it declares none."""
+    try:
+        return _plans[cls]
+    except KeyError:
+        pass
+    shape_templates = getattr(cls, "shape_templates", None)
+    if shape_templates:
+        templates = dict(shape_templates)
+        returns = templates.pop(RETURNS, None)
+        plan = GuardPlan(cls.forward, templates, returns)
+    else:
+        plan = None
+    _plans[cls] = plan
+    return plan
+
+
+def _pre_hook(module: torch.nn.Module, args: tuple, kwargs: Dict):
+    if levels.get_level() is levels.GuardLevel.OFF:
+        return None
+    parent = scopes.current()
+    guardian = TensorGuard(guard_level=parent.guard_level)
+    scopes._share_caches(guardian, parent)
+    # pushed before checking: the forward hook is called also when the pre-hook raises
+    _forwards.set((module, scopes._current.set(guardian), _forwards.get()))
+    _plans[type(module)].check_arguments((module,) + args, kwargs, guardian.dims)
+    return None
+
+
+def _hook(module: torch.nn.Module, args: tuple, kwargs: Dict, result):
+    forwards = _forwards.get()
+    if forwards is None or forwards[0] is not module:
+        return None  # the pre-hook did not run, e.g. with the guard level "off"
+    _, token, rest = forwards
+    try:
+        # with an exception raised in forward, result is None and must not be checked
+        if result is not None or sys.exc_info()[0] is None:
+            _plans[type(module)].check_result(result, scopes.current().dims)
+    finally:
+        scopes._current.reset(token)
+        _forwards.set(rest)
+    return None
+
+
+def install_hooks(model: torch.nn.Module, recurse: bool = True) -> int:
+    """
+    Install the hooks checking the forward of model and, if recurse, of all its submodules
+    declaring templates. Modules already checked are skipped.
+
+    :return: the number of modules on which the hooks were installed
+    """
+    if not HOOKS_SUPPORTED:
+        raise RuntimeError("install_hooks needs torch >= 2.1, found torch {}".format(torch.__version__))
+    modules = model.modules() if recurse else [model]
+    installed = 0
+    for module in modules:
+        if module in _handles or get_plan(type(module)) is None:
+            continue
+        _handles[module] = [
+            module.register_forward_pre_hook(_pre_hook, with_kwargs=True),
+            module.register_forward_hook(_hook, with_kwargs=True, always_call=True),
+        ]
+        installed += 1
+    return installed
+
+
+def remove_hooks(model: Optional[torch.nn.Module] = None):
+    """
+    Remove the hooks installed on model and its submodules, or all the installed hooks if model is None.
+    """
+    modules = list(_handles.keys()) if model is None else list(model.modules())
+    for module in modules:
+        for handle in _handles.pop(module, ()):
+            handle.remove()
+
+
+def hooked_modules() -> List[torch.nn.Module]:
+    """Return the modules on which the hooks are installed."""
+    return list(_handles.keys())
@@ -0,0 +1,155 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks nested structures of tensors against nested structures of templates.
+
+A template tree is made of dicts (whose keys select the items of a mapping or
+the attributes of any other object, e.g. a dataclass or a namedtuple), lists
+and tuples (whose positions select the items of a sequence) and template
+strings as leaves. It is compiled once into a TreePlan, a flat list of leaf
+paths and compiled checkers, cached by the structure of the tree.
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Hashable, List, Sequence, Tuple, Union
+
+from tensorguard import cache
+from tensorguard import exception
+from tensorguard import parser
+from tensorguard import tools
+from tensorguard.dims import LayeredDims
+
+TreeType = Union[str, Mapping, Sequence]
+PathType = Tuple[Union[str, int], ...]
+
+# compiled plans by frozen template tree
+plan_cache = cache.LRUCache(maxsize=256)
+
+_MISSING = object()
+
+
+def freeze(tree: TreeType) -> Hashable:
+    """Return a hashable key of a template tree, equal for trees of the same structure and templates."""
+    if isinstance(tree, str):
+        return tree
+    if isinstance(tree, Mapping):
+        return (dict, tuple((key, freeze(value)) for key, value in tree.items()))
+    if isinstance(tree, (list, tuple)):
+        return (list, tuple(freeze(value) for value in tree))
+    raise TypeError("Invalid template tree node {!r} of type {}".format(tree, type(tree).__name__))
+
+
+def path_label(path: PathType) -> str:
+    """Return a readable label of a leaf path, e.g. "meta.mask" or "pair[0]"."""
+    label = ""
+    for key in path:
+        if isinstance(key, int):
+            label += "[{}]".format(key)
+        else:
+            label += "." + str(key) if label else str(key)
+    return label or "<root>"
+
+
+class TreePlan:
+    """The leaves of a template tree with their paths and compiled checkers, in depth-first order."""
+
+    def __init__(self, tree: TreeType):
+        self.paths = []  # type: List[PathType]
+        self.specs = []  # type: List[Any]
+        self._flatten(tree, ())
+        self.checkers = [spec.compile() for spec in self.specs]
+        self.labels = [path_label(path) for path in self.paths]
+
+    def _flatten(self, tree: TreeType, path: PathType):
+        if isinstance(tree, str):
+            self.paths.append(path)
+            self.specs.append(parser.get_spec(tree))
+        elif isinstance(tree, Mapping):
+            for key, value in tree.items():
+                self._flatten(value, path + (key,))
+        else:
+            for i, value in enumerate(tree):
+                self._flatten(value, path + (i,))
+
+    def leaves(self, value: Any) -> List[Any]:
+        """Return the leaves of value selected by the paths, _MISSING for the missing ones."""
+        leaves = []
+        for path in self.paths:
+            node = value
+            for key in path:
+                try:
+                    if isinstance(key, int) or isinstance(node, Mapping):
+                        node = node[key]
+                    else:
+                        node = getattr(node, key)
+                except (KeyError, IndexError, AttributeError, TypeError):
+                    node = _MISSING
+                    break
+            leaves.append(node)
+        return leaves
+
+    def _missing_errors(self, leaves: List[Any]) -> List[Tuple[str, exception.ShapeError]]:
+        return [
+            (self.labels[i], exception.ShapeError("Missing value for the template {}".format(self.specs[i])))
+            for i, leaf in enumerate(leaves) if leaf is _MISSING
+        ]
+
+    def check(self, value: Any, dims: Dict[str, int]) -> Dict[str, int]:
+        """
+        Check all the leaves of value together, sharing their named dims. Return the newly
+        inferred dims (except the ones starting with '_') or raise a MultipleShapeError
+        reporting every mismatching or missing leaf; dims is never modified.
+        """
+        leaves = self.leaves(value)
+        errors = self._missing_errors(leaves)
+        checks = [
+            (tools.get_shape(leaf), checker) for leaf, checker in zip(leaves, self.checkers) if leaf is not _MISSING
+        ]
+        inferred, failed = tools.solve(checks, LayeredDims(dims))
+        if errors or failed:
+            present = [label for leaf, label in zip(leaves, self.labels) if leaf is not _MISSING]
+            errors += [(present[i], error) for i, error in failed]
+            raise exception.MultipleShapeError(errors)
+        return inferred
+
+    def check_rank(self, value: Any, dims: Dict[str, int]):
+        """Check only the ranks of the leaves of value. Raise a MultipleShapeError on mismatch."""
+        leaves = self.leaves(value)
+        errors = self._missing_errors(leaves)
+        for leaf, spec, label in zip(leaves, self.specs, self.labels):
+            if leaf is not _MISSING:
+                shape = tools.get_shape(leaf)
+                if not spec.rank_matches(shape):
+                    errors.append((label, spec.rank_error(shape, dims)))
+        if errors:
+            raise exception.MultipleShapeError(errors)
+
+    def __repr__(self) -> str:
+        return "<TreePlan {}>".format(", ".join("{}: {}".format(l, s) for l, s in zip(self.labels, self.specs)))
+
+
+def get_plan(tree: TreeType) -> TreePlan:
+    """Return the compiled plan of a template tree, reusing the plans of trees with the same structure."""
+    key = freeze(tree)
+    plan = plan_cache.get(key)
+    if plan is None:
+        plan = TreePlan(tree)
+        plan_cache.put(key, plan)
+    return plan
+
+
+def guard_tree(value: Any, tree: TreeType, dims: Dict[str, int]) -> Dict[str, int]:
+    """
+    Check the leaves of value against the templates of tree, solving their named dims together.
+    Return the newly inferred dims or raise a MultipleShapeError; dims is never modified.
+    """
+    return get_plan(tree).check(value, dims)
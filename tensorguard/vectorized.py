@@ -0,0 +1,230 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checks millions of shapes against a template at once with NumPy.
+
+Shapes are given as an (N, rank) integer array, one shape per row. Ragged
+ranks are supported with a boolean mask of the same size marking the valid
+(left-aligned) entries of each row. Negative entries are treated as dynamic
+(None) dimensions.
+
+The DimSpec arithmetic is evaluated as NumPy column operations following the
+same inference rules as the compiled checker (see compiler.py).
+"""
+
+from collections import namedtuple
+from typing import Dict, Optional, Sequence
+
+from tensorguard import dim_specs
+from tensorguard import parser
+
+ShapeMatches = namedtuple("ShapeMatches", ["matches", "dims"])
+ShapeMatches.__doc__ = """Result of match_shapes.
+
+matches: boolean array of shape (N,), True where the row matches the template.
+dims: {name: int64 array of shape (N,)} of the inferred named dims, -1 where
+    the dimension could not be inferred. Names already given in dims and
+    names starting with '_' are not included.
+"""
+
+
+class _Evaluator:
+    """Vectorized evaluation and inference of DimSpecs over N rows."""
+
+    def __init__(self, np, n: int, dims: Dict[str, int]):
+        self.np = np
+        self.n = n
+        self.values = {}  # type: Dict[str, "np.ndarray"]
+        self.known = {}  # type: Dict[str, "np.ndarray"]
+        self.given = dims
+        # rows with an entry no value of its names can match, see OpSpec.infer
+        self.conflicts = np.zeros(n, dtype=bool)
+
+    def _name(self, name: str):
+        if name not in self.values:
+            np = self.np
+            if name in self.given:
+                self.values[name] = np.full(self.n, self.given[name], dtype=np.int64)
+                self.known[name] = np.ones(self.n, dtype=bool)
+            else:
+                self.values[name] = np.full(self.n, -1, dtype=np.int64)
+                self.known[name] = np.zeros(self.n, dtype=bool)
+        return self.values[name], self.known[name]
+
+    def _floordiv(self, a, b):
+        """Floor division, with the rows dividing by zero marked as invalid."""
+        np = self.np
+        zero = b == 0
+        return a // np.where(zero, 1, b), ~zero
+
+    def evaluate(self, dim: dim_specs.DimSpec):
+        """Return (values, valid) arrays, valid is False where dim cannot be evaluated."""
+        np = self.np
+        if isinstance(dim, dim_specs.Number):
+            return np.full(self.n, dim.value, dtype=np.int64), np.ones(self.n, dtype=bool)
+        if isinstance(dim, dim_specs.NamedDim):
+            return self._name(dim.name)
+        if isinstance(dim, dim_specs.OpSpec):
+            left, left_valid = self.evaluate(dim.left)
+            right, right_valid = self.evaluate(dim.right)
+            valid = left_valid & right_valid
+            if isinstance(dim, dim_specs.AddDims):
+                return left + right, valid
+            if isinstance(dim, dim_specs.SubDims):
+                return left - right, valid
+            if isinstance(dim, dim_specs.MulDims):
+                return left * right, valid
+            if isinstance(dim, dim_specs.DivDims):
+                values, nonzero = self._floordiv(left, right)
+                return values, valid & nonzero
+        raise TypeError("Cannot evaluate {!r} on arrays".format(dim))
+
+    def names_known(self, dim: dim_specs.DimSpec):
+        """Return the rows where every name of dim is known."""
+        if isinstance(dim, dim_specs.NamedDim):
+            return self._name(dim.name)[1].copy()
+        if isinstance(dim, dim_specs.OpSpec):
+            return self.names_known(dim.left) & self.names_known(dim.right)
+        return self.np.ones(self.n, dtype=bool)
+
+    def _inverse(self, dim: dim_specs.OpSpec, side: str, target, other):
+        """Value of one side of dim from the target and the other side, see OpSpec.left_op/right_op."""
+        valid = self.np.ones(self.n, dtype=bool)
+        if isinstance(dim, dim_specs.AddDims):
+            return target - other, valid
+        if isinstance(dim, dim_specs.SubDims):
+            return (target + other if side == "left" else other - target), valid
+        if isinstance(dim, dim_specs.MulDims):
+            return self._floordiv(target, other)
+        if isinstance(dim, dim_specs.DivDims):
+            if side == "left":
+                return target * other, valid
+            values, valid = self._floordiv(other, target)
+            # see dim_specs._right_of_div: without an exact solution no divisor matches
+            exact, nonzero = self._floordiv(other, values)
+            return values, valid & nonzero & (exact == target)
+        raise TypeError("Cannot infer {!r} on arrays".format(dim))
+
+    def infer(self, dim: dim_specs.DimSpec, target, rows):
+        """Infer the unknown names of dim in rows from the target values. Mirrors DimSpec.infer."""
+        if isinstance(dim, dim_specs.NamedDim):
+            values, known = self._name(dim.name)
+            new = rows & ~known
+            # negative values are inverted from expressions, e.g. 4 - X = 5
+            self.conflicts |= new & (target < 0)
+            new &= target >= 0
+            if new.any():
+                values[new] = target[new]
+                known |= new
+        elif isinstance(dim, dim_specs.OpSpec):
+            left, left_valid = self.evaluate(dim.left)
+            right, right_valid = self.evaluate(dim.right)
+            from_left = rows & left_valid
+            from_right = rows & ~left_valid & right_valid
+            if from_left.any():
+                right_target, ok = self._inverse(dim, "right", target, left)
+                if isinstance(dim, dim_specs.DivDims):
+                    self.conflicts |= from_left & (target != 0) & ~ok
+                self.infer(dim.right, right_target, from_left & ok)
+            if from_right.any():
+                left_target, ok = self._inverse(dim, "left", target, right)
+                self.infer(dim.left, left_target, from_right & ok)
+
+
+def _as_array(np, shapes, mask):
+    if mask is None and not isinstance(shapes, np.ndarray):
+        shapes = list(shapes)
+        width = max((len(s) for s in shapes), default=0)
+        if any(len(s) != width for s in shapes):
+            mask = np.array([[i < len(s) for i in range(width)] for s in shapes], dtype=bool).reshape(-1, width)
+            shapes = [list(s) + [0] * (width - len(s)) for s in shapes]
+        shapes = [[-1 if x is None else x for x in s] for s in shapes]
+    shapes = np.asarray(shapes, dtype=np.int64)
+    if shapes.ndim != 2:
+        raise ValueError("shapes must be a 2D (N, rank) array, got {} dimensions".format(shapes.ndim))
+    if mask is None:
+        ranks = np.full(shapes.shape[0], shapes.shape[1], dtype=np.int64)
+    else:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != shapes.shape:
+            raise ValueError("mask shape {} differs from shapes {}".format(mask.shape, shapes.shape))
+        ranks = mask.sum(axis=1)
+        if not (mask == (np.arange(shapes.shape[1]) < ranks[:, None])).all():
+            raise ValueError("the valid entries of each row of mask must be left-aligned")
+    return shapes, ranks
+
+
+def match_shapes(
+    shapes: Sequence[Sequence[Optional[int]]],
+    template: str,
+    dims: Optional[Dict[str, int]] = None,
+    mask: Optional[Sequence[Sequence[bool]]] = None,
+) -> ShapeMatches:
+    """Check many shapes against template at once.
+
+    :param shapes: (N, rank) integer array, or a sequence of (possibly ragged) shapes
+    :param template: the shape template
+    :param dims: known named dims, shared by all rows
+    :param mask: optional (N, rank) boolean array of the valid entries of each row
+    :return: ShapeMatches(matches, dims)
+    """
+    import numpy as np
+
+    dims = dims or {}
+    shapes, ranks = _as_array(np, shapes, mask)
+    n, width = shapes.shape
+    spec = parser.get_spec(template)
+    if spec.has_ellipsis:
+        rank_ok = ranks >= len(spec.entries) - 1
+    else:
+        rank_ok = ranks == len(spec.entries)
+
+    columns = []  # (values, is_none, DimSpec) per checked entry
+    for i, dim in enumerate(spec.left_entries):
+        values = shapes[:, i] if i < width else np.zeros(n, dtype=np.int64)
+        columns.append((values, values < 0, dim))
+    for j, dim in enumerate(spec.right_entries):
+        index = np.clip(ranks - (len(spec.right_entries) - j), 0, max(width - 1, 0))
+        values = shapes[np.arange(n), index] if width else np.zeros(n, dtype=np.int64)
+        columns.append((values, values < 0, dim))
+
+    evaluator = _Evaluator(np, n, dims)
+    for i, dim in spec.plan.named + spec.plan.steps():
+        values, is_none, _ = columns[i]
+        evaluator.infer(dim, values, rank_ok & ~is_none)
+
+    matches = rank_ok & ~evaluator.conflicts
+    for values, is_none, dim in columns:
+        if isinstance(dim, dim_specs.Wildcard):
+            continue
+        if isinstance(dim, dim_specs.Number):
+            matches &= values == dim.value
+        elif isinstance(dim, dim_specs.Dynamic):
+            matches &= is_none
+        elif isinstance(dim, dim_specs.DynamicNamedDim):
+            expected, known = evaluator.evaluate(dim)
+            matches &= is_none | ~known | (expected == values)
+        elif isinstance(dim, dim_specs.NamedDim):
+            expected, known = evaluator.evaluate(dim)
+            matches &= ~is_none & known & (expected == values)
+        else:
+            # dividing by zero matches no shape, once the value of every name is known
+            expected, valid = evaluator.evaluate(dim)
+            matches &= is_none | ~evaluator.names_known(dim) | (valid & (expected == values))
+
+    inferred = {
+        name: np.where(evaluator.known[name], values, -1)
+        for name, values in evaluator.values.items()
+        if name not in dims and not name.startswith("_")
+    }
+    return ShapeMatches(matches, inferred)
+
@@ -0,0 +1,121 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from tensorguard import audit
+from tensorguard import files
+from tensorguard.__main__ import main
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for i in range(10):
+        np.save(str(data / "{}.npy".format(i)), np.zeros([10 + i % 2, 80], dtype=np.float32))
+    np.save(str(data / "bad.npy"), np.zeros([10, 40]))
+    (data / "notes.txt").write_text("ignored")
+    return data
+
+
+def read_lines(text):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_audit_in_process(dataset, capsys):
+    assert main(["audit", str(dataset), "-t", "T, 80", "--jobs", "0"]) == 1
+    out, err = capsys.readouterr()
+    results = read_lines(out)
+    assert len(results) == 11
+    assert [r["path"] for r in results] == sorted(r["path"] for r in results)
+    bad = [r for r in results if not r["matches"]]
+    assert [r["path"] for r in bad] == [str(dataset / "bad.npy")]
+    assert "files: 11, matches: 10, mismatches: 1, unreadable: 0" in err
+    assert "T: 10 (5), 11 (5)" in err  # mismatching files infer nothing
+
+
+def test_audit_process_pool_keeps_order(dataset):
+    paths = [str(dataset / "{}.npy".format(i)) for i in range(10)] * 3
+    results = list(audit.audit(paths, "T, 80", {"T": 10}, jobs=2, batch_size=4))
+    assert [r["path"] for r in results] == paths
+    assert [r["matches"] for r in results] == [i % 2 == 0 for i in range(10)] * 3
+
+
+def test_audit_resumes_from_checkpoint(dataset, tmp_path, capsys):
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("\n".join(str(dataset / "{}.npy".format(i)) for i in range(5)) + "\n")
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    args = ["audit", "--manifest", str(manifest), "-t", "T, 80", "--jobs", "0", "--checkpoint", str(checkpoint)]
+    assert main(args) == 0
+    capsys.readouterr()
+    with checkpoint.open("a") as f:
+        f.write('{"path": "trunc')  # interrupted while writing
+    manifest.write_text(manifest.read_text() + str(dataset / "missing.npy") + "\n")
+    assert main(args) == 1
+    out, err = capsys.readouterr()
+    assert [r["path"] for r in read_lines(out)] == [str(dataset / "missing.npy")]  # only the new file
+    assert "files: 6, matches: 5, mismatches: 0, unreadable: 1" in err
+    assert len(checkpoint.read_text().splitlines()) == 8  # settings, 5 + 1 results and the truncated line
+
+
+def test_audit_rejects_malformed_templates(dataset, tmp_path, capsys):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    args = ["audit", str(dataset), "--jobs", "0", "--checkpoint", str(checkpoint)]
+    assert main(args + ["-t", "T,, 80"]) == 2
+    assert "Unexpected token ','" in capsys.readouterr()[1]
+    assert not checkpoint.exists()
+    assert main(args + ["--member", "x=T", "--member", "y=T*"]) == 2
+
+
+def test_audit_refuses_checkpoints_of_other_settings(dataset, tmp_path, capsys):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    args = ["audit", str(dataset / "0.npy"), "--jobs", "0", "--checkpoint", str(checkpoint)]
+    assert main(args + ["-t", "T, 80"]) == 0
+    assert main(args + ["-t", "T, 80", "--dim", "T=10"]) == 2
+    assert main(args + ["-t", "T, 40"]) == 2
+    assert "other templates or dims" in capsys.readouterr()[1]
+    assert main(args + ["-t", "T, 80"]) == 0
+    assert "files: 1, matches: 1" in capsys.readouterr()[1]
+
+
+def test_audit_torch_files(tmp_path, capsys):
+    torch = pytest.importorskip("torch")
+    torch.save({"x": torch.zeros(4, 80), "y": torch.zeros(4)}, str(tmp_path / "sample.pt"))
+    assert main(["audit", str(tmp_path), "--member", "x=T, 80", "--member", "y=T", "-j", "0"]) == 0
+    assert read_lines(capsys.readouterr()[0])[0]["dims"] == {"T": 4}
+
+
+def test_torch_files_without_mmap(tmp_path, monkeypatch):
+    torch = pytest.importorskip("torch")
+    torch.save({"x": torch.zeros(4, 80)}, str(tmp_path / "sample.pt"))
+    load = torch.load
+
+    def old_load(*args, **kwargs):  # torch < 2.1
+        if "mmap" in kwargs:
+            raise TypeError("load() got an unexpected keyword argument 'mmap'")
+        return load(*args, **kwargs)
+
+    monkeypatch.setattr(torch, "load", old_load)
+    assert files.read_torch_shapes(str(tmp_path / "sample.pt")) == {"x": (4, 80)}
+
+
+def test_module_entry_point(dataset):
+    output = subprocess.run(
+        [sys.executable, "-m", "tensorguard", "audit", str(dataset / "0.npy"), "-t", "T, 80", "-j", "0"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+    )
+    assert read_lines(output.stdout.decode())[0]["dims"] == {"T": 10}
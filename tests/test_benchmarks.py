@@ -0,0 +1,34 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+
+import tensorguard as tg
+from benchmarks import suite
+
+
+def test_every_benchmark_runs():
+    tg.reset()
+    tg.set_dims(B=32, T=128, D=512)
+    for name, fn in suite.benchmarks().items():
+        fn()  # raises if a template does not match its shape
+
+
+def test_regression_threshold(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    assert suite.main(["--filter", "guard_warm", "--number", "5", "--repeat", "1", "--output", str(baseline)]) == 0
+    results = json.loads(baseline.read_text())
+    assert results["metadata"]["tensorguard"] == tg.__version__
+    for result in results["results"].values():
+        result["us"] /= 100.0  # pretend that the baseline was 100 times faster
+    baseline.write_text(json.dumps(results))
+    assert suite.main(["--filter", "guard_warm", "--number", "5", "--repeat", "1", "--compare", str(baseline)]) == 1
+    assert "REGRESSION guard_warm/B, C, H, W" in capsys.readouterr()[0]
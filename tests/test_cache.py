@@ -0,0 +1,81 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import parser
+from tensorguard.cache import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    tg.reset()
+    tg.clear_cache()
+    tg.set_cache_size(parser.DEFAULT_CACHE_SIZE)
+    yield
+    tg.clear_cache()
+    tg.set_cache_size(parser.DEFAULT_CACHE_SIZE)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    info = cache.info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (3, 0, 1, 2)
+
+
+def test_lru_cache_disabled_and_unbounded():
+    disabled = LRUCache(maxsize=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+    assert disabled.info().misses == 1
+    unbounded = LRUCache(maxsize=None)
+    for i in range(1000):
+        unbounded.put(i, i)
+    assert len(unbounded) == 1000
+    with pytest.raises(ValueError):
+        unbounded.resize(-1)
+
+
+def test_global_api_reuses_parsed_templates():
+    x = np.ones([2, 3, 4])
+    tg.guard(x, "B, C, W")
+    tg.guard(x, "B, C, W")
+    assert tg.matches(x, "B, C, W")
+    tg.reshape(x, "B, C, W")
+    tg.evaluate("B, C, W")
+    info = tg.cache_info()
+    assert (info.misses, info.hits, info.currsize) == (1, 4, 1)
+    assert parser.get_spec("B, C, W") is parser.get_spec("B, C, W")
+
+
+def test_set_cache_size_evicts_and_disables():
+    for template in ["A", "A, B", "A, B, C"]:
+        tg.evaluate(template, A=1, B=2, C=3)
+    tg.set_cache_size(1)
+    info = tg.cache_info()
+    assert (info.evictions, info.currsize, info.maxsize) == (2, 1, 1)
+    tg.set_cache_size(0)
+    assert tg.evaluate("A, B", A=1, B=2) == [1, 2]
+    assert tg.cache_info().currsize == 0
+
+
+def test_clear_cache_resets_stats():
+    tg.guard([1, 2], "A, B")
+    tg.clear_cache()
+    assert tg.cache_info() == (0, 0, 0, parser.DEFAULT_CACHE_SIZE, 0)
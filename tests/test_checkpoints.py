@@ -0,0 +1,87 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import re
+import struct
+
+import pytest
+
+import tensorguard as tg
+from tensorguard import MultipleShapeError, checkpoints
+
+
+def write_safetensors(path, shapes):
+    """Write a safetensors file following the format spec, with zero-filled float32 tensors."""
+    header, offset = {"__metadata__": {"format": "pt"}}, 0
+    for name, shape in shapes.items():
+        size = 4
+        for d in shape:
+            size *= d
+        header[name] = {"dtype": "F32", "shape": list(shape), "data_offsets": [offset, offset + size]}
+        offset += size
+    raw = json.dumps(header).encode("utf8")
+    raw += b" " * (-len(raw) % 8)
+    with open(str(path), "wb") as f:
+        f.write(struct.pack("<Q", len(raw)) + raw + b"\0" * offset)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    path = tmp_path / "model.safetensors"
+    shapes = {"embed.weight": (100, 16)}
+    for i in range(3):
+        shapes["encoder.layer.{}.attn.weight".format(i)] = (16, 16)
+        shapes["encoder.layer.{}.mlp.weight".format(i)] = (64, 16)
+    write_safetensors(path, shapes)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+
+
+def test_read_shapes(checkpoint):
+    shapes = checkpoints.read_shapes(checkpoint)
+    assert len(shapes) == 7 and shapes["embed.weight"] == (100, 16)
+
+
+def test_guard_checkpoint(checkpoint):
+    result = tg.guard_checkpoint(checkpoint, {
+        "embed.weight": "V, D",
+        "encoder.layer.*.attn.weight": "D, D",
+        re.compile(r"encoder\.layer\.\d+\.mlp\.weight"): "4*D, D",
+    })
+    assert result.dims == {"V": 100, "D": 16}
+    assert len(result.shapes) == 7
+    assert tg.get_dims() == {}
+
+
+def test_first_matching_pattern_wins(checkpoint):
+    result = tg.guard_checkpoint(checkpoint, {"*.attn.weight": "D, D", "encoder.*": "4*D, D"})
+    assert len(result.shapes) == 6 and result.dims == {"D": 16}
+
+
+def test_mismatches_are_reported_together(checkpoint):
+    tg.set_dim("D", 16)
+    with pytest.raises(MultipleShapeError) as info:
+        tg.guard_checkpoint(checkpoint, {"encoder.*.mlp.weight": "2*D, D", "decoder.*": "D"})
+    labels = [label for label, _ in info.value.errors]
+    assert labels == ["encoder.layer.{}.mlp.weight".format(i) for i in range(3)] + ["decoder.*"]
+
+
+@pytest.mark.parametrize("content", [b"", b"\x10\0\0\0\0\0\0\0{}", b"\x02\0\0\0\0\0\0\0[]"])
+def test_invalid_files(tmp_path, content):
+    path = tmp_path / "broken.safetensors"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        checkpoints.read_header(str(path))
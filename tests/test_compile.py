@@ -0,0 +1,97 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import itertools
+
+import pytest
+
+from tensorguard import ShapeError
+from tensorguard import compiler
+from tensorguard import parser
+
+TEMPLATES = [
+    "B, H*W, C+1",
+    "A, B*2, A+C",
+    "A, B, A+C*2+1",
+    "A, B, ..., C",
+    "..., A-1, A/2",
+    "?, B?, *, 3",
+    "A*B, A, B",
+    "(A+1)*(B-1), A, B",
+    "_X, _X*2",
+    "A, A+B, B*C, C-D",
+    "A-B, A, A/B",
+    "H*W, W+1, H+W",
+    "A, A/B",
+    "A, 6-B, B/A",
+]
+
+
+def reference(spec, shape, dims):
+    """The generic, uncompiled inference and matching of a ShapeSpec."""
+    if not spec.rank_matches(shape):
+        return None
+    try:
+        known = spec.infer(shape, dims)
+    except ShapeError:
+        return None
+    if not spec.matches(shape, known):
+        return None
+    return {k: v for k, v in known.items() if k not in dims and not k.startswith("_")}
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_compiled_checker_agrees_with_reference(template):
+    spec = parser.parse(template)
+    checker = spec.compile()
+    for rank in range(1, len(spec) + 2):
+        for shape in itertools.product([0, 1, 2, 3, 4, 6], repeat=rank):
+            shape = list(shape)
+            for dims in ({}, {"A": 2}, {"B": 3, "C": 1}):
+                expected = reference(spec, shape, dims)
+                try:
+                    inferred = checker(shape, dims)
+                except ShapeError:
+                    assert expected is None, (template, shape, dims)
+                    continue
+                if expected is not None:
+                    assert inferred == expected, (template, shape, dims)
+                # the compiled checker infers sequentially, so it may accept
+                # shapes the reference rejects; its result must be consistent
+                assert spec.rank_matches(shape)
+                assert spec.matches(shape, dict(dims, **inferred)), (template, shape, dims)
+
+
+def test_compiled_checker_handles_dynamic_dims():
+    checker = parser.parse("?, B?, C").compile()
+    assert checker([None, None, 3], {}) == {"C": 3}
+    assert checker([None, 2, 3], {"B": 2}) == {"C": 3}
+    with pytest.raises(ShapeError):
+        checker([1, 2, 3], {})
+    with pytest.raises(ShapeError):
+        checker([None, 2, None], {})
+
+
+def test_compiled_checker_error_messages():
+    checker = parser.parse("B, C+1").compile()
+    with pytest.raises(ShapeError, match="wrong rank"):
+        checker([1, 2, 3], {})
+    with pytest.raises(ShapeError, match=r"Shape Mismatch[\s\S]*\[3, '\(C \+ 1\)'\] \(from template B, C\+1\)"):
+        checker([2, 5], {"B": 3})
+
+
+def test_compile_is_cached_and_shared():
+    spec = parser.parse("A, B")
+    assert spec.compile() is spec.compile()
+    source_a = compiler.generate_source(spec)
+    source_b = compiler.generate_source(parser.parse("A,B"))
+    assert source_a == source_b
+    assert compiler.structure(parser.parse("None").entries[0]) != compiler.structure(parser.parse("?").entries[0])
@@ -0,0 +1,109 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import MultipleShapeError, ShapeError
+
+
+@tg.guarded(x="B, T, D", mask="B, T", returns="B, D")
+def masked_sum(x, mask=None):
+    if mask is not None:
+        x = x * mask[..., None]
+    return x.sum(1)
+
+
+@tg.guarded(x="B, D", returns=("B, D", "B"))
+def split(x, *, scale=1):
+    return x * scale, x.sum(1)
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+    tg.set_level("full")
+    yield
+    tg.set_level("full")
+
+
+def test_guarded_checks_arguments_and_result():
+    x, mask = np.ones([4, 7, 16]), np.ones([4, 7])
+    assert masked_sum(x, mask).shape == (4, 16)
+    assert masked_sum(x, mask=mask).shape == (4, 16)
+    assert masked_sum(x).shape == (4, 16)
+    with pytest.raises(ShapeError, match="argument mask"):
+        masked_sum(x, np.ones([4, 6]))
+    assert tg.get_dims() == {}
+
+
+def test_guarded_reports_all_arguments():
+    with pytest.raises(MultipleShapeError) as error:
+        masked_sum(np.ones([4, 7]), np.ones([4, 7, 1]))
+    assert [label for label, _ in error.value.errors] == ["argument x", "argument mask"]
+    assert "masked_sum" in str(error.value)
+
+
+def test_guarded_checks_tuple_results():
+    y, total = split(np.ones([2, 3]), scale=2)
+    assert y.shape == (2, 3) and total.shape == (2,)
+
+    @tg.guarded(x="B, D", returns="B, D")
+    def transpose(x):
+        return x.T
+
+    with pytest.raises(ShapeError, match="return value"):
+        transpose(np.ones([2, 3]))
+
+
+def test_guarded_reads_the_current_dims():
+    @tg.guarded(x="B, D")
+    def h(x):
+        tg.guard(x, "B, D")
+        return x
+
+    tg.set_dim("D", 4)
+    h([2, 4])
+    with pytest.raises(ShapeError):
+        h([2, 5])
+    assert tg.get_dims() == {"D": 4}
+
+
+def test_guarded_leaves_missing_arguments_to_the_function():
+    @tg.guarded(x="B, D", y="B, D")
+    def add(x, y):
+        return x
+
+    with pytest.raises(TypeError, match="missing 1 required positional argument: 'y'"):
+        add([2, 3])
+
+
+def test_guarded_resolves_plan_once():
+    plan = masked_sum.guard_plan
+    assert [argument.name for argument in plan.arguments] == ["x", "mask"]
+    assert [argument.position for argument in plan.arguments] == [0, 1]
+    with pytest.raises(TypeError):
+        tg.guarded(y="B")(lambda x: x)
+
+
+def test_guarded_honours_guard_level():
+    @tg.guarded(x="B, T, D", mask="B, T")
+    def first(x, mask):
+        return x
+
+    x = np.ones([4, 7, 16])
+    with tg.using_level("off"):
+        first(x, np.ones([5]))
+    with tg.using_level("rank"):
+        first(x, np.ones([5, 5]))
+        with pytest.raises(ShapeError):
+            first(x, np.ones([5]))
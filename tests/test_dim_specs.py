@@ -0,0 +1,52 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import copy
+import pickle
+
+import pytest
+
+from tensorguard import dim_specs
+from tensorguard import parser
+
+
+def test_dim_specs_are_interned():
+    first = parser.parse("B, H*W, C+1")
+    second = parser.parse("C+1, B, (H * W)")
+    assert first.entries[0] is second.entries[1] is dim_specs.NamedDim("B")
+    assert first.entries[1] is second.entries[2]
+    assert first.entries[2].right is dim_specs.Number("1")
+    assert parser.parse("*").entries[0] is dim_specs.Wildcard()
+    assert dim_specs.EllipsisDim.make() is dim_specs.ellipsis_dim
+
+
+def test_dim_specs_are_hashable_and_distinct_by_type():
+    named, dynamic_named = dim_specs.NamedDim("A"), dim_specs.DynamicNamedDim("A")
+    assert named != dynamic_named
+    assert len({named, dynamic_named, dim_specs.NamedDim("A")}) == 2
+    assert {dim_specs.AddDims(named, dim_specs.Number(1)): 1}[parser.parse("A+1").entries[0]] == 1
+    assert dim_specs.AddDims(named, named) != dim_specs.MulDims(named, named)
+
+
+def test_dim_specs_are_immutable():
+    dim = dim_specs.NamedDim("A")
+    with pytest.raises(AttributeError):
+        dim.name = "B"
+    with pytest.raises(AttributeError):
+        dim.extra = 1
+    assert not hasattr(dim, "__dict__")
+
+
+def test_dim_specs_pickle_and_copy_to_the_interned_instance():
+    dim = parser.parse("(A+1)*B?").entries[0]
+    assert pickle.loads(pickle.dumps(dim)) is dim
+    assert copy.copy(dim) is dim and copy.deepcopy(dim) is dim
+    assert type(pickle.loads(pickle.dumps(dim)).right) is dim_specs.DynamicNamedDim
@@ -0,0 +1,70 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+import tensorguard as tg
+from tensorguard import ShapeError
+from tensorguard.dims import LayeredDims
+
+
+def test_reads_through_and_writes_locally():
+    parent = {"B": 4, "T": 10}
+    dims = LayeredDims(parent, {"D": 8})
+    assert dims["B"] == 4 and dims.get("D") == 8 and dims.get("X") is None
+    dims["B"] = 2
+    del dims["T"]
+    assert dims == {"B": 2, "D": 8}
+    assert "T" not in dims and len(dims) == 2
+    assert parent == {"B": 4, "T": 10}
+    assert dims.local() == {"B": 2, "D": 8}
+    with pytest.raises(KeyError):
+        del dims["T"]
+    parent["H"] = 3  # the parent is not copied
+    assert dims["H"] == 3
+
+
+def test_checkpoint_rollback_commit():
+    dims = LayeredDims({"B": 4})
+    first = dims.checkpoint()
+    dims["T"] = 10
+    second = dims.checkpoint()
+    dims["D"] = 8
+    del dims["B"]
+    assert dims == {"T": 10, "D": 8}
+    dims.rollback(second)
+    assert dims == {"B": 4, "T": 10}
+    dims.commit(first)
+    assert dims.local() == {"T": 10}
+    with pytest.raises(ValueError):
+        dims.rollback(first)
+
+
+def test_transaction():
+    dims = LayeredDims({"B": 4}).child()
+    with dims.transaction():
+        dims["T"] = 10
+    with pytest.raises(KeyError):
+        with dims.transaction():
+            dims["D"] = 8
+            del dims["B"]
+            raise KeyError("D")
+    assert dims == {"B": 4, "T": 10}
+
+
+def test_guard_with_layered_dims():
+    guardian = tg.TensorGuard(dims=LayeredDims({"B": 4}))
+    guardian.guard([4, 3], "B, C")
+    assert guardian.dims.local() == {"C": 3}
+    with pytest.raises(ShapeError, match="Shape Mismatch"):
+        guardian.guard([5, 3], "B, C")
+    assert guardian.evaluate("B*C, D", D=2) == [12, 2]
+    assert "D" not in guardian.dims
@@ -0,0 +1,88 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import files
+from tensorguard.exception import TemplateSyntaxError
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+
+
+@pytest.fixture
+def features(tmp_path):
+    np.save(str(tmp_path / "a.npy"), np.zeros([12, 80], dtype=np.float32))
+    np.save(str(tmp_path / "b.npy"), np.zeros([7, 40]))
+    (tmp_path / "sub").mkdir()
+    np.savez_compressed(str(tmp_path / "sub" / "c.npz"), x=np.zeros([5, 80]), y=np.zeros([5]))
+    (tmp_path / "sub" / "broken.npy").write_bytes(b"not an array")
+    return tmp_path
+
+
+@pytest.mark.parametrize("version", [(1, 0), (2, 0), (3, 0)])
+def test_read_npy_header(version):
+    stream = io.BytesIO()
+    array = np.zeros([3, 4, 5], dtype="<i2", order="F")
+    np.lib.format.write_array(stream, array, version=version)
+    header_end = stream.tell() - array.nbytes
+    stream.seek(0)
+    assert files.read_npy_header(stream) == ((3, 4, 5), "<i2", True)
+    assert stream.tell() == header_end  # the data is left unread
+
+
+def test_guard_file(features):
+    result = tg.guard_file(str(features / "a.npy"), "T, 80")
+    assert result.matches and result.dims == {"T": 12} and result.shapes == {"": (12, 80)}
+    result = tg.guard_file(str(features / "b.npy"), "T, 80")
+    assert not result.matches and result.errors[0][0] == ""
+    assert "T" not in tg.get_dims()  # the known dims are not modified
+
+
+def test_guard_npz_members_share_dims(features):
+    path = str(features / "sub" / "c.npz")
+    result = tg.guard_file(path, {"x": "T, 80", "y": "T"})
+    assert result.matches and result.dims == {"T": 5}
+    result = tg.guard_file(path, {"x": "T, 80", "y": "T+1"})
+    assert [key for key, _ in result.errors] == ["y"]
+    with pytest.raises(KeyError):
+        tg.guard_file(path, {"z": "T"})
+
+
+def test_guard_file_uses_known_dims(features):
+    tg.set_dim("T", 7)
+    assert not tg.guard_file(str(features / "a.npy"), "T, 80").matches
+
+
+def test_guard_dir(features):
+    results = list(tg.guard_dir(str(features), {"x": "T, 80"}, pattern="*.npz"))
+    assert [r.matches for r in results] == [True]
+    results = {r.path[len(str(features)) + 1:]: r for r in tg.guard_dir(str(features), "T, _")}
+    assert sorted(results) == ["a.npy", "b.npy", "sub/broken.npy", "sub/c.npz"]
+    assert not results["sub/broken.npy"].matches
+    assert isinstance(results["sub/broken.npy"].errors[0][1], ValueError)
+    assert not results["sub/c.npz"].matches  # y has rank 1
+    assert [r.path for r in tg.guard_dir(str(features), "T, 80", recursive=False)] == [
+        str(features / "a.npy"), str(features / "b.npy")
+    ]
+
+
+def test_guard_dir_raises_on_bad_template(features):
+    with pytest.raises(TemplateSyntaxError):
+        tg.guard_dir(str(features), "A,,B")
+    with pytest.raises(TemplateSyntaxError):
+        tg.guard_dir(str(features), {"x": "T, 80", "y": "T,,"}, pattern="*.npz")
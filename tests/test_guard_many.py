@@ -0,0 +1,66 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+from tensorguard import MultipleShapeError, ShapeError, TensorGuard
+
+
+def test_guard_many_infers_shared_dims():
+    tg = TensorGuard()
+    x, mask = np.ones([4, 7, 16]), np.ones([4, 7])
+    assert tg.guard_many([(x, "B, T, D"), (mask, "B, T")]) == [x, mask]
+    assert tg.dims == {"B": 4, "T": 7, "D": 16}
+
+
+def test_guard_many_solves_constraints_together():
+    tg = TensorGuard()
+    # H is only known from the second tensor, W can be inferred once H is known
+    tg.guard_many([(np.ones([12]), "H*W"), (np.ones([3]), "H")])
+    assert tg.dims == {"H": 3, "W": 4}
+    with pytest.raises(MultipleShapeError):
+        TensorGuard().guard_many([(np.ones([12]), "H*W"), (np.ones([5]), "H"), (np.ones([2]), "W")])
+
+
+def test_guard_many_reports_every_mismatch_and_is_atomic():
+    tg = TensorGuard(dims={"D": 16})
+    pairs = [(np.ones([4, 8]), "B, D"), (np.ones([4, 16]), "B, D"), (np.ones([5]), "B"), (np.ones([4]), "B, 1")]
+    with pytest.raises(ShapeError) as error:
+        tg.guard_many(pairs)
+    assert isinstance(error.value, MultipleShapeError)
+    assert [index for index, _ in error.value.errors] == [0, 2, 3]
+    assert "wrong rank" in str(error.value)
+    assert tg.dims == {"D": 16}
+
+
+def test_guard_many_rank_level():
+    tg = TensorGuard(guard_level="rank")
+    tg.guard_many([(np.ones([4, 8]), "B, B")])
+    assert tg.dims == {}
+    with pytest.raises(MultipleShapeError):
+        tg.guard_many([(np.ones([4, 8]), "B"), (np.ones([4]), "B, C")])
+
+
+def test_guard_all_global():
+    import tensorguard as tg
+    tg.reset()
+    tg.guard_all([(np.ones([2, 3]), "A, B"), ([3, 6], "B, A*B")])
+    assert tg.get_dims() == {"A": 2, "B": 3}
+
+
+def test_multiple_shape_error_pickles():
+    import pickle
+    tg = TensorGuard()
+    with pytest.raises(MultipleShapeError) as info:
+        tg.guard_many([(np.ones([4, 8]), "B, 3")])
+    error = pickle.loads(pickle.dumps(info.value))
+    assert str(error) == str(info.value)
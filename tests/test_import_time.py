@@ -0,0 +1,53 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import subprocess
+import sys
+
+# cold import budget in milliseconds, can be tightened/relaxed per machine
+IMPORT_BUDGET_MS = float(os.environ.get("TENSORGUARD_IMPORT_BUDGET_MS", "250"))
+
+HEAVY_MODULES = ["torch", "tensorflow", "numpy", "tensorguard.shape_spec_parser"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import tensorguard
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "modules": sorted(sys.modules)}))
+"""
+
+
+def cold_import():
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT])
+    return json.loads(output.decode())
+
+
+def test_import_loads_no_heavy_module():
+    modules = cold_import()["modules"]
+    for name in HEAVY_MODULES:
+        assert name not in modules, "importing tensorguard loaded {}".format(name)
+
+
+def test_import_time_within_budget():
+    best = min(cold_import()["ms"] for _ in range(3))
+    assert best < IMPORT_BUDGET_MS, "import tensorguard took {:.1f}ms (budget {}ms)".format(best, IMPORT_BUDGET_MS)
+
+
+def test_guard_does_not_load_lark_parser():
+    code = (
+        "import sys, tensorguard as tg\n"
+        "tg.guard([1, 2], 'A, B')\n"
+        "assert 'tensorguard.shape_spec_parser' not in sys.modules\n"
+    )
+    subprocess.check_call([sys.executable, "-c", code])
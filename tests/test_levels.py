@@ -0,0 +1,137 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import ShapeError, TensorGuard, tools
+
+
+@pytest.fixture(autouse=True)
+def full_level():
+    tg.reset()
+    tg.set_level("full")
+    yield
+    tg.set_level("full")
+
+
+class ShapeNotRead:
+    @property
+    def shape(self):
+        raise AssertionError("shape must not be read in off mode")
+
+
+def test_off_level_skips_everything(monkeypatch):
+    monkeypatch.setattr(tools.parser, "get_spec", None)
+    tg.set_level("off")
+    x = ShapeNotRead()
+    assert tg.guard(x, "A, B") is x
+    assert tg.matches(x, "A, B")
+    assert tg.get_dims() == {}
+
+
+def test_rank_level_checks_only_rank():
+    tg.set_level(tg.GuardLevel.RANK)
+    x = np.ones([2, 3])
+    tg.guard(x, "3, 2")
+    assert tg.get_dims() == {}
+    assert tg.matches(x, "A, A")
+    assert not tg.matches(x, "A")
+    with pytest.raises(ShapeError):
+        tg.guard(x, "A, B, C")
+
+
+def test_using_level_restores_previous_level():
+    x = np.ones([2, 3])
+    with tg.using_level("off"):
+        assert tg.get_level() is tg.GuardLevel.OFF
+        tg.guard(x, "3, 2")
+    assert tg.get_level() is tg.GuardLevel.FULL
+    with pytest.raises(ShapeError):
+        tg.guard(x, "3, 2")
+
+
+def test_using_level_is_local_to_threads():
+    entered, checked = threading.Barrier(2, timeout=5), threading.Barrier(2, timeout=5)
+    levels = []
+
+    def worker():
+        with tg.using_level("off"):
+            entered.wait()
+            levels.append(tg.get_level())
+            checked.wait()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    entered.wait()
+    with pytest.raises(ShapeError):
+        tg.guard(np.ones([2, 3]), "3, 2")
+    checked.wait()
+    thread.join()
+    assert levels == [tg.GuardLevel.OFF]
+    assert tg.get_level() is tg.GuardLevel.FULL
+
+
+def test_using_level_is_local_to_asyncio_tasks():
+    async def check(level):
+        with tg.using_level(level):
+            await asyncio.sleep(0)
+            return tg.matches(np.ones([2, 3]), "3, 2")
+
+    async def main():
+        return await asyncio.gather(check("off"), check("full"), check("off"))
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(main()) == [True, False, True]
+    finally:
+        loop.close()
+
+
+def test_set_level_inside_using_level():
+    with tg.using_level("rank"):
+        tg.set_level("off")
+        assert tg.get_level() is tg.GuardLevel.RANK
+    assert tg.get_level() is tg.GuardLevel.OFF
+
+
+def test_per_instance_level_overrides_global():
+    x = np.ones([2, 3])
+    guardian = TensorGuard(guard_level="off")
+    guardian.guard(x, "3, 2")
+    with tg.using_level("off"):
+        strict = TensorGuard(guard_level="full")
+        with pytest.raises(ShapeError):
+            strict.guard(x, "3, 2")
+        follower = TensorGuard()
+        follower.guard(x, "3, 2")
+    guardian.set_level(None)
+    with pytest.raises(ShapeError):
+        guardian.guard(x, "3, 2")
+
+
+def test_invalid_level():
+    with pytest.raises(ValueError):
+        tg.set_level("fast")
+
+
+def test_level_from_environment_variable():
+    env = dict(os.environ, TENSORGUARD_LEVEL="rank")
+    code = "import tensorguard as tg; print(tg.get_level().name)"
+    output = subprocess.check_output([sys.executable, "-c", code], env=env)
+    assert output.decode().strip() == "RANK"
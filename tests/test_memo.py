@@ -0,0 +1,72 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+import tensorguard as tg
+from tensorguard import ShapeError
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.set_memo_size(0)
+    tg.reset()
+    yield
+    tg.set_memo_size(0)
+    tg.reset()
+
+
+def test_memo_is_opt_in():
+    guardian = tg.TensorGuard()
+    guardian.guard([2, 3], "B, C")
+    assert guardian.memo_info() is None
+
+
+def test_memo_hits_and_stats():
+    guardian = tg.TensorGuard(memo_size=2)
+    for _ in range(3):
+        guardian.guard([2, 3], "B, C*3")
+    assert guardian.dims == {"B": 2, "C": 1}
+    # the first call infers B and C, the second has them known: two misses
+    assert guardian.memo_info()[:2] == (1, 2)
+    guardian.guard([4], "D")
+    guardian.guard([5], "E")
+    assert guardian.memo_info()[2:] == (2, 2, 2)
+    assert tg.TensorGuard().memo_info() is None  # stats are per instance
+
+
+def test_memo_invalidated_by_relevant_dims():
+    guardian = tg.TensorGuard(memo_size=16)
+    guardian.guard([2, 3], "B, C")
+    guardian.guard([2, 3], "B, C")
+    guardian.dims["B"] = 4
+    with pytest.raises(ShapeError):
+        guardian.guard([2, 3], "B, C")
+    del guardian.dims["B"]
+    guardian.guard([2, 3], "B, C")
+    assert guardian.dims["B"] == 2
+    guardian.dims["X"] = 1  # not mentioned by the template: still a hit
+    hits = guardian.memo_info().hits
+    guardian.guard([2, 3], "B, C")
+    assert guardian.memo_info().hits == hits + 1
+
+
+def test_global_memo_survives_reset_and_scopes():
+    tg.set_memo_size(8)
+    tg.guard([2, 3], "B, C")
+    tg.reset()
+    tg.guard([2, 3], "B, C")
+    with tg.scope(inherit=False):
+        tg.guard([2, 3], "B, C")
+        tg.set_dim("B", 5)
+        with pytest.raises(ShapeError):
+            tg.guard([2, 3], "B, C")
+    assert tg.memo_info().hits == 2
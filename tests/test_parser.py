@@ -0,0 +1,78 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import itertools
+import random
+
+import pytest
+
+from tensorguard import dim_specs
+from tensorguard import lark_parser
+from tensorguard import parser
+from tensorguard import shape_spec_parser
+from tensorguard.exception import TemplateSyntaxError
+
+
+def parse_result(parse, template):
+    try:
+        return repr(parse(template))
+    except (TemplateSyntaxError, shape_spec_parser.UnexpectedInput) as e:
+        return e.pos_in_stream, e.line, e.column
+
+
+def test_parse_builds_dim_specs():
+    spec = parser.parse("B, A+C*2-1, (H+1)/2, x?, ?, *, ..., 07")
+    assert spec.entries == [
+        dim_specs.NamedDim("B"),
+        dim_specs.SubDims(
+            dim_specs.AddDims(dim_specs.NamedDim("A"), dim_specs.MulDims(dim_specs.NamedDim("C"), dim_specs.Number(2))),
+            dim_specs.Number(1),
+        ),
+        dim_specs.DivDims(dim_specs.AddDims(dim_specs.NamedDim("H"), dim_specs.Number(1)), dim_specs.Number(2)),
+        dim_specs.DynamicNamedDim("x"),
+        dim_specs.Dynamic(),
+        dim_specs.Wildcard(),
+        dim_specs.ellipsis_dim,
+        dim_specs.Number(7),
+    ]
+    assert type(spec.entries[3]) is dim_specs.DynamicNamedDim
+    assert spec.template == "B, A+C*2-1, (H+1)/2, x?, ?, *, ..., 07"
+
+
+@pytest.mark.parametrize(
+    "template, position",
+    [
+        ("", (0, 1, 1)),
+        ("A,", (1, 1, 2)),
+        ("A,,B", (2, 1, 3)),
+        ("A B", (2, 1, 3)),
+        ("A)", (1, 1, 2)),
+        ("1.5", (1, 1, 2)),
+        ("3?", (1, 1, 2)),
+        ("((A)", (3, 1, 4)),
+        ("A\n,$", (3, 2, 2)),
+        ("A,\n  B)", (6, 2, 4)),
+    ],
+)
+def test_syntax_error_positions(template, position):
+    with pytest.raises(TemplateSyntaxError) as error:
+        parser.parse(template)
+    assert (error.value.pos_in_stream, error.value.line, error.value.column) == position
+    assert isinstance(error.value, ValueError)
+
+
+def test_same_language_and_error_positions_as_lark():
+    templates = ["".join(t) for n in range(5) for t in itertools.product("A1,+*()?. ", repeat=n)]
+    rng = random.Random(0)
+    alphabet = list("AB1_,+-*/()? .\n$") + ["...", "ab", "12"]
+    templates += ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(5000)]
+    for template in templates:
+        assert parse_result(parser.parse, template) == parse_result(lark_parser.parse, template), repr(template)
@@ -0,0 +1,69 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import ShapeError, profiling
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+    tg.clear_cache()
+    yield
+    tg.set_profiling(False)
+
+
+def test_profile_per_template_and_site():
+    with tg.profile() as profiler:
+        for _ in range(10):
+            tg.guard(np.zeros([4, 8]), "B, D")
+        tg.matches([4, 9], "B, D")
+        with pytest.raises(ShapeError):
+            tg.guard([5, 8], "B, D")
+        tg.reshape(np.zeros([4, 8]), "B*D")
+    stats = profiler.stats()
+    guard_stats = stats.templates["B, D"]
+    assert (guard_stats.calls, guard_stats.failures, guard_stats.cache_misses) == (12, 2, 1)
+    assert guard_stats.error > 0 and guard_stats.total >= guard_stats.check
+    assert 0 < guard_stats.p50 <= guard_stats.p99
+    assert stats.templates["B*D"].calls == 1
+    sites = {location.rsplit(":", 1)[0] for location in stats.sites}
+    assert sites == {__file__}
+    assert max(s.calls for s in stats.sites.values()) == 10
+    assert tg.stats().templates.keys() == stats.templates.keys()  # the last profiler, after the block
+
+
+def test_disabled_by_default():
+    assert profiling.profiler is None
+    with tg.profile() as profiler:
+        pass
+    tg.guard([1, 2], "A, B")
+    assert profiler.stats().templates == {}
+
+
+def test_set_profiling():
+    tg.set_profiling(True)
+    tg.guard([1, 2], "A, B")
+    tg.set_profiling(False)
+    tg.guard([1, 2], "A, B")
+    assert tg.stats().templates["A, B"].calls == 1
+
+
+def test_percentiles_are_bounded():
+    profiler = profiling.Profiler(max_samples=16)
+    for i in range(1000):
+        profiler.record("A", False, 0.0, float(i), False)
+    entry = profiler.templates["A"]
+    assert len(entry.samples) == 16
+    assert entry.stats().p99 > entry.stats().p50 > 0
@@ -0,0 +1,108 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+import tensorguard as tg
+from tensorguard import TemplateSyntaxError, parser, registry
+
+TEMPLATES = ["B, C, H, W", "B, H*W, C+1", "B, ..., (H+1)/2, W?", "A, B", "X, Y"]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    tg.clear_cache()
+    yield
+    tg.clear_cache()
+
+
+def test_precompile_fills_the_cache():
+    assert tg.precompile(TEMPLATES) == 5
+    assert tg.cache_info().currsize == 5
+    with pytest.raises(TemplateSyntaxError):
+        tg.precompile(["B, C", "B,, C"])
+
+
+def test_specs_pickle_without_checker():
+    spec = parser.get_spec("B, H*W, C+1")
+    spec.compile()
+    copy = pickle.loads(pickle.dumps(spec))
+    assert copy._checker is None and copy.entries == spec.entries
+    assert copy.compile()([2, 12, 4], {"H": 3}) == {"B": 2, "W": 4, "C": 3}
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "specs.bin")
+    assert tg.precompile(TEMPLATES[:3], path=path) == 3
+    assert tg.precompile(TEMPLATES[3:], path=path) == 2  # merged with the file
+    tg.clear_cache()
+    assert tg.load_precompiled(path) == 5
+    assert tg.cache_info().currsize == 5
+    tg.guard([2, 3, 8, 8], "B, C, H, W")
+    assert tg.cache_info().misses == 0
+
+
+def test_stale_or_broken_files_are_ignored(tmp_path, monkeypatch):
+    path = str(tmp_path / "specs.bin")
+    assert tg.load_precompiled(path) == 0  # missing
+    tg.precompile(TEMPLATES, path=path)
+    monkeypatch.setattr(registry, "_fingerprint", b"another version")
+    assert tg.load_precompiled(path) == 0
+    monkeypatch.undo()
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-10])
+    assert tg.load_precompiled(path) == 0
+
+
+def test_loaded_by_new_processes_without_parsing(tmp_path):
+    path = str(tmp_path / "specs.bin")
+    tg.precompile(TEMPLATES, path=path)
+    code = (
+        "import tensorguard as tg\n"
+        "from tensorguard import compiler\n"
+        "compiler.generate_source = None  # neither code generation\n"
+        "tg.parser.parse = None  # nor parsing may happen\n"
+        "tg.set_dim('H', 3)\n"
+        "tg.guard([2, 12, 4], 'B, H*W, C+1')\n"
+        "assert tg.cache_info().currsize == 5, tg.cache_info()\n"
+    )
+    env = dict(os.environ, TENSORGUARD_SPEC_CACHE=path)
+    subprocess.check_call([sys.executable, "-c", code], env=env)
+
+
+def test_fingerprint_without_sources(tmp_path, monkeypatch):
+    # e.g. a wheel without the grammar file, or an install with compiled modules only
+    from tensorguard import dim_specs
+
+    monkeypatch.setattr(dim_specs, "__file__", str(tmp_path / "missing.py"))
+    monkeypatch.setattr(registry, "_fingerprint", None)
+    path = str(tmp_path / "specs.bin")
+    assert tg.precompile(TEMPLATES, path=path) == 5
+    tg.clear_cache()
+    assert tg.load_precompiled(path) == 5
+
+
+def test_broken_spec_file_does_not_break_the_import(tmp_path):
+    path = tmp_path / "specs.bin"
+    path.write_bytes(registry.MAGIC + registry.fingerprint() + b"\n" + pickle.dumps([1]))
+    env = dict(os.environ, TENSORGUARD_SPEC_CACHE=str(path))
+    result = subprocess.run(
+        [sys.executable, "-c", "import tensorguard"], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    assert result.returncode == 0, result.stderr
+    assert b"Could not load the spec file" in result.stderr
@@ -0,0 +1,77 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+import tensorguard as tg
+from tensorguard import ShapeError
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.set_sampling(None)
+    tg.reset()
+    yield
+    tg.set_sampling(None)
+    tg.reset()
+
+
+def test_first_then_every_per_call_site():
+    guardian = tg.TensorGuard(sampling=tg.FirstThenEvery(first=2, every=3))
+    for _ in range(11):
+        guardian.guard([2, 3], "B, C")
+    for _ in range(2):
+        guardian.guard([2, 3], "B, C")  # another call site
+    stats = list(guardian.sampling_stats().values())
+    assert stats == [(5, 6, 0), (2, 0, 0)]
+
+
+def test_skipped_calls_are_not_checked():
+    tg.set_sampling(tg.FirstThenEvery(first=1, every=0))
+    for batch in (2, 3, 4):
+        tg.guard([batch], "B")  # only the first call is checked
+    assert tg.get_dims() == {"B": 2}
+    (stats,) = tg.sampling_stats().values()
+    assert stats == (1, 2, 0)
+
+
+def test_until_stable_restarts_after_failure():
+    guardian = tg.TensorGuard(sampling=tg.UntilStable(stable=2))
+
+    def step(shape):
+        try:
+            guardian.guard(shape, "2, 3")
+        except ShapeError:
+            pass
+
+    for shape in ([2, 3], [2, 4], [2, 3], [2, 3], [9, 9], [9, 9]):
+        step(shape)
+    (stats,) = guardian.sampling_stats().values()
+    assert stats == (4, 2, 1)
+
+
+def test_probability():
+    guardian = tg.TensorGuard(sampling=tg.Probability(0.25, seed=0))
+    for _ in range(1000):
+        guardian.guard([2], "B")
+    (stats,) = guardian.sampling_stats().values()
+    assert 150 < stats.checked < 350
+    with pytest.raises(ValueError):
+        tg.Probability(2)
+
+
+def test_sampling_is_shared_by_scopes():
+    tg.set_sampling(tg.FirstThenEvery(first=1, every=0))
+    for batch in (2, 3):
+        with tg.scope(inherit=False):
+            tg.guard([batch], "B")
+    (stats,) = tg.sampling_stats().values()
+    assert stats == (1, 1, 0)
@@ -0,0 +1,91 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import textwrap
+
+import pytest
+
+import tensorguard as tg
+from tensorguard import registry, scan
+from tensorguard.__main__ import main
+
+SOURCE = textwrap.dedent('''
+    import tensorguard as tg
+    from tensorguard import guard, guarded
+
+    guard(x, "B, T, D")
+    tg.matches(x, template="B, T")
+    tg.reshape(x, "B, T*D")
+    dims = tg.get_dims("B,, D")
+    tg.evaluate("B, T+1", T=3)
+    tg.TensorGuard().guard(x, "N, 3")
+    tg.guard_tree(batch, {"image": "B, 3, H, W", "mask": ["B, H, W"]})
+    tg.guard_all([(x, "B, T"), (y, TEMPLATE)])
+    guard(x, TEMPLATE)      # not a literal
+    torch.reshape(x, (2, 3))
+
+    @guarded(x="B, 3", returns="B, 4")
+    def f(x):
+        pass
+''')
+
+
+@pytest.fixture
+def sources(tmp_path):
+    src = tmp_path / "src"
+    (src / "models").mkdir(parents=True)
+    (src / ".venv").mkdir()
+    (src / "models" / "net.py").write_text(SOURCE)
+    (src / "ok.py").write_text("import tensorguard as tg\ntg.guard(x, 'B, T, D')\n")
+    (src / "broken.py").write_text("def f(:\n")
+    (src / ".venv" / "lib.py").write_text("guard(x, 'B,,')\n")
+    return src
+
+
+def test_find_templates():
+    found = [(template.line, template.function, template.template) for template in scan.find_templates(SOURCE)]
+    assert found == [
+        (5, "guard", "B, T, D"),
+        (6, "matches", "B, T"),
+        (7, "reshape", "B, T*D"),
+        (8, "get_dims", "B,, D"),
+        (9, "evaluate", "B, T+1"),
+        (10, "guard", "N, 3"),
+        (11, "guard_tree", "B, 3, H, W"),
+        (11, "guard_tree", "B, H, W"),
+        (12, "guard_all", "B, T"),
+        (16, "guarded", "B, 3"),
+        (16, "guarded", "B, 4"),
+    ]
+
+
+@pytest.mark.parametrize("jobs", [0, 2])
+def test_scan_reports_malformed_templates(sources, jobs, capsys):
+    assert main(["scan", str(sources), "-j", str(jobs)]) == 1
+    out, err = capsys.readouterr()
+    lines = out.splitlines()
+    assert len(lines) == 1
+    assert lines[0].startswith("{}:8:20: Unexpected token ','".format(sources / "models" / "net.py"))
+    assert "broken.py: skipped, SyntaxError" in err
+    assert "files: 2, templates: 12 (10 unique), malformed: 1" in err
+
+
+def test_scan_precompiles_valid_templates(sources, tmp_path, capsys):
+    (sources / "models" / "net.py").write_text(SOURCE.replace("B,, D", "B, D"))
+    path = str(tmp_path / "specs.bin")
+    assert main(["scan", str(sources), "-j", "0", "--output", path, "--list"]) == 0
+    out, err = capsys.readouterr()
+    assert "net.py:5:10: guard 'B, T, D'" in out
+    assert "precompiled 10 templates" in err
+    templates = {template for template, _, _ in registry.read(path)}
+    assert templates == {t.template for t in scan.find_templates(SOURCE.replace("B,, D", "B, D"))}
+    tg.clear_cache()
+    assert tg.load_precompiled(path) == 10
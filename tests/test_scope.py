@@ -0,0 +1,145 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import tensorguard as tg
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+    yield
+    tg.reset()
+
+
+def test_scope_inherits_and_discards_dims():
+    tg.set_dim("D", 8)
+    with tg.scope() as guardian:
+        assert tg.current_guard() is guardian
+        tg.guard(np.ones([4, 8]), "B, D")
+        assert tg.get_dims() == {"D": 8, "B": 4}
+        tg.set_dim("D", 16)
+    assert tg.get_dims() == {"D": 8}
+
+
+def test_fresh_scope():
+    tg.set_dim("B", 4)
+    with tg.scope(inherit=False, dims={"T": 3}):
+        assert tg.get_dims() == {"T": 3}
+        tg.guard(np.ones([2, 3]), "B, T")
+        tg.reset()
+        assert tg.get_dims() == {}
+    assert tg.get_dims() == {"B": 4}
+
+
+def test_scope_decorator():
+    @tg.scope(inherit=False)
+    def batch_size(x):
+        tg.guard(x, "B, *")
+        return tg.get_dim("B")
+
+    assert batch_size(np.ones([4, 2])) == 4
+    assert batch_size(np.ones([6, 2])) == 6
+    assert not tg.has_dim("B")
+
+
+def test_guarded_body_runs_in_call_scope():
+    @tg.guarded(x="B, D")
+    def f(x):
+        return tg.get_dims()
+
+    assert f(np.ones([4, 2])) == {"B": 4, "D": 2}
+    assert tg.get_dims() == {}
+
+
+def test_threads_do_not_share_scopes():
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def worker(batch):
+        with tg.scope(inherit=False):
+            tg.guard(np.ones([batch, 3]), "B, 3")
+            barrier.wait()
+            results[batch] = tg.get_dim("B")
+
+    threads = [threading.Thread(target=worker, args=(b,)) for b in range(1, 9)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {b: b for b in range(1, 9)}
+    assert tg.get_dims() == {}
+
+
+def test_asyncio_tasks_do_not_share_scopes():
+    async def request(batch):
+        with tg.scope(inherit=False):
+            tg.guard(np.ones([batch, 3]), "B, 3")
+            await asyncio.sleep(0)
+            return tg.get_dim("B")
+
+    async def main():
+        return await asyncio.gather(*(request(b) for b in range(1, 9)))
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(main()) == list(range(1, 9))
+    finally:
+        loop.close()
+
+
+def test_scope_decorator_on_coroutines():
+    @tg.scope(inherit=False)
+    async def handle(batch):
+        tg.guard([batch], "B")
+        await asyncio.sleep(0)
+        return tg.get_dim("B")
+
+    async def main():
+        return await asyncio.gather(handle(1), handle(2))
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(main()) == [1, 2]
+    finally:
+        loop.close()
+    assert tg.get_dims() == {}
+
+
+def test_scope_instance_shared_by_threads():
+    shared = tg.scope(inherit=False)
+    entered, exited = threading.Barrier(2, timeout=5), threading.Barrier(2, timeout=5)
+    results = {}
+
+    def worker(batch):
+        with shared:
+            tg.guard([batch], "B")
+            entered.wait()
+            results[batch] = tg.get_dim("B")
+            if batch == 2:
+                exited.wait()  # exit after the thread which entered first
+        if batch == 1:
+            exited.wait()
+        results[-batch] = tg.has_dim("B")
+
+    threads = [threading.Thread(target=worker, args=(b,)) for b in (1, 2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    assert results == {1: 1, 2: 2, -1: False, -2: False}
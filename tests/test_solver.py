@@ -0,0 +1,92 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import ShapeError
+from tensorguard import compiler
+from tensorguard import parser
+from tensorguard.vectorized import match_shapes
+
+
+def test_plan_orders_expressions_by_dependency():
+    spec = parser.parse("D/E, C-D, B*C, A+B, A")
+    assert [repr(dim) for _, dim in spec.plan.order] == ["(A + B)", "(B * C)", "(C - D)", "(D / E)"]
+    assert spec.plan.underdetermined == []
+    assert spec.free_names == frozenset()
+    shape = [3, 1, 12, 5, 2]
+    expected = {"A": 2, "B": 3, "C": 4, "D": 3, "E": 1}
+    assert spec.compile()(shape, {}) == expected
+    assert dict(spec.infer(shape)) == expected
+
+
+def test_generated_checker_has_no_loop():
+    source = compiler.generate_source(parser.parse("A, A+B, B*C, C-D"))
+    assert "while" not in source and "for" not in source
+
+
+def test_free_names():
+    spec = parser.parse("H*W, C")
+    assert spec.free_names == frozenset({"H", "W"})
+    assert len(spec.plan.underdetermined) == 1
+    assert spec.compile()([12, 3], {"H": 4}) == {"C": 3, "W": 3}
+    assert spec.compile()([12, 3], {}) == {"C": 3}
+    assert parser.parse("A?, B").free_names == frozenset({"A"})
+
+
+@pytest.mark.parametrize("template, shape, expected", [
+    ("A, A-B", [10, 3], {"A": 10, "B": 7}),
+    ("A, A/B", [8, 2], {"A": 8, "B": 4}),
+])
+def test_right_side_inverse(template, shape, expected):
+    assert parser.parse(template).compile()(shape, {}) == expected
+    assert dict(parser.parse(template).infer(shape)) == expected
+    result = tg.match_shapes([shape], template)
+    assert result.matches.tolist() == [True]
+    assert {k: v.tolist() for k, v in result.dims.items()} == {k: [v] for k, v in expected.items()}
+
+
+@pytest.mark.parametrize("template, shape, dims", [
+    ("A, A/B", [3, 7], {}),      # 3 // B is at most 3
+    ("C/B", [6], {"C": 5}),
+    ("4 - X", [5], {}),          # X would be negative
+    ("A, A-X", [2, 5], {}),
+    ("B/A, 4", [3, 4], {"A": 0, "B": 5}),
+    ("4+B?, ..., A", [1, 2, 6, 3], {}),  # B would be -3
+])
+def test_inverse_without_solution_raises(template, shape, dims):
+    spec = parser.parse(template)
+    with pytest.raises(ShapeError):
+        spec.compile()(shape, dims)
+    with pytest.raises(ShapeError):
+        assert spec.matches(shape, spec.infer(shape, dims))
+    assert match_shapes([shape], template, dims=dims).matches.tolist() == [False]
+
+
+def test_zero_divisor_is_a_mismatch():
+    tg.reset()
+    tg.set_dims(A=0, B=5)
+    with pytest.raises(ShapeError, match=r"Expected shape: \['\(B / A\)', 4\]"):
+        tg.guard([3, 9], "B/A, 4")
+    tg.reset()
+    tg.set_dim("C", 5)
+    with pytest.raises(ShapeError):
+        tg.guard([6], "C/B")
+    assert tg.get_dims() == {"C": 5}
+    tg.reset()
+
+
+def test_conflicting_constraints_raise():
+    with pytest.raises(ShapeError):
+        parser.parse("A, A+B, B*2").compile()([2, 5, 4], {})
+    assert not tg.match_shapes(np.array([[2, 5, 4]]), "A, A+B, B*2").matches[0]
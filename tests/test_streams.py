@@ -0,0 +1,102 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pickle
+
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import MultipleShapeError
+
+TREE = {"x": "B, T, D", "y": "B"}
+
+
+def batches(shapes):
+    for b, t, d in shapes:
+        yield {"x": np.zeros([b, t, d]), "y": np.zeros([b])}
+
+
+SHAPES = [(4, 10, 8), (4, 12, 8), (2, 7, 6), (3, 5, 8)]
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+    tg.set_level("full")
+    yield
+    tg.set_level("full")
+
+
+def test_every_batch_has_its_own_dims():
+    assert len(list(tg.guard_stream(batches(SHAPES), TREE))) == 4
+    assert tg.get_dims() == {}
+
+
+def test_persistent_dims():
+    stream = tg.guard_stream(batches(SHAPES), TREE, persistent=["D"])
+    with pytest.raises(MultipleShapeError):
+        list(stream)
+    assert stream.dims == {"D": 8}
+
+
+def test_skip_and_collect():
+    stream = tg.guard_stream(batches(SHAPES), TREE, on_error="skip", persistent=["D"])
+    assert [batch["x"].shape[1] for batch in stream] == [10, 12, 5]
+    assert stream.errors == []
+    stream = tg.guard_stream(batches(SHAPES), TREE, on_error="collect", persistent=["D"])
+    assert len(list(stream)) == 3
+    assert [i for i, _ in stream.errors] == [2]
+    with pytest.raises(ValueError):
+        tg.guard_stream([], TREE, on_error="ignore")
+
+
+def test_checks_are_lazy():
+    stream = iter(tg.guard_stream(iter([[4, 10, 8], [4, 10]]), "B, T, D"))
+    assert next(stream) == [4, 10, 8]
+    with pytest.raises(MultipleShapeError):
+        next(stream)
+
+
+def test_scope_dims_are_used():
+    tg.set_dim("B", 4)
+    stream = tg.guard_stream(batches(SHAPES), TREE, on_error="collect")
+    assert len(list(stream)) == 2
+
+
+def test_dataloader_workers_check_batches():
+    torch = pytest.importorskip("torch")
+
+    class Dataset(torch.utils.data.Dataset):
+        def __len__(self):
+            return 8
+
+        def __getitem__(self, i):
+            return {"x": torch.zeros(5 if i < 6 else 6, 3), "y": torch.tensor(i)}
+
+    collate = tg.GuardedCollate({"x": "B, 5, 3", "y": "B"})
+    collate = pickle.loads(pickle.dumps(collate))
+    loader = torch.utils.data.DataLoader(
+        Dataset(), batch_size=2, num_workers=2, collate_fn=collate, worker_init_fn=tg.WorkerInit()
+    )
+    iterator = iter(loader)
+    for _ in range(3):
+        assert next(iterator)["x"].shape == (2, 5, 3)
+    with pytest.raises(MultipleShapeError):  # raised in a worker, re-raised here
+        next(iterator)
+
+
+def test_worker_init_applies_level():
+    tg.set_level("rank")
+    init = pickle.loads(pickle.dumps(tg.WorkerInit()))
+    tg.set_level("full")
+    init(0)
+    assert tg.get_level() is tg.GuardLevel.RANK
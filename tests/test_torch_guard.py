@@ -0,0 +1,82 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from tensorguard import ShapeError  # noqa: E402
+from tensorguard.torch_guard import TorchGuard, guard  # noqa: E402
+
+# torch.compiler.is_compiling and torch._check_with, used under torch.compile, need torch >= 2.1
+requires_compile = pytest.mark.skipif(
+    not (hasattr(torch, "compiler") and hasattr(torch.compiler, "is_compiling") and hasattr(torch, "_check_with")),
+    reason="torch.compile support needs torch >= 2.1",
+)
+
+
+class SmallNet(torch.nn.Module):
+    def __init__(self, lower: bool):
+        super().__init__()
+        self.conv = torch.nn.Conv2d(3, 8, kernel_size=2, stride=2)
+        self.image_guard = TorchGuard("B, 3, H, W", lower=lower)
+        self.features_guard = TorchGuard("B, 8, H/2, W/2", lower=lower)
+        self.output_guard = TorchGuard("B, 8*(H/2)*(W/2)", lower=lower)
+
+    def forward(self, x):
+        dims = {}
+        features = self.features_guard(self.conv(self.image_guard(x, dims)), dims)
+        return self.output_guard(features.flatten(1), dims)
+
+
+@pytest.mark.parametrize("lower", [False, True])
+def test_eager_checks(lower):
+    net = SmallNet(lower)
+    assert net(torch.ones(2, 3, 8, 6)).shape == (2, 96)
+    with pytest.raises(ShapeError):
+        net(torch.ones(2, 4, 8, 6))
+    dims = {"B": 2}
+    TorchGuard("B, _X, C", lower=lower)(torch.ones(2, 5, 7), dims)
+    assert dims == {"B": 2, "C": 7}
+    with pytest.raises(ShapeError):
+        guard(torch.ones(3, 7), "B, C", dims, lower=lower)
+
+
+@pytest.mark.parametrize("lower", [False, True])
+def test_empty_batches(lower):
+    assert TorchGuard("A, A*B", lower=lower)(torch.zeros(0, 5)).shape == (0, 5)
+    dims = {}
+    TorchGuard("A, A/B", lower=lower)(torch.zeros(3, 0), dims)
+    assert dims == {"A": 3}
+    net = SmallNet(lower)
+    assert net(torch.ones(0, 3, 8, 6)).shape == (0, 96)
+    with pytest.raises(ShapeError):
+        TorchGuard("A, A/B", lower=lower)(torch.zeros(3, 7))
+
+
+@requires_compile
+@pytest.mark.parametrize("lower", [False, True])
+def test_no_graph_breaks(lower):
+    import torch._dynamo
+
+    torch._dynamo.reset()
+    explanation = torch._dynamo.explain(SmallNet(lower))(torch.ones(2, 3, 8, 6))
+    assert explanation.graph_break_count == 0, explanation.break_reasons
+
+
+@requires_compile
+def test_lowered_guard_with_dynamic_shapes():
+    import torch._dynamo
+
+    torch._dynamo.reset()
+    net = torch.compile(SmallNet(lower=True), backend="eager", dynamic=True, fullgraph=True)
+    for batch, height in ((2, 8), (3, 12), (5, 4)):
+        assert net(torch.ones(batch, 3, height, 6)).shape == (batch, 8 * height // 2 * 3)
@@ -0,0 +1,132 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import tensorguard as tg
+from tensorguard import MultipleShapeError
+from tensorguard.torch_modules import (
+    HOOKS_SUPPORTED, get_plan, guarded_module, hooked_modules, install_hooks, remove_hooks
+)
+
+pytestmark = pytest.mark.skipif(not HOOKS_SUPPORTED, reason="forward hooks with kwargs need torch >= 2.1")
+
+
+@guarded_module(x="B, T, D", returns="B, D")
+class Pool(torch.nn.Module):
+    def forward(self, x):
+        tg.guard(x, "B, T, D")  # the global functions see the dims of the forward
+        return x.mean(1)
+
+
+class Project(torch.nn.Module):
+    shape_templates = {"x": "B, 8", "returns": "B, 4"}
+
+    def __init__(self, d=8):
+        super(Project, self).__init__()
+        self.linear = torch.nn.Linear(d, 4)
+
+    def forward(self, x):
+        return self.linear(x)
+
+
+class Model(torch.nn.Module):
+    def __init__(self, d=8):
+        super(Model, self).__init__()
+        self.pool = Pool()
+        self.project = Project(d)
+
+    def forward(self, x):
+        return self.project(self.pool(x))
+
+
+@pytest.fixture(autouse=True)
+def clean_hooks():
+    tg.reset()
+    tg.set_level("full")
+    yield
+    remove_hooks()
+    tg.set_level("full")
+
+
+def test_templates_are_compiled_once_per_class():
+    assert get_plan(Pool) is get_plan(Pool)
+    assert get_plan(Project).name == "Project.forward"
+    assert get_plan(Model) is None
+
+
+def test_hooks_check_arguments_and_results():
+    model = Model()
+    assert install_hooks(model) == 2
+    assert install_hooks(model) == 0  # already installed
+    assert model(torch.zeros(2, 3, 8)).shape == (2, 4)
+    with pytest.raises(MultipleShapeError, match=r"Project\.forward"):
+        model(torch.zeros(2, 3, 5))  # the linear layer would fail later with a less clear error
+    assert "B" not in tg.get_dims()  # every forward has its own scope
+
+
+def test_result_is_checked():
+    @guarded_module(x="B, D", returns="B, D")
+    class Wrong(torch.nn.Module):
+        def forward(self, x):
+            return x[:, :1]
+
+    module = Wrong()
+    install_hooks(module)
+    with pytest.raises(MultipleShapeError, match="return value"):
+        module(torch.zeros(2, 3))
+
+
+def test_scope_is_restored_after_errors():
+    model = Model()
+    install_hooks(model)
+    with tg.scope(dims={"B": 7}):
+        for x in [torch.zeros(2, 3, 5), torch.zeros(2, 3)]:
+            with pytest.raises(Exception):
+                model(x)
+        assert tg.get_dim("B") == 7
+    assert model(torch.zeros(2, 3, 8)).shape == (2, 4)
+
+
+def test_remove_hooks():
+    model, other = Model(), Model()
+    install_hooks(model)
+    install_hooks(other)
+    remove_hooks(other)
+    assert len(hooked_modules()) == 2
+    with pytest.raises(MultipleShapeError):
+        model(torch.zeros(2, 3, 5))
+    remove_hooks()
+    assert hooked_modules() == []
+    assert not model.pool._forward_pre_hooks and not model.pool._forward_hooks
+    with pytest.raises(RuntimeError):  # the unchecked linear layer fails
+        model(torch.zeros(2, 3, 5))
+
+
+def test_level_off_skips_checks():
+    model = Model()
+    install_hooks(model)
+    tg.set_level("off")
+    with pytest.raises(RuntimeError):
+        model(torch.zeros(2, 3, 5))
+    tg.set_level("rank")
+    with pytest.raises(MultipleShapeError):
+        model(torch.zeros(2, 8))
+
+
+def test_install_hooks_needs_recent_torch(monkeypatch):
+    from tensorguard import torch_modules
+
+    monkeypatch.setattr(torch_modules, "HOOKS_SUPPORTED", False)
+    with pytest.raises(RuntimeError, match="torch >= 2.1"):
+        install_hooks(Pool())
@@ -0,0 +1,78 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+import tensorguard as tg
+from tensorguard import MultipleShapeError, trees
+
+TREE = {"image": "B, 3, H, W", "labels": "B", "meta": {"mask": "B, H, W", "pair": ["B, 2", "B, 2"]}}
+
+Meta = namedtuple("Meta", ["mask", "pair"])
+
+
+def make_batch(b=4, h=8, w=6, mask=None):
+    return {
+        "image": np.zeros([b, 3, h, w]),
+        "labels": np.zeros([b]),
+        "meta": Meta(np.zeros(mask or [b, h, w]), (np.zeros([b, 2]), [b, 2])),
+        "extra": "not checked",
+    }
+
+
+@pytest.fixture(autouse=True)
+def reset_global():
+    tg.reset()
+    tg.set_level("full")
+    yield
+    tg.set_level("full")
+
+
+def test_guard_tree_infers_dims():
+    batch = make_batch()
+    assert tg.guard_tree(batch, TREE) is batch
+    assert tg.get_dims() == {"B": 4, "H": 8, "W": 6}
+
+
+def test_plan_is_cached_by_structure():
+    plan = trees.get_plan(TREE)
+    copy = {"image": "B, 3, H, W", "labels": "B", "meta": {"mask": "B, H, W", "pair": ("B, 2", "B, 2")}}
+    assert trees.get_plan(copy) is plan
+    assert plan.labels == ["image", "labels", "meta.mask", "meta.pair[0]", "meta.pair[1]"]
+    assert trees.get_plan({"labels": "B", "image": "B, 3, H, W"}) is not plan
+
+
+def test_failure_rolls_back_all_dims():
+    with pytest.raises(MultipleShapeError) as info:
+        tg.guard_tree(make_batch(mask=[4, 8, 5]), TREE)
+    assert [label for label, _ in info.value.errors] == ["meta.mask"]
+    assert tg.get_dims() == {}  # nothing inferred by the leaves checked before
+
+
+def test_missing_leaves_are_reported():
+    batch = make_batch()
+    del batch["labels"]
+    with pytest.raises(MultipleShapeError, match="Missing value") as info:
+        tg.guard_tree(batch, TREE)
+    assert [label for label, _ in info.value.errors] == ["labels"]
+
+
+def test_levels():
+    batch = make_batch(mask=[4, 8, 5])
+    with tg.using_level("rank"):
+        tg.guard_tree(batch, TREE)
+        with pytest.raises(MultipleShapeError):
+            tg.guard_tree(batch, {"labels": "B, C"})
+    with tg.using_level("off"):
+        tg.guard_tree(None, TREE)
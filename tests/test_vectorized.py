@@ -0,0 +1,66 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import itertools
+
+import numpy as np
+import pytest
+
+from tensorguard import ShapeError
+from tensorguard import parser
+from tensorguard.vectorized import match_shapes
+
+TEMPLATES = ["T, 80", "B, H*W, C+1", "A, B*2, A+C", "A, ..., A/2", "?, B?, *", "(A+1)*(B-1), A, B", "_X, _X*2", "A, A/B", "A, 6-B, B/A"]
+
+
+@pytest.mark.parametrize("template", TEMPLATES)
+def test_match_shapes_agrees_with_compiled_checker(template):
+    rows = [list(s) for rank in range(1, 5) for s in itertools.product([-1, 0, 1, 2, 3, 6, 80], repeat=rank)]
+    result = match_shapes(rows, template, dims={"C": 1})
+    checker = parser.get_spec(template).compile()
+    for i, row in enumerate(rows):
+        shape = [None if x < 0 else x for x in row]
+        try:
+            inferred = checker(shape, {"C": 1})
+        except (ShapeError, ZeroDivisionError):
+            assert not result.matches[i], (template, row)
+            continue
+        assert result.matches[i], (template, row)
+        for name, value in inferred.items():
+            assert result.dims[name][i] == value, (template, row, name)
+
+
+def test_match_shapes_dims_and_unknown_values():
+    result = match_shapes(np.array([[100, 80], [120, 80], [90, 40]]), "T, 80")
+    assert result.matches.tolist() == [True, True, False]
+    assert result.dims["T"].tolist() == [100, 120, 90]
+    result = match_shapes(np.array([[6], [7]]), "A*B", dims={"B": 3})
+    assert result.matches.tolist() == [True, False]
+    assert result.dims["A"].tolist() == [2, 2]
+    assert "B" not in result.dims
+    assert match_shapes(np.array([[6]]), "A*B").dims["A"].tolist() == [-1]
+
+
+def test_match_shapes_ragged_ranks():
+    shapes = np.array([[4, 3, 0], [4, 5, 3], [4, 0, 0]])
+    mask = np.array([[True, True, False], [True, True, True], [True, False, False]])
+    result = match_shapes(shapes, "B, ..., 3", mask=mask)
+    assert result.matches.tolist() == [True, True, False]
+    assert match_shapes([[4, 3], [4, 5, 3], [4]], "B, ..., 3").matches.tolist() == [True, True, False]
+    with pytest.raises(ValueError):
+        match_shapes(shapes, "B, ..., 3", mask=np.array([[False, True, True]] * 3))
+
+
+def test_match_shapes_global_uses_known_dims():
+    import tensorguard as tg
+    tg.reset()
+    tg.set_dim("D", 80)
+    assert tg.match_shapes([[10, 80], [10, 40]], "T, D").matches.tolist() == [True, False]